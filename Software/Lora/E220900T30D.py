@@ -3,18 +3,16 @@
 import serial
 import time
 import logging
-import RPi.GPIO as GPIO
 
 from lora_functions import *
 from constants import *
 
-# Logger configuration
-logging.basicConfig(level=logging.DEBUG)
+# Logger configuration (the importing program sets the level; see flightlog.setup_logging)
 logger = logging.getLogger(__name__)
 
 def send_at_command(command):
     with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser:
-        logger.debug(f"Sending command: {command}")
+        logger.debug("Sending command: %s", command)
         ser.write(command.encode('utf-8'))
         wait_aux_low()
         wait_aux_high()
@@ -49,13 +47,15 @@ def setparam(baudrate=9600, parity='8N1', air_rate=2400, power=30, packet_size=2
     command = f'C0 00 08 {baudrate_code}{parity_code}{air_rate_code}{power_code}{packet_size_code}{channel_code} {wor_cycle_code}{lbt_code}{rssi_code}{address_code}{key_code}'
     
     send_at_command(command)
-    logger.info(f"Set parameters: baudrate: {baudrate}, parity: {parity}, air_rate: {air_rate}, power: {power}, packet_size: {packet_size}, channel: {channel}, wor_cycle: {wor_cycle}, LBT: {lbt}, RSSI: {rssi}, address: {address}, key: {key}")
+    logger.info("Set parameters: baudrate: %s, parity: %s, air_rate: %s, power: %s, packet_size: %s, channel: %s, "
+                "wor_cycle: %s, LBT: %s, RSSI: %s, address: %s, key: %s",
+                baudrate, parity, air_rate, power, packet_size, channel, wor_cycle, lbt, rssi, address, key)
 
     enter_normal_mode()
 
 def send_message(message):
     message_with_delimiter = message + "\n"
-    logger.info(f"Enviando mensaje: {message_with_delimiter.strip()}")
+    logger.info("Enviando mensaje: %s", message_with_delimiter.strip())
     try:
         with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser:
             time.sleep(0.1)
@@ -64,7 +64,7 @@ def send_message(message):
             wait_aux_high()
         logger.info("Mensaje enviado con éxito.")
     except serial.SerialException as e:
-        logger.error(f"Error al enviar el mensaje: {e}")
+        logger.error("Error al enviar el mensaje: %s", e)
 
 def receive_message():
     logger.info("Esperando mensajes...")
@@ -74,11 +74,11 @@ def receive_message():
                 message = ser.readline()
                 try:
                     decoded_message = message.decode('utf-8', errors='ignore').strip()
-                    logger.info(f"Mensaje recibido: {decoded_message}")
+                    logger.info("Mensaje recibido: %s", decoded_message)
                     return decoded_message
                 except UnicodeDecodeError as e:
-                    logger.error(f"Error al decodificar el mensaje: {e}")
-                    logger.debug(f"Mensaje en bruto: {message}")
+                    logger.error("Error al decodificar el mensaje: %s", e)
+                    logger.debug("Mensaje en bruto: %s", message)
                 wait_aux_low()
                 wait_aux_high()
             else:
@@ -87,5 +87,4 @@ def receive_message():
 
 def clean_gpio():
     logger.debug("Limpiando GPIO...")
-    GPIO.cleanup()
-    logger.debug("GPIO limpiado.")
\ No newline at end of file
+    close_gpio()
\ No newline at end of file
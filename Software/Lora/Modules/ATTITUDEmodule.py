@@ -0,0 +1,313 @@
+"""* * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+*                                                                            *
+*                         Developed by Javier Bolanos                        *
+*                  https://github.com/javierbolanosllano                     *
+*                                                                            *
+*                      UAXSAT IV Project - 2024                              *
+*                   https://github.com/UAXSat/UAXSat                         *
+*                                                                            *
+* * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *"""
+
+# ATTITUDEmodule.py
+import json
+import threading
+from math import sqrt, degrees
+import numpy as np
+
+# Madgwick filter gain. sqrt(3/4) * gyro noise (rad/s) is the paper's value;
+# 0.1 converges in a few seconds after power-up and still rides out vibration.
+DEFAULT_BETA = 0.1
+
+# Identity calibration: no hard-iron offset, no soft-iron distortion
+IDENTITY_CALIBRATION = {"offset": [0.0, 0.0, 0.0], "matrix": [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]}
+
+
+# Magnetometer calibration
+# -----------------------------------------------------------------------------
+
+def mag_to_body(mag):
+    """
+    Maps an AK09916 reading onto the accelerometer/gyroscope axes. The
+    magnetometer inside the ICM-20948 has X aligned with the accel/gyro
+    frame but Y and Z reversed, so the body-frame vector is (mx, -my, -mz).
+    """
+    return (mag[0], -mag[1], -mag[2])
+
+def fit_mag_calibration(samples):
+    """
+    Fits hard- and soft-iron corrections to raw magnetometer samples (n x 3,
+    uT) collected while turning the payload through as many orientations as
+    possible. The samples lie on an ellipsoid; the returned `offset` is its
+    centre and `matrix` maps it back onto a sphere of the mean field radius:
+
+        calibrated = matrix @ (raw - offset)
+    """
+    m = np.asarray(samples, dtype=np.float64)
+    x, y, z = m[:, 0], m[:, 1], m[:, 2]
+    # General quadric  Ax2 + By2 + Cz2 + 2Dxy + 2Exz + 2Fyz + 2Gx + 2Hy + 2Iz = 1
+    design = np.column_stack((x * x, y * y, z * z, 2 * x * y, 2 * x * z, 2 * y * z, 2 * x, 2 * y, 2 * z))
+    a, b, c, d, e, f, g, h, i = np.linalg.lstsq(design, np.ones(len(m)), rcond=None)[0]
+    quadric = np.array([[a, d, e], [d, b, f], [e, f, c]])
+    linear = np.array([g, h, i])
+
+    offset = -np.linalg.solve(quadric, linear)
+    shape = quadric / (1.0 + offset @ quadric @ offset)
+    eigenvalues, eigenvectors = np.linalg.eigh(shape)
+    if np.any(eigenvalues <= 0):
+        raise ValueError("Magnetometer samples do not describe an ellipsoid; rotate the payload more")
+    radius = np.prod(1.0 / np.sqrt(eigenvalues)) ** (1.0 / 3.0)
+    matrix = eigenvectors @ np.diag(np.sqrt(eigenvalues)) @ eigenvectors.T * radius
+    return {"offset": offset.tolist(), "matrix": matrix.tolist()}
+
+def load_mag_calibration(path):
+    """Reads a calibration saved by save_mag_calibration; identity if missing."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Magnetometer calibration {path} not found, using raw readings.")
+        return IDENTITY_CALIBRATION
+
+def save_mag_calibration(calibration, path):
+    with open(path, "w") as f:
+        json.dump(calibration, f, indent=2)
+
+def apply_mag_calibration(calibration, mag):
+    ox, oy, oz = calibration["offset"]
+    (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = calibration["matrix"]
+    x, y, z = mag[0] - ox, mag[1] - oy, mag[2] - oz
+    return (m00 * x + m01 * y + m02 * z,
+            m10 * x + m11 * y + m12 * z,
+            m20 * x + m21 * y + m22 * z)
+
+
+# Madgwick filter
+# -----------------------------------------------------------------------------
+
+class MadgwickFilter:
+    """
+    Madgwick gradient-descent orientation filter (accel + gyro, optionally
+    magnetometer). Works on plain floats: for one sample at a time this is
+    several times faster than NumPy on a Pi, so the full FIFO rate costs
+    only a few percent of one core.
+
+    The quaternion (w, x, y, z) gives the sensor frame relative to the
+    earth frame.
+    """
+
+    def __init__(self, beta=DEFAULT_BETA):
+        self.beta = beta
+        self.q = (1.0, 0.0, 0.0, 0.0)
+
+    def update_imu(self, gx, gy, gz, ax, ay, az, dt):
+        """One step with gyro (rad/s) and accel (any unit); no heading correction."""
+        q0, q1, q2, q3 = self.q
+        qdot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qdot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qdot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qdot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            _2q0, _2q1, _2q2, _2q3 = 2.0 * q0, 2.0 * q1, 2.0 * q2, 2.0 * q3
+            _4q0, _4q1, _4q2 = 4.0 * q0, 4.0 * q1, 4.0 * q2
+            _8q1, _8q2 = 8.0 * q1, 8.0 * q2
+            q0q0, q1q1, q2q2, q3q3 = q0 * q0, q1 * q1, q2 * q2, q3 * q3
+
+            s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+            s1 = _4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1 + _8q1 * q1q1 + _8q1 * q2q2 + _4q1 * az
+            s2 = 4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + _8q2 * q1q1 + _8q2 * q2q2 + _4q2 * az
+            s3 = 4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay
+            norm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm > 0.0:
+                beta = self.beta / norm
+                qdot0 -= beta * s0
+                qdot1 -= beta * s1
+                qdot2 -= beta * s2
+                qdot3 -= beta * s3
+
+        self._integrate(q0, q1, q2, q3, qdot0, qdot1, qdot2, qdot3, dt)
+
+    def update(self, gx, gy, gz, ax, ay, az, mx, my, mz, dt):
+        """One step with gyro (rad/s), accel and calibrated magnetometer."""
+        mnorm = sqrt(mx * mx + my * my + mz * mz)
+        anorm = sqrt(ax * ax + ay * ay + az * az)
+        if mnorm == 0.0 or anorm == 0.0:
+            self.update_imu(gx, gy, gz, ax, ay, az, dt)
+            return
+
+        q0, q1, q2, q3 = self.q
+        qdot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qdot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qdot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qdot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        ax, ay, az = ax / anorm, ay / anorm, az / anorm
+        mx, my, mz = mx / mnorm, my / mnorm, mz / mnorm
+
+        _2q0mx, _2q0my, _2q0mz = 2.0 * q0 * mx, 2.0 * q0 * my, 2.0 * q0 * mz
+        _2q1mx = 2.0 * q1 * mx
+        _2q0, _2q1, _2q2, _2q3 = 2.0 * q0, 2.0 * q1, 2.0 * q2, 2.0 * q3
+        _2q0q2, _2q2q3 = 2.0 * q0 * q2, 2.0 * q2 * q3
+        q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+        q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+        q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+
+        # Reference direction of the earth's magnetic field
+        hx = mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + _2q1 * mz * q3 - mx * q2q2 - mx * q3q3
+        hy = _2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + my * q2q2 + _2q2 * mz * q3 - my * q3q3
+        _2bx = sqrt(hx * hx + hy * hy)
+        _2bz = -_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + _2q2 * my * q3 - mz * q2q2 + mz * q3q3
+        _4bx, _4bz = 2.0 * _2bx, 2.0 * _2bz
+
+        # Objective function residuals (gravity and magnetic field)
+        fa_x = 2.0 * q1q3 - _2q0q2 - ax
+        fa_y = 2.0 * q0q1 + _2q2q3 - ay
+        fa_z = 1.0 - 2.0 * q1q1 - 2.0 * q2q2 - az
+        fm_x = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+        fm_y = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+        fm_z = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+
+        s0 = -_2q2 * fa_x + _2q1 * fa_y - _2bz * q2 * fm_x + (-_2bx * q3 + _2bz * q1) * fm_y + _2bx * q2 * fm_z
+        s1 = (_2q3 * fa_x + _2q0 * fa_y - 4.0 * q1 * fa_z + _2bz * q3 * fm_x
+              + (_2bx * q2 + _2bz * q0) * fm_y + (_2bx * q3 - _4bz * q1) * fm_z)
+        s2 = (-_2q0 * fa_x + _2q3 * fa_y - 4.0 * q2 * fa_z + (-_4bx * q2 - _2bz * q0) * fm_x
+              + (_2bx * q1 + _2bz * q3) * fm_y + (_2bx * q0 - _4bz * q2) * fm_z)
+        s3 = (_2q1 * fa_x + _2q2 * fa_y + (-_4bx * q3 + _2bz * q1) * fm_x
+              + (-_2bx * q0 + _2bz * q2) * fm_y + _2bx * q1 * fm_z)
+        norm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+        if norm > 0.0:
+            beta = self.beta / norm
+            qdot0 -= beta * s0
+            qdot1 -= beta * s1
+            qdot2 -= beta * s2
+            qdot3 -= beta * s3
+
+        self._integrate(q0, q1, q2, q3, qdot0, qdot1, qdot2, qdot3, dt)
+
+    def _integrate(self, q0, q1, q2, q3, qdot0, qdot1, qdot2, qdot3, dt):
+        q0 += qdot0 * dt
+        q1 += qdot1 * dt
+        q2 += qdot2 * dt
+        q3 += qdot3 * dt
+        norm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        self.q = (q0 / norm, q1 / norm, q2 / norm, q3 / norm)
+
+
+# Streaming estimator
+# -----------------------------------------------------------------------------
+
+class AttitudeEstimator:
+    """
+    Runs the Madgwick filter on every sample of an IMUStream and keeps the
+    tumble-rate statistics of the current telemetry window.
+
+    Register it with `stream.add_consumer(estimator.process)`; it then runs
+    in the FIFO drain thread at the full sample rate. The magnetometer
+    reading delivered with each block corrects heading on the block's last
+    sample, the rest are accel/gyro updates.
+    """
+
+    def __init__(self, calibration=None, beta=DEFAULT_BETA):
+        self.filter = MadgwickFilter(beta)
+        self.calibration = calibration if calibration is not None else IDENTITY_CALIBRATION
+        self.lock = threading.Lock()
+        self.last_t = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self.rate_sum = 0.0
+        self.rate_max = 0.0
+        self.count = 0
+
+    def process(self, samples, mag=None):
+        """
+        Feeds an (n, 7) block of IMUStream samples [t, ax, ay, az, gx, gy, gz].
+        `mag` is the raw magnetometer reading; it is mapped to the body frame
+        with mag_to_body, (mx, -my, -mz), before calibration and fusion, so
+        the calibration must be fitted on mapped samples too.
+        """
+        rows = samples.tolist()
+        if not rows:
+            return
+        if mag is not None:
+            mx, my, mz = apply_mag_calibration(self.calibration, mag_to_body(mag))
+        update_imu = self.filter.update_imu
+        last_t = self.last_t if self.last_t is not None else rows[0][0]
+        rate_sum, rate_max = 0.0, 0.0
+        last = len(rows) - 1
+        for i, (t, ax, ay, az, gx, gy, gz) in enumerate(rows):
+            dt = t - last_t
+            last_t = t
+            if mag is not None and i == last:
+                self.filter.update(gx, gy, gz, ax, ay, az, mx, my, mz, dt)
+            else:
+                update_imu(gx, gy, gz, ax, ay, az, dt)
+            rate = sqrt(gx * gx + gy * gy + gz * gz)
+            rate_sum += rate
+            if rate > rate_max:
+                rate_max = rate
+        self.last_t = last_t
+        with self.lock:
+            self.rate_sum += rate_sum
+            self.count += len(rows)
+            if rate_max > self.rate_max:
+                self.rate_max = rate_max
+
+    def summary(self):
+        """
+        Compact per-frame block: unit quaternion rounded to 4 decimals and the
+        mean/max body rotation rate (deg/s) since the previous call.
+        """
+        with self.lock:
+            q0, q1, q2, q3 = self.filter.q
+            mean_rate = self.rate_sum / self.count if self.count else 0.0
+            data = {
+                "QW": round(q0, 4), "QX": round(q1, 4), "QY": round(q2, 4), "QZ": round(q3, 4),
+                "TUMBLE": round(degrees(mean_rate), 2),
+                "TUMBLE_MAX": round(degrees(self.rate_max), 2),
+            }
+            self._reset_window()
+        return data
+
+    def __repr__(self):
+        return f"AttitudeEstimator(q={self.filter.q})"
+
+
+def start_attitude_estimation(stream, calibration_path=None, beta=DEFAULT_BETA):
+    """Creates an AttitudeEstimator fed by `stream`."""
+    calibration = load_mag_calibration(calibration_path) if calibration_path else None
+    estimator = AttitudeEstimator(calibration, beta)
+    stream.add_consumer(estimator.process)
+    return estimator
+
+def get_attitude_data(estimator):
+    try:
+        return estimator.summary()
+    except Exception as e:
+        print(f"Error reading the attitude estimate: {e}")
+        return None
+
+if __name__ == "__main__":
+    # Magnetometer calibration: turn the payload slowly through every
+    # orientation while samples are collected. Samples are mapped to the body
+    # frame first, as AttitudeEstimator.process does.
+    import sys
+    import time
+    from IMUmodule import initialize_sensor, read_magnetic
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "mag_calibration.json"
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    icm = initialize_sensor()
+    readings = []
+    print(f"Collecting magnetometer samples for {duration:.0f} s, rotate the payload...")
+    end_time = time.monotonic() + duration
+    while time.monotonic() < end_time:
+        readings.append(mag_to_body(read_magnetic(icm)))
+        time.sleep(0.02)
+    calibration = fit_mag_calibration(readings)
+    save_mag_calibration(calibration, path)
+    print(f"{len(readings)} samples, calibration saved to {path}: {calibration}")
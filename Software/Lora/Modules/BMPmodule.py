@@ -10,11 +10,55 @@
 
 # BMPmodule.py
 import time
-import board
-import adafruit_bmp3xx
+import struct
+import threading
+import numpy as np
+
+DEFAULT_I2C_ADDR = 0x77
+SEA_LEVEL_PRESSURE = 1013.25  # hPa
+
+# BMP390 registers used by the FIFO acquisition mode
+_REG_FIFO_LENGTH = 0x12  # 0x12 (lsb) / 0x13 (msb)
+_REG_FIFO_DATA = 0x14
+_REG_FIFO_CONFIG_1 = 0x17
+_REG_FIFO_CONFIG_2 = 0x18
+_REG_PWR_CTRL = 0x1B
+_REG_OSR = 0x1C
+_REG_ODR = 0x1D
+_REG_CONFIG = 0x1F
+_REG_CAL_DATA = 0x31
+_REG_CMD = 0x7E
+
+_CMD_FIFO_FLUSH = 0xB0
+_CMD_SOFT_RESET = 0xB6
+
+_FIFO_CONFIG_1_PRESS_TEMP = 0x19  # fifo_mode | fifo_press_en | fifo_temp_en (no sensortime)
+_FIFO_CONFIG_2_FILTERED = 0x08  # data_select = IIR filtered, no subsampling
+_PWR_CTRL_NORMAL = 0x33  # press_en | temp_en | normal mode
+
+# FIFO frame headers and payload sizes
+_FRAME_PRESS_TEMP = 0x94
+_FRAME_SIZES = {0x94: 6, 0x90: 3, 0x84: 3, 0xA0: 3, 0x48: 1, 0x44: 1}
+_FRAME_EMPTY = 0x80
+
+_FIFO_SIZE = 512
+_FIFO_READ_CHUNK = 128
+
+# Output data rates (ODR register) in Hz
+ODR_HZ = {0x00: 200.0, 0x01: 100.0, 0x02: 50.0, 0x03: 25.0, 0x04: 12.5, 0x05: 6.25}
+# Oversampling / IIR coefficient settings -> register value
+OVERSAMPLING = {1: 0, 2: 1, 4: 2, 8: 3, 16: 4, 32: 5}
+IIR_COEFFICIENT = {0: 0, 1: 1, 3: 2, 7: 3, 15: 4, 31: 5, 63: 6, 127: 7}
+
+# International barometric formula h = 44330 * (1 - (p / p0) ** (1 / 5.255))
+_ALTITUDE_SCALE = 44330.0
+_ALTITUDE_EXPONENT = 1.0 / 5.255
 
 # Funci  n para inicializar el sensor BMP
 def initialize_sensor():
+    # Drivers importados aquí: el módulo se puede importar sin el hardware
+    import board
+    import adafruit_bmp3xx
     i2c = board.I2C()
     bmp = adafruit_bmp3xx.BMP3XX_I2C(i2c)
     
@@ -34,6 +78,272 @@ def read_sensor_data(bmp):
         return None
 
 # Funci  n principal - inicializa el sensor y lee los datos
+_BMP = None
+
 def get_BMP_data():
-    BMP = initialize_sensor()
-    return read_sensor_data(BMP)
+    # The sensor is configured once; re-initialising it on every call reset
+    # the oversampling and the IIR filter state each cycle.
+    global _BMP
+    if _BMP is None:
+        _BMP = initialize_sensor()
+    return read_sensor_data(_BMP)
+
+
+def pressure_to_altitude(pressure, sea_level_pressure=SEA_LEVEL_PRESSURE):
+    """
+    Barometric altitude (m) for pressure in hPa; works on floats and arrays.
+    """
+    return _ALTITUDE_SCALE * (1.0 - np.power(np.asarray(pressure) / sea_level_pressure, _ALTITUDE_EXPONENT))
+
+
+class VerticalKalman:
+    """
+    Kalman filter for altitude, vertical speed and barometric bias.
+
+    State [h, v, b]: constant-velocity model driven by white acceleration
+    noise. The barometer measures h + b at the FIFO rate; GPS altitude,
+    when available, measures h alone, so it slowly pulls the baro bias
+    (weather, sea-level pressure error) out of the altitude estimate while
+    the barometer keeps the vertical speed smooth.
+    """
+
+    def __init__(self, accel_noise=0.5, baro_noise=0.5, gps_noise=10.0, bias_drift=0.01):
+        self.x = None
+        self.P = np.diag([100.0, 10.0, 100.0])
+        self.accel_var = accel_noise ** 2
+        self.baro_var = baro_noise ** 2
+        self.gps_var = gps_noise ** 2
+        self.bias_var = bias_drift ** 2
+        self.t = None
+
+    def predict(self, t):
+        if self.t is None:
+            self.t = t
+            return
+        dt = t - self.t
+        if dt <= 0:
+            return  # Repeated or backwards timestamp: keep the time base
+        self.t = t
+        F = np.array([[1.0, dt, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+        q = self.accel_var
+        Q = np.array([[q * dt ** 4 / 4, q * dt ** 3 / 2, 0.0],
+                      [q * dt ** 3 / 2, q * dt ** 2, 0.0],
+                      [0.0, 0.0, self.bias_var * dt]])
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+
+    def _update(self, H, z, r):
+        y = z - H @ self.x
+        PH = self.P @ H
+        s = H @ PH + r
+        K = PH / s
+        self.x = self.x + K * y
+        self.P = self.P - np.outer(K, PH)
+
+    def update_baro(self, t, altitude):
+        if self.x is None:
+            self.x = np.array([altitude, 0.0, 0.0])
+            self.t = t
+            return
+        self.predict(t)
+        self._update(np.array([1.0, 0.0, 1.0]), altitude, self.baro_var)
+
+    def update_gps(self, t, altitude):
+        if self.x is None:
+            return
+        self.predict(t)
+        self._update(np.array([1.0, 0.0, 0.0]), altitude, self.gps_var)
+
+    @property
+    def altitude(self):
+        return None if self.x is None else float(self.x[0])
+
+    @property
+    def vertical_speed(self):
+        return None if self.x is None else float(self.x[1])
+
+
+class BMPStream:
+    """
+    BMP390 FIFO acquisition.
+
+    ODR, oversampling and IIR filter are written once when the stream is
+    created. A background thread drains the pressure/temperature FIFO in
+    bulk reads, compensates the raw values with the factory calibration
+    (vectorised with NumPy), converts pressure to altitude and feeds every
+    sample to a VerticalKalman filter.
+    """
+
+    def __init__(self, i2c=None, address=DEFAULT_I2C_ADDR, odr=0x03, pressure_oversampling=8,
+                 temperature_oversampling=1, iir_coefficient=3, poll_interval=0.5,
+                 sea_level_pressure=SEA_LEVEL_PRESSURE):
+        from adafruit_bus_device.i2c_device import I2CDevice
+        if i2c is None:
+            import board
+            i2c = board.I2C()
+        self.i2c_device = I2CDevice(i2c, address)
+        self.sample_rate = ODR_HZ[odr]
+        self.poll_interval = poll_interval
+        self.sea_level_pressure = sea_level_pressure
+        self.kalman = VerticalKalman()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self._reset_window()
+
+        self.read_coefficients()
+        self.write_uint8(_REG_CMD, _CMD_SOFT_RESET)
+        time.sleep(0.01)
+        self.write_uint8(_REG_OSR, OVERSAMPLING[pressure_oversampling] | (OVERSAMPLING[temperature_oversampling] << 3))
+        self.write_uint8(_REG_ODR, odr)
+        self.write_uint8(_REG_CONFIG, IIR_COEFFICIENT[iir_coefficient] << 1)
+        self.write_uint8(_REG_FIFO_CONFIG_2, _FIFO_CONFIG_2_FILTERED)
+        self.write_uint8(_REG_FIFO_CONFIG_1, _FIFO_CONFIG_1_PRESS_TEMP)
+        self.write_uint8(_REG_PWR_CTRL, _PWR_CTRL_NORMAL)
+        self.write_uint8(_REG_CMD, _CMD_FIFO_FLUSH)
+
+    def read_bytes(self, reg, length):
+        ibuffer = bytearray(length)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes((reg,)), ibuffer)
+        return ibuffer
+
+    def write_uint8(self, reg, val):
+        with self.i2c_device as i2c:
+            i2c.write(bytes((reg, val)))
+
+    def read_coefficients(self):
+        """Reads the NVM trimming coefficients and scales them as in the datasheet."""
+        c = struct.unpack("<HHbhhbbHHbbhbb", self.read_bytes(_REG_CAL_DATA, 21))
+        self.temp_calib = (c[0] * 2.0 ** 8, c[1] / 2.0 ** 30, c[2] / 2.0 ** 48)
+        self.pressure_calib = (
+            (c[3] - 2 ** 14) / 2.0 ** 20, (c[4] - 2 ** 14) / 2.0 ** 29, c[5] / 2.0 ** 32,
+            c[6] / 2.0 ** 37, c[7] * 2.0 ** 3, c[8] / 2.0 ** 6, c[9] / 2.0 ** 8,
+            c[10] / 2.0 ** 15, c[11] / 2.0 ** 48, c[12] / 2.0 ** 48, c[13] / 2.0 ** 65,
+        )
+
+    def fifo_length(self):
+        lo, hi = self.read_bytes(_REG_FIFO_LENGTH, 2)
+        return ((hi & 0x01) << 8) | lo
+
+    def read_fifo(self):
+        """Drains the FIFO and returns the raw (adc_t, adc_p) arrays of every complete frame."""
+        length = self.fifo_length()
+        data = bytearray()
+        while length > 0:
+            chunk = min(length, _FIFO_READ_CHUNK)
+            data += self.read_bytes(_REG_FIFO_DATA, chunk)
+            length -= chunk
+        offsets = []
+        i = 0
+        while i < len(data):
+            header = data[i]
+            if header == _FRAME_EMPTY:
+                break
+            size = _FRAME_SIZES.get(header)
+            if size is None or i + 1 + size > len(data):
+                break
+            if header == _FRAME_PRESS_TEMP:
+                offsets.append(i + 1)
+            i += 1 + size
+        if not offsets:
+            return np.empty(0), np.empty(0)
+        frames = np.frombuffer(bytes(data), dtype=np.uint8)
+        idx = np.asarray(offsets)
+        b = frames[idx[:, None] + np.arange(6)].astype(np.int64)
+        adc_t = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        adc_p = b[:, 3] | (b[:, 4] << 8) | (b[:, 5] << 16)
+        return adc_t.astype(np.float64), adc_p.astype(np.float64)
+
+    def compensate(self, adc_t, adc_p):
+        """Returns temperature (degC) and pressure (hPa) arrays."""
+        T1, T2, T3 = self.temp_calib
+        pd1 = adc_t - T1
+        temperature = pd1 * T2 + pd1 * pd1 * T3
+        P1, P2, P3, P4, P5, P6, P7, P8, P9, P10, P11 = self.pressure_calib
+        t2 = temperature * temperature
+        t3 = t2 * temperature
+        po1 = P5 + P6 * temperature + P7 * t2 + P8 * t3
+        po2 = adc_p * (P1 + P2 * temperature + P3 * t2 + P4 * t3)
+        p2 = adc_p * adc_p
+        pressure = po1 + po2 + p2 * (P9 + P10 * temperature) + P11 * p2 * adc_p
+        return temperature, pressure / 100.0
+
+    def _reset_window(self):
+        self.count = 0
+        self.pressure_sum = 0.0
+        self.temperature_sum = 0.0
+
+    def poll(self):
+        """Drains the FIFO once, updates the filter and returns the number of new samples."""
+        adc_t, adc_p = self.read_fifo()
+        t_end = time.monotonic()
+        n = adc_t.shape[0]
+        if n == 0:
+            return 0
+        temperature, pressure = self.compensate(adc_t, adc_p)
+        altitude = pressure_to_altitude(pressure, self.sea_level_pressure)
+        times = t_end - np.arange(n - 1, -1, -1) / self.sample_rate
+        with self.lock:
+            for t, h in zip(times.tolist(), altitude.tolist()):
+                self.kalman.update_baro(t, h)
+            self.count += n
+            self.pressure_sum += float(pressure.sum())
+            self.temperature_sum += float(temperature.sum())
+        return n
+
+    def update_gps(self, altitude):
+        """Fuses a GPS altitude (m) into the vertical filter."""
+        if altitude is None:
+            return
+        with self.lock:
+            self.kalman.update_gps(time.monotonic(), altitude)
+
+    def summary(self):
+        """Window means since the previous call plus the filtered altitude and vertical speed."""
+        with self.lock:
+            if self.count == 0:
+                return None
+            pressure = self.pressure_sum / self.count
+            data = {
+                "pressure": pressure,
+                "temperature": self.temperature_sum / self.count,
+                "altitude": float(pressure_to_altitude(pressure, self.sea_level_pressure)),
+                "filtered_altitude": self.kalman.altitude,
+                "vertical_speed": self.kalman.vertical_speed,
+                "samples": self.count,
+            }
+            self._reset_window()
+        return data
+
+    def _run(self):
+        while self.running:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error draining the BMP FIFO: {e}")
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="bmp-fifo", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __repr__(self):
+        return f"BMPStream(sample_rate={self.sample_rate}, altitude={self.kalman.altitude})"
+
+
+def get_BMP_stream_data(stream):
+    try:
+        return stream.summary()
+    except Exception as e:
+        print(f"Error reading the BMP stream: {e}")
+        return None
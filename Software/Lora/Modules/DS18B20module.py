@@ -10,13 +10,22 @@
 
 # DS18B20module.py
 import os
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Conversion time (s) for each DS18B20 resolution in bits
+CONVERSION_TIME = {9: 0.09375, 10: 0.1875, 11: 0.375, 12: 0.75}
 
 class DallasSensor:
     BASE_DIR = '/sys/bus/w1/devices/'
+    MASTER_DIR = '/sys/bus/w1/devices/w1_bus_master1/'
 
-    def __init__(self):
-        self.sensors = self.detect_sensors()
+    def __init__(self, resolution=None, refresh_interval=60.0):
+        self.resolution = resolution
+        self.refresh_interval = refresh_interval
+        self.executor = None
+        self.refresh()
 
     def detect_sensors(self):
         """Detects and returns a list of Dallas DS18B20 sensor IDs."""
@@ -62,13 +71,143 @@ class DallasSensor:
                     info[sensor] = temp
         return info
 
+    def set_resolution(self, resolution):
+        """Writes the conversion resolution (9-12 bits) to every probe."""
+        for sensor in self.sensors:
+            try:
+                with open(os.path.join(self.BASE_DIR, sensor, 'resolution'), 'w') as f:
+                    f.write(str(resolution))
+            except OSError as e:
+                print(f"Could not set resolution of sensor {sensor}: {e}")
+        self.resolution = resolution
+
+    def trigger_bulk_conversion(self):
+        """
+        Starts the conversion on every probe of the bus at once through the
+        w1 master's therm_bulk_read and waits until it has finished. Returns
+        False if the kernel driver does not support bulk conversion.
+        """
+        path = os.path.join(self.MASTER_DIR, 'therm_bulk_read')
+        try:
+            with open(path, 'w') as f:
+                f.write('trigger')
+        except OSError:
+            return False
+        deadline = time.monotonic() + CONVERSION_TIME[12] + 0.25
+        time.sleep(CONVERSION_TIME.get(self.resolution, CONVERSION_TIME[12]))
+        while time.monotonic() < deadline:
+            with open(path, 'r') as f:
+                if f.read().strip() != '-1':  # -1 while a conversion is in progress
+                    return True
+            time.sleep(0.01)
+        return True
+
+    def read_temperature(self, sensor_id):
+        """Reads the last converted temperature (no new conversion after a bulk trigger)."""
+        try:
+            with open(os.path.join(self.BASE_DIR, sensor_id, 'temperature'), 'r') as f:
+                return int(f.read()) / 1000.0
+        except (OSError, ValueError):
+            return None
+
+    def get_sensor_info_bulk(self):
+        """
+        Same result as get_sensor_info, but all probes convert in parallel:
+        one bulk conversion for the whole bus followed by the temperature
+        files read from a thread pool. Falls back to the sequential read on
+        kernels without therm_bulk_read.
+        """
+        if time.monotonic() - self.last_refresh > self.refresh_interval:
+            self.refresh()
+        if not self.sensors:
+            return {}
+        if not self.trigger_bulk_conversion():
+            return self.get_sensor_info()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='w1')
+        temperatures = self.executor.map(self.read_temperature, self.sensors)
+        info = {sensor: temp for sensor, temp in zip(self.sensors, temperatures) if temp is not None}
+        if len(info) != len(self.sensors):
+            # A probe vanished or failed: rescan the bus on the next cycle
+            self.last_refresh = float('-inf')
+        return info
+
     def refresh(self):
-        """Refresh the list of sensors and their data."""
+        """Refresh the list of sensors (hotplug) and apply the resolution to new probes."""
         self.sensors = self.detect_sensors()
+        self.last_refresh = time.monotonic()
+        if self.resolution is not None:
+            self.set_resolution(self.resolution)
 
     def __repr__(self):
         return f"DallasSensor(sensors={self.sensors})"
 
-def get_DS18B20_data():
-    dallas_sensor = DallasSensor()
-    return dallas_sensor.get_sensor_info()  # Llamamos a la funci  n correcta
\ No newline at end of file
+class ProbeRegistry:
+    """
+    Maps DS18B20 serials to compact numeric channel IDs.
+
+    The registry lives in a JSON file ({"28-...": {"channel": 1, "name": "intern"}}).
+    A probe that is not listed yet gets the next free channel and is written
+    back to the file, so new probes are reported instead of dropped and keep
+    their channel across reboots. `path` must be writable (under
+    /home/cubesat, not the repo checkout); while it does not exist the
+    registry starts from `seed`, the probe list shipped with the repo.
+
+    New channels only exist on board: the ground station's dallas_channels
+    table is filled by the migrations from the seed list, so readings of a
+    new channel land in dallas_readings without a serial or name until the
+    flight registry is copied into dallas_channels by hand.
+    """
+
+    SCALE = 100  # Temperatures travel as fixed-point centidegrees
+
+    def __init__(self, path, seed=None):
+        self.path = path
+        self.probes = {}
+        for candidate in (path, seed):
+            if candidate is None:
+                continue
+            try:
+                with open(candidate, 'r') as f:
+                    self.probes = json.load(f)
+                break
+            except FileNotFoundError:
+                continue
+        self.channels = {serial: probe['channel'] for serial, probe in self.probes.items()}
+
+    def channel(self, serial):
+        channel = self.channels.get(serial)
+        if channel is None:
+            channel = max(self.channels.values(), default=0) + 1
+            self.channels[serial] = channel
+            self.probes[serial] = {'channel': channel, 'name': serial}
+            self.save()
+        return channel
+
+    def save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self.probes, f, indent=4)
+        except OSError as e:
+            print(f"Could not save the probe registry {self.path}: {e}")
+
+    def encode(self, info):
+        """{serial: degC} -> {channel: centidegrees} for the telemetry frame."""
+        return {self.channel(serial): int(round(temp * self.SCALE)) for serial, temp in info.items()}
+
+def decode_dallas(block):
+    """Telemetry 'Dallas' block -> list of (channel, degC) rows."""
+    return [(int(channel), value / ProbeRegistry.SCALE) for channel, value in (block or {}).items()]
+
+
+_DALLAS = None
+
+def get_DS18B20_data(resolution=None):
+    # The probe list is cached and rescanned periodically instead of on every call
+    global _DALLAS
+    if _DALLAS is None:
+        _DALLAS = DallasSensor(resolution)
+    return _DALLAS.get_sensor_info_bulk()
@@ -152,11 +152,37 @@ def process_gsa(parts):
         'vdop': vdop
     }
 
+def collect_gps_data(serial_port, ref_lat=None, ref_lon=None):
+    """
+    Lee sentencias del puerto hasta tener GGA, RMC y GSA y añade la distancia
+    a las coordenadas de referencia si están disponibles.
+    """
+    gps_data = {}
+    required_messages = {'GGA', 'RMC', 'GSA'}
+
+    while True:
+        nmea_data = read_gps_data(serial_port)
+        if nmea_data:
+            message_type = nmea_data.get('type')
+            if message_type in required_messages:
+                gps_data[message_type] = nmea_data
+        if required_messages.issubset(gps_data.keys()):
+            break
+
+    # Calcular la distancia a las coordenadas de referencia si están disponibles
+    if ref_lat is not None and ref_lon is not None:
+        current_lat = gps_data.get('GGA', {}).get('latitude')
+        current_lon = gps_data.get('GGA', {}).get('longitude')
+        if current_lat is not None and current_lon is not None:
+            distance = haversine(current_lat, current_lon, ref_lat, ref_lon)
+            gps_data['distance'] = distance
+
+    return gps_data
+
 def get_GPS_data(ref_lat=None, ref_lon=None, baudrate=9600, timeout=1, hwid="1546:01A9", description="None"):
     """
     Obtiene datos del GPS, busca el puerto, inicializa la conexión y lee los datos.
     """
-    gps_data = {}
     serial_port = None
 
     try:
@@ -164,27 +190,7 @@ def get_GPS_data(ref_lat=None, ref_lon=None, baudrate=9600, timeout=1, hwid="154
         port = find_gps_port(description, hwid)
         # Inicializar el GPS
         serial_port = initialize_gps(port, baudrate, timeout)
-
-        required_messages = {'GGA', 'RMC', 'GSA'}
-
-        while True:
-            nmea_data = read_gps_data(serial_port)
-            if nmea_data:
-                message_type = nmea_data.get('type')
-                if message_type in required_messages:
-                    gps_data[message_type] = nmea_data
-            if required_messages.issubset(gps_data.keys()):
-                break
-
-        # Calcular la distancia a las coordenadas de referencia si están disponibles
-        if ref_lat is not None and ref_lon is not None:
-            current_lat = gps_data.get('GGA', {}).get('latitude')
-            current_lon = gps_data.get('GGA', {}).get('longitude')
-            if current_lat is not None and current_lon is not None:
-                distance = haversine(current_lat, current_lon, ref_lat, ref_lon)
-                gps_data['distance'] = distance
-
-        return gps_data
+        return collect_gps_data(serial_port, ref_lat, ref_lon)
 
     except KeyboardInterrupt:
         print("Lectura interrumpida.")
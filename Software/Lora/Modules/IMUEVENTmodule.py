@@ -0,0 +1,195 @@
+"""* * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+*                                                                            *
+*                         Developed by Javier Bolanos                        *
+*                  https://github.com/javierbolanosllano                     *
+*                                                                            *
+*                      UAXSAT IV Project - 2024                              *
+*                   https://github.com/UAXSat/UAXSat                         *
+*                                                                            *
+* * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *"""
+
+# IMUEVENTmodule.py
+import os
+import time
+import threading
+from collections import deque
+import numpy as np
+
+from .IMUmodule import STREAM_COLUMNS
+
+_AXES = STREAM_COLUMNS[1:]
+_STANDARD_GRAVITY = 9.80665
+
+# Default trigger thresholds
+DEFAULT_THRESHOLDS = {
+    "freefall_g": 0.3,       # |a| below this...
+    "freefall_s": 0.1,       # ...for at least this long (balloon burst)
+    "shock_g": 4.0,          # |a| above this (parachute deploy, landing)
+    "spin_dps": 360.0,       # |w| above this (violent tumble)
+}
+
+
+class WindowStats:
+    """
+    Running min/max/mean/RMS per axis over the current telemetry window.
+
+    Memory is constant whatever the window length or sample rate: every
+    block delivered by the IMUStream is folded into count, sum, sum of
+    squares, min and max, and `summary` closes the window. The frame gets
+    the mean and max per axis rounded to `decimals`; min and RMS only with
+    `extended`, since every key costs airtime on the LoRa link.
+    """
+
+    def __init__(self, decimals=3, extended=False):
+        self.decimals = decimals
+        self.extended = extended
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        n = len(_AXES)
+        self.count = 0
+        self.sum = np.zeros(n)
+        self.sumsq = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+
+    def process(self, samples, mag=None):
+        if samples.shape[0] == 0:
+            return
+        values = samples[:, 1:]
+        block_sum = values.sum(axis=0)
+        block_sumsq = np.einsum("ij,ij->j", values, values)
+        block_min = values.min(axis=0)
+        block_max = values.max(axis=0)
+        with self.lock:
+            self.count += values.shape[0]
+            self.sum += block_sum
+            self.sumsq += block_sumsq
+            np.minimum(self.min, block_min, out=self.min)
+            np.maximum(self.max, block_max, out=self.max)
+
+    def summary(self):
+        """Closes the window and returns its statistics (means under the usual ACELX..GIROZ keys)."""
+        with self.lock:
+            count = self.count
+            data = {"N": count}
+            if count:
+                mean = self.sum / count
+                rms = np.sqrt(self.sumsq / count)
+                d = self.decimals
+                for i, name in enumerate(_AXES):
+                    data[name] = round(float(mean[i]), d)
+                    data[f"{name}_MAX"] = round(float(self.max[i]), d)
+                    if self.extended:
+                        data[f"{name}_MIN"] = round(float(self.min[i]), d)
+                        data[f"{name}_RMS"] = round(float(rms[i]), d)
+            self._reset()
+        return data
+
+
+class EventDetector:
+    """
+    Threshold detector for free fall, shock and spin on the IMU stream.
+
+    On a trigger the event is queued at once (so the emitter can send a
+    priority frame) and, `post_seconds` later, the samples from
+    `pre_seconds` before the trigger to `post_seconds` after it are taken
+    from the stream's ring buffer and saved to `log_dir`. No extra
+    pre-trigger buffer is needed as long as the stream keeps at least
+    pre + post seconds.
+    """
+
+    def __init__(self, stream, thresholds=None, pre_seconds=2.0, post_seconds=3.0, holdoff=5.0, log_dir=None):
+        self.stream = stream
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.holdoff = holdoff
+        self.log_dir = log_dir
+
+        self.freefall_samples = max(1, int(self.thresholds["freefall_s"] * stream.sample_rate))
+        self.low_run = 0
+        self.last_trigger = -np.inf
+        self.capturing = None  # Event whose post-trigger window is still open
+        self.events = deque(maxlen=32)
+        self.triggered = threading.Event()
+
+    def process(self, samples, mag=None):
+        if samples.shape[0] == 0:
+            return
+        t = samples[:, 0]
+        accel = np.sqrt(np.einsum("ij,ij->i", samples[:, 1:4], samples[:, 1:4])) / _STANDARD_GRAVITY
+        gyro = np.degrees(np.sqrt(np.einsum("ij,ij->i", samples[:, 4:7], samples[:, 4:7])))
+
+        if self.capturing is not None and t[-1] >= self.capturing["t"] + self.post_seconds:
+            self._finish_capture()
+
+        low = accel < self.thresholds["freefall_g"]
+        high = (accel > self.thresholds["shock_g"]) | (gyro > self.thresholds["spin_dps"])
+        if not low.any():
+            self.low_run = 0
+            if not high.any():
+                return
+
+        # Only samples beyond a threshold get here, so the loop is short
+        previous = -1
+        for i in np.flatnonzero(low | high):
+            if low[i]:
+                self.low_run = self.low_run + 1 if previous == i - 1 or (previous == -1 and i == 0) else 1
+            else:
+                self.low_run = 0
+            previous = i
+            if t[i] - self.last_trigger < self.holdoff:
+                continue
+            if self.low_run >= self.freefall_samples:
+                self._trigger("FREEFALL", t[i], accel[i])
+            elif accel[i] > self.thresholds["shock_g"]:
+                self._trigger("SHOCK", t[i], accel[i:].max())
+            elif gyro[i] > self.thresholds["spin_dps"]:
+                self._trigger("SPIN", t[i], gyro[i:].max())
+        if not low[-1]:
+            self.low_run = 0
+
+    def _trigger(self, kind, t, peak):
+        event = {"type": kind, "t": float(t), "peak": round(float(peak), 2),
+                 "utc": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())}
+        self.last_trigger = t
+        self.capturing = event
+        self.events.append(event)
+        self.triggered.set()
+
+    def _finish_capture(self):
+        event, self.capturing = self.capturing, None
+        if not self.log_dir:
+            return
+        samples = self.stream.latest(self.pre_seconds + self.post_seconds + 1.0)
+        window = samples[(samples[:, 0] >= event["t"] - self.pre_seconds) &
+                         (samples[:, 0] <= event["t"] + self.post_seconds)]
+        path = os.path.join(self.log_dir, f"event_{event['type'].lower()}_{event['t']:.3f}.npy")
+        try:
+            np.save(path, window)
+        except OSError as e:
+            print(f"Error saving IMU event capture {path}: {e}")
+
+    def wait(self, timeout):
+        """
+        Sleeps up to `timeout` seconds and returns early with the list of new
+        events as soon as one triggers (empty list on timeout).
+        """
+        if not self.triggered.wait(timeout):
+            return []
+        self.triggered.clear()
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+
+def start_imu_monitoring(stream, thresholds=None, log_dir=None, extended_stats=False):
+    """Attaches window statistics and an event detector to `stream`."""
+    stats = WindowStats(extended=extended_stats)
+    detector = EventDetector(stream, thresholds, log_dir=log_dir)
+    stream.add_consumer(stats.process)
+    stream.add_consumer(detector.process)
+    return stats, detector
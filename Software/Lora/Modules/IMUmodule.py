@@ -10,11 +10,47 @@
 
 # IMUmodule.py
 import time
-import board
-import adafruit_icm20x
+import threading
+import numpy as np
+
+# ICM-20948 user bank 0 registers used by the FIFO streaming mode
+_REG_USER_CTRL = 0x03
+_REG_INT_STATUS_2 = 0x1B
+_REG_FIFO_EN_1 = 0x66
+_REG_FIFO_EN_2 = 0x67
+_REG_FIFO_RST = 0x68
+_REG_FIFO_MODE = 0x69
+_REG_FIFO_COUNTH = 0x70
+_REG_FIFO_R_W = 0x72
+_REG_BANK_SEL = 0x7F
+
+_USER_CTRL_FIFO_EN = 0x40
+_FIFO_EN_2_ACCEL_GYRO = 0x1E  # ACCEL_FIFO_EN | GYRO_Z/Y/X_FIFO_EN
+_FIFO_MODE_SNAPSHOT = 0x1F  # Stop writing when full instead of breaking frame alignment
+
+_FIFO_SIZE = 512  # bytes
+_FIFO_FRAME_SIZE = 12  # accel XYZ + gyro XYZ, big-endian int16
+_FIFO_READ_CHUNK = 20 * _FIFO_FRAME_SIZE  # bytes per I2C burst
+
+_BASE_SAMPLE_RATE = 1125.0  # Hz, internal ODR when the DLPF is enabled
+
+# LSB per g and LSB per dps for each AccelRange / GyroRange setting
+_ACCEL_SENSITIVITY = (16384.0, 8192.0, 4096.0, 2048.0)
+_GYRO_SENSITIVITY = (131.0, 65.5, 32.8, 16.4)
+_STANDARD_GRAVITY = 9.80665
+_DEG_TO_RAD = np.pi / 180.0
+
+# Columns of every buffered sample
+STREAM_COLUMNS = ("t", "ACELX", "ACELY", "ACELZ", "GIROX", "GIROY", "GIROZ")
+
+# Record layout of the full-rate local log (monotonic time kept in double precision)
+LOG_DTYPE = np.dtype([("t", "<f8")] + [(name, "<f4") for name in STREAM_COLUMNS[1:]])
 
 # Funci  n para inicializar el sensor ICM
 def initialize_sensor():
+    # Drivers importados aquí: el módulo se puede importar sin el hardware
+    import board
+    import adafruit_icm20x
     i2c = board.I2C()  # Utiliza board.SCL y board.SDA por defecto
     icm = adafruit_icm20x.ICM20948(i2c)
     return icm
@@ -46,4 +82,266 @@ def read_sensor_data(icm):
 
 def get_IMU_data():
     imu = initialize_sensor()
-    return read_sensor_data(imu)
\ No newline at end of file
+    return read_sensor_data(imu)
+
+
+class IMUStream:
+    """
+    High-rate ICM-20948 acquisition using the on-chip FIFO.
+
+    Accelerometer and gyroscope samples are pushed by the sensor into its
+    FIFO at `sample_rate` Hz and drained in bulk I2C reads by a background
+    thread. The decoded samples (m/s^2 and rad/s, same units as the
+    Adafruit driver) are kept in a ring buffer of `buffer_seconds` seconds
+    together with their monotonic timestamps.
+
+    Two independent cursors are kept over the buffer: one for the telemetry
+    summary (`summary`) and one for the full-rate local log (`drain_log`),
+    so each consumer sees every sample exactly once.
+    """
+
+    def __init__(self, icm=None, sample_rate=225.0, buffer_seconds=30.0, poll_interval=0.05,
+                 accel_range=None, gyro_range=None):
+        self.icm = icm if icm is not None else initialize_sensor()
+        if accel_range is not None:
+            self.icm.accelerometer_range = accel_range  # adafruit_icm20x.AccelRange value
+        if gyro_range is not None:
+            self.icm.gyro_range = gyro_range  # adafruit_icm20x.GyroRange value
+        self.i2c_device = self.icm.i2c_device
+        self.sample_rate = self._configure_rate(sample_rate)
+        self.poll_interval = poll_interval
+
+        self.capacity = int(self.sample_rate * buffer_seconds)
+        self.buffer = np.zeros((self.capacity, len(STREAM_COLUMNS)), dtype=np.float64)
+        self.total = 0  # Samples written since start (monotonic index)
+        self.summary_index = 0
+        self.log_index = 0
+        self.overflows = 0
+        self.mag = None  # Latest magnetometer reading (uT), refreshed on every poll
+        self.consumers = []
+
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+        self.accel_scale = _STANDARD_GRAVITY / _ACCEL_SENSITIVITY[self.icm.accelerometer_range]
+        self.gyro_scale = _DEG_TO_RAD / _GYRO_SENSITIVITY[self.icm.gyro_range]
+        self._chunk = bytearray(_FIFO_READ_CHUNK)
+
+    def _configure_rate(self, sample_rate):
+        """Programs the accel/gyro dividers and returns the real output rate in Hz."""
+        divisor = max(0, min(255, int(round(_BASE_SAMPLE_RATE / sample_rate)) - 1))
+        self.icm.gyro_data_rate_divisor = divisor
+        self.icm.accelerometer_data_rate_divisor = divisor
+        return _BASE_SAMPLE_RATE / (1 + divisor)
+
+    def read_uint8(self, reg):
+        """ Reads one byte (uint8) from the specified bank 0 register """
+        obuffer = bytearray((reg,))
+        ibuffer = bytearray(1)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(obuffer, ibuffer)
+        return ibuffer[0]
+
+    def write_uint8(self, reg, val):
+        """ Writes one byte (uint8) to the specified bank 0 register """
+        with self.i2c_device as i2c:
+            i2c.write(bytes((reg, val)))
+
+    def read_into(self, reg, ibuffer, length):
+        """ Reads `length` bytes starting at `reg` in a single I2C transaction """
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes((reg,)), ibuffer, in_end=length)
+
+    def fifo_count(self):
+        """Returns the number of bytes waiting in the FIFO."""
+        count = bytearray(2)
+        self.read_into(_REG_FIFO_COUNTH, count, 2)
+        return ((count[0] & 0x1F) << 8) | count[1]
+
+    def reset_fifo(self):
+        self.write_uint8(_REG_FIFO_RST, 0x1F)
+        self.write_uint8(_REG_FIFO_RST, 0x00)
+
+    def enable_fifo(self):
+        """Routes accel and gyro samples to the FIFO and starts filling it."""
+        self.write_uint8(_REG_BANK_SEL, 0x00)
+        self.write_uint8(_REG_FIFO_EN_1, 0x00)
+        self.write_uint8(_REG_FIFO_EN_2, _FIFO_EN_2_ACCEL_GYRO)
+        self.write_uint8(_REG_FIFO_MODE, _FIFO_MODE_SNAPSHOT)
+        self.write_uint8(_REG_USER_CTRL, self.read_uint8(_REG_USER_CTRL) | _USER_CTRL_FIFO_EN)
+        self.reset_fifo()
+
+    def disable_fifo(self):
+        self.write_uint8(_REG_BANK_SEL, 0x00)
+        self.write_uint8(_REG_FIFO_EN_2, 0x00)
+        self.write_uint8(_REG_USER_CTRL, self.read_uint8(_REG_USER_CTRL) & ~_USER_CTRL_FIFO_EN & 0xFF)
+
+    def read_fifo(self):
+        """Drains every complete sample currently in the FIFO and returns the raw bytes."""
+        overflow = self.read_uint8(_REG_INT_STATUS_2) & 0x1F
+        available = self.fifo_count()
+        available -= available % _FIFO_FRAME_SIZE
+        chunks = []
+        while available > 0:
+            length = min(available, _FIFO_READ_CHUNK)
+            self.read_into(_REG_FIFO_R_W, self._chunk, length)
+            chunks.append(bytes(self._chunk[:length]))
+            available -= length
+        if overflow:
+            # Snapshot mode stopped writing when the FIFO filled up: what we
+            # read is still aligned, but start clean so no partial frame follows.
+            self.overflows += 1
+            self.reset_fifo()
+        return b"".join(chunks)
+
+    def decode(self, raw, t_end):
+        """
+        Decodes packed FIFO frames into an (n, 7) array of timestamped samples.
+        Samples are spaced 1/sample_rate apart, the last one at `t_end`.
+        """
+        counts = np.frombuffer(raw, dtype=">i2").reshape(-1, 6)
+        n = counts.shape[0]
+        samples = np.empty((n, len(STREAM_COLUMNS)), dtype=np.float64)
+        samples[:, 0] = t_end - np.arange(n - 1, -1, -1) / self.sample_rate
+        samples[:, 1:4] = counts[:, 0:3] * self.accel_scale
+        samples[:, 4:7] = counts[:, 3:6] * self.gyro_scale
+        return samples
+
+    def append(self, samples):
+        """Copies decoded samples into the ring buffer."""
+        n = samples.shape[0]
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self.total += n - self.capacity
+            n = self.capacity
+        with self.lock:
+            start = self.total % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            self.buffer[:n - first] = samples[first:]
+            self.total += n
+
+    def poll(self):
+        """Drains the FIFO once and returns the number of new samples."""
+        raw = self.read_fifo()
+        t_end = time.monotonic()
+        if not raw:
+            return 0
+        samples = self.decode(raw, t_end)
+        self.append(samples)
+        if self.consumers:
+            self.mag = read_magnetic(self.icm)
+            for consumer in self.consumers:
+                consumer(samples, self.mag)
+        return samples.shape[0]
+
+    def add_consumer(self, consumer):
+        """
+        Registers `consumer(samples, mag)`, called from the drain thread with
+        every new block of samples and the magnetometer reading taken with it.
+        """
+        self.consumers.append(consumer)
+
+    def _since(self, index):
+        """Returns (samples, new_index) for every sample written after `index`."""
+        with self.lock:
+            total = self.total
+            index = max(index, total - self.capacity)
+            n = total - index
+            positions = (np.arange(index, total) % self.capacity) if n else np.empty(0, dtype=np.int64)
+            return self.buffer[positions].copy(), total
+
+    def latest(self, seconds):
+        """Returns the samples captured during the last `seconds` seconds."""
+        n = min(int(seconds * self.sample_rate), self.total, self.capacity)
+        samples, _ = self._since(self.total - n)
+        return samples
+
+    def drain_log(self):
+        """Returns the full-rate samples not yet written to the local log."""
+        samples, self.log_index = self._since(self.log_index)
+        return samples
+
+    def summary(self):
+        """
+        Summary statistics over the samples captured since the previous call,
+        meant for the telemetry frame and rounded to 3 decimals. Means keep
+        the old ACELX..GIROZ keys.
+        """
+        samples, self.summary_index = self._since(self.summary_index)
+        data = {"N": int(samples.shape[0]), "RATE": self.sample_rate, "OVF": self.overflows}
+        if samples.shape[0] == 0:
+            return data
+        values = samples[:, 1:]
+        means = values.mean(axis=0)
+        stds = values.std(axis=0)
+        mins = values.min(axis=0)
+        maxs = values.max(axis=0)
+        for i, name in enumerate(STREAM_COLUMNS[1:]):
+            data[name] = round(float(means[i]), 3)
+            data[f"{name}_SD"] = round(float(stds[i]), 3)
+            data[f"{name}_MIN"] = round(float(mins[i]), 3)
+            data[f"{name}_MAX"] = round(float(maxs[i]), 3)
+        return data
+
+    def _run(self):
+        while self.running:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error draining the IMU FIFO: {e}")
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        """Enables the FIFO and starts the background drain thread."""
+        if self.running:
+            return
+        self.enable_fifo()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="imu-fifo", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.disable_fifo()
+
+    def __repr__(self):
+        return f"IMUStream(sample_rate={self.sample_rate:.1f}, samples={self.total})"
+
+
+def get_IMU_stream_data(stream, stats=None):
+    """
+    Telemetry block for the streaming mode: statistics of the samples since
+    the previous frame (from `stats`, an IMUEVENTmodule.WindowStats, when
+    given) plus the latest magnetometer reading.
+    """
+    try:
+        data = stats.summary() if stats is not None else stream.summary()
+        magnetic = stream.mag if stream.mag is not None else read_magnetic(stream.icm)
+        data.update({"MAGX": round(float(magnetic[0]), 3), "MAGY": round(float(magnetic[1]), 3),
+                     "MAGZ": round(float(magnetic[2]), 3)})
+        return data
+    except Exception as e:
+        print(f"Error reading the IMU stream: {e}")
+        return None
+
+def write_IMU_log(stream, path):
+    """Appends the pending full-rate samples to `path` as LOG_DTYPE records."""
+    samples = stream.drain_log()
+    if samples.shape[0]:
+        records = np.empty(samples.shape[0], dtype=LOG_DTYPE)
+        for i, name in enumerate(STREAM_COLUMNS):
+            records[name] = samples[:, i]
+        with open(path, "ab") as f:
+            records.tofile(f)
+    return samples.shape[0]
+
+def read_IMU_log(path):
+    """Loads a full-rate log written by write_IMU_log."""
+    return np.fromfile(path, dtype=LOG_DTYPE)
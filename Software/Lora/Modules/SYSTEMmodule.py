@@ -11,11 +11,15 @@
 # SYSTEMmodule
 import psutil
 
-def get_system_data():
-    """Recoge estadísticas del sistema de la Raspberry Pi."""
+def get_system_data(interval=1):
+    """
+    Recoge estadísticas del sistema de la Raspberry Pi. El uso de CPU se mide
+    durante `interval` segundos; con None no espera y da el uso desde la
+    llamada anterior.
+    """
 
     # Uso de CPU
-    cpu_usage = psutil.cpu_percent(interval=1)
+    cpu_usage = psutil.cpu_percent(interval=interval)
 
     # Uso de RAM
     virtual_mem = psutil.virtual_memory()
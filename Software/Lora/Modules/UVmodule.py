@@ -11,8 +11,6 @@
 
 # AS7331.py
 import time
-import board
-from adafruit_bus_device.i2c_device import I2CDevice
 
 DEFAULT_I2C_ADDR = 0x74
 
@@ -172,6 +170,8 @@ class AS7331:
     """
 
     def __init__(self, i2c_bus, address=DEFAULT_I2C_ADDR):
+        # Imported here so that the module can be imported without the hardware
+        from adafruit_bus_device.i2c_device import I2CDevice
         self.i2c_device = I2CDevice(i2c_bus, address)
 
         # Keep local copies of gain, integration_time, etc the  for conversion
@@ -854,6 +854,7 @@ def bytes_to_uint16(lo_byte, hi_byte):
 
 # Main
 def initialize_sensor():
+    import board
     sensor = AS7331(board.I2C())
     sensor.gain = GAIN_512X
     sensor.integration_time = INTEGRATION_TIME_128MS
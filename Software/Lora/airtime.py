@@ -0,0 +1,157 @@
+# airtime.py
+#
+# Tiempo en el aire de las tramas LoRa y presupuesto de ciclo de trabajo.
+#
+# El E220-900T30D (LLCC68) parte cada mensaje en paquetes de packet_size
+# bytes, y cada paquete lleva su propio preámbulo y cabecera. El tiempo en el
+# aire de un paquete sale de la fórmula de Semtech (AN1200.13) con el factor
+# de dispersión (SF) y el ancho de banda de cada air_rate. Ebyte no publica
+# esa correspondencia: AIR_RATE_MODULATION usa, para cada velocidad nominal,
+# la combinación SF/BW válida del LLCC68 con una velocidad LoRa igual o
+# algo menor, de modo que el tiempo calculado nunca se queda corto.
+#
+# El canal 18 del E220-900 es 868,125 MHz (850,125 + canal). En la sub-banda
+# g1 de 868 MHz (ETSI EN 300 220) el límite es un 1 % de ciclo de trabajo:
+# 36 s de emisión por hora. AirtimeBudget lleva la cuenta en una ventana
+# deslizante y dice si una trama cabe en lo que queda.
+#
+#   python3 airtime.py                                  # tiempo en el aire por air_rate y tamaño
+#   python3 airtime.py --packet-size 128 --sizes 300 966
+#   python3 airtime.py --sample-frame                   # añade la trama de bench_insert.sample_frame
+
+import math
+import time
+import argparse
+import collections
+
+from metrics import REGISTRY
+
+AIRTIME_SECONDS = REGISTRY.counter('uaxsat_airtime_seconds_total', "Tiempo en el aire de las tramas enviadas")
+AIRTIME_REMAINING = REGISTRY.gauge('uaxsat_airtime_remaining_seconds',
+                                   "Tiempo en el aire disponible en la ventana del ciclo de trabajo")
+DUTY_CYCLE = REGISTRY.gauge('uaxsat_duty_cycle_ratio', "Ciclo de trabajo en la ventana deslizante")
+FRAMES_DEFERRED = REGISTRY.counter('uaxsat_frames_deferred_total',
+                                   "Tramas retrasadas o descartadas por el presupuesto de tiempo en el aire", ['reason'])
+
+# air_rate (bps nominales del E220) -> (SF, BW en Hz)
+AIR_RATE_MODULATION = {
+    2400: (9, 125000),     # 1,76 kbps
+    4800: (9, 250000),     # 3,52 kbps
+    9600: (8, 250000),     # 6,25 kbps
+    19200: (8, 500000),    # 12,5 kbps
+    38400: (6, 500000),    # 37,5 kbps
+    62500: (5, 500000),    # 62,5 kbps
+}
+
+PREAMBLE_SYMBOLS = 8
+CODING_RATE = 1  # 4/5
+
+def time_on_air(payload_bytes, spreading_factor, bandwidth, coding_rate=CODING_RATE,
+                preamble=PREAMBLE_SYMBOLS, explicit_header=True, crc=True):
+    """Segundos en el aire de un paquete LoRa de `payload_bytes` bytes."""
+    symbol_time = (2 ** spreading_factor) / bandwidth
+    # Optimización para velocidades bajas, obligatoria con símbolos de más de 16 ms
+    low_data_rate = 1 if symbol_time > 0.016 else 0
+    numerator = 8 * payload_bytes - 4 * spreading_factor + 28 + 16 * crc - (0 if explicit_header else 20)
+    payload_symbols = 8 + max(math.ceil(numerator / (4 * (spreading_factor - 2 * low_data_rate))) * (coding_rate + 4), 0)
+    return (preamble + 4.25 + payload_symbols) * symbol_time
+
+def frame_airtime(size, air_rate, packet_size):
+    """Segundos en el aire de un mensaje de `size` bytes partido en paquetes de `packet_size`."""
+    spreading_factor, bandwidth = AIR_RATE_MODULATION[air_rate]
+    full, rest = divmod(size, packet_size)
+    seconds = full * time_on_air(packet_size, spreading_factor, bandwidth)
+    if rest:
+        seconds += time_on_air(rest, spreading_factor, bandwidth)
+    return seconds
+
+class AirtimeBudget:
+    """
+    Tiempo en el aire usado en los últimos `window` segundos. allows()
+    comprueba si una trama cabe en el `duty_cycle` de la ventana; record()
+    la apunta después de enviarla.
+    """
+
+    def __init__(self, air_rate, packet_size, duty_cycle=0.01, window=3600.0):
+        if air_rate not in AIR_RATE_MODULATION:
+            raise ValueError(f"air_rate {air_rate} no válido (válidos: {', '.join(map(str, AIR_RATE_MODULATION))})")
+        self.air_rate = air_rate
+        self.packet_size = packet_size
+        self.duty_cycle = duty_cycle
+        self.window = window
+        self.budget = duty_cycle * window
+        self.sent = collections.deque()  # (instante, segundos en el aire)
+        self.used_seconds = 0.0
+
+    def airtime(self, size):
+        return frame_airtime(size, self.air_rate, self.packet_size)
+
+    def _expire(self, now):
+        while self.sent and self.sent[0][0] <= now - self.window:
+            self.used_seconds -= self.sent.popleft()[1]
+        if not self.sent:
+            self.used_seconds = 0.0  # Sin restos de redondeo
+
+    def remaining(self, now=None):
+        """Segundos en el aire disponibles ahora."""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        remaining = max(0.0, self.budget - self.used_seconds)
+        AIRTIME_REMAINING.set(remaining)
+        DUTY_CYCLE.set(self.used_seconds / self.window)
+        return remaining
+
+    def allows(self, seconds, now=None):
+        return seconds <= self.remaining(now)
+
+    def wait_time(self, seconds, now=None):
+        """Segundos hasta que `seconds` de tiempo en el aire quepan en la ventana."""
+        now = time.monotonic() if now is None else now
+        excess = seconds - self.remaining(now)
+        if excess <= 0:
+            return 0.0
+        if seconds > self.budget:
+            return math.inf  # No cabe nunca en la ventana
+        for sent_at, airtime in self.sent:
+            excess -= airtime
+            if excess <= 0:
+                return sent_at + self.window - now
+        return math.inf
+
+    def record(self, seconds, now=None):
+        now = time.monotonic() if now is None else now
+        self.sent.append((now, seconds))
+        self.used_seconds += seconds
+        AIRTIME_SECONDS.inc(seconds)
+        self.remaining(now)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo en el aire de las tramas LoRa del E220.")
+    parser.add_argument('--packet-size', type=int, default=200, choices=(32, 64, 128, 200))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 200, 300, 966], help="Tamaños de trama en bytes")
+    parser.add_argument('--duty-cycle', type=float, default=0.01)
+    parser.add_argument('--sample-frame', action='store_true',
+                        help="Añade el tamaño de la trama de ejemplo (IMU y ATT del streaming), en JSON y JSON compacto")
+    args = parser.parse_args()
+
+    if args.sample_frame:
+        import json
+        import datetime
+        from bench_insert import sample_frame
+        frame = sample_frame(0, datetime.datetime(2026, 1, 1))
+        sizes = [len(json.dumps(frame)) + 6, len(json.dumps(frame, separators=(',', ':'))) + 6]
+        print(f"Trama de ejemplo con <<< >>>: {sizes[0]} B en JSON, {sizes[1]} B en JSON compacto")
+        args.sizes += sizes
+
+    budget = args.duty_cycle * 3600
+    print(f"packet_size {args.packet_size}; ms en el aire y tramas por hora con un {args.duty_cycle:.1%} de ciclo de trabajo")
+    print(f"  {'air_rate':>8s} {'SF/BW':>9s}" + ''.join(f" {size:>7d} B {'/h':>6s}" for size in args.sizes))
+    for air_rate, (spreading_factor, bandwidth) in AIR_RATE_MODULATION.items():
+        row = f"  {air_rate:8d} {spreading_factor:>3d}/{bandwidth // 1000:<5d}"
+        for size in args.sizes:
+            seconds = frame_airtime(size, air_rate, args.packet_size)
+            row += f" {seconds * 1000:7.0f} ms {int(budget // seconds):6d}"
+        print(row)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+# archive.py
+#
+# Archivo columnar del vuelo para el análisis posterior. Vuelca
+# sensor_readings y dallas_readings (desde PostgreSQL o desde el fichero
+# SQLite de a bordo) y el log de la IMU a frecuencia completa a ficheros
+# Parquet con columnas tipadas y compresión, particionados por día:
+#
+#   <out>/sensor_readings/date=2026-10-19/data.parquet
+#   <out>/dallas_readings/date=2026-10-19/data.parquet
+#   <out>/imu_stream/imu_stream.parquet
+#
+# Las filas se leen y se escriben por lotes (un row group por lote), así que
+# la memoria no depende de la duración del vuelo. Cada día es un solo
+# fichero: al exportar una ventana, las filas de ese día que ya estaban en el
+# archivo y caen dentro de la ventana se sustituyen y las de fuera se
+# conservan, así que repetir una exportación (con la misma ventana o con
+# otra que se solape) no duplica filas.
+#
+#   python3 archive.py --out /data/vuelo1 --from "2026-10-19 08:00" --to "2026-10-19 14:00"
+#   python3 archive.py --out /data/vuelo1 --sqlite /media/sd/telemetry.db --imu-log /media/sd/imu_stream.bin
+#   python3 archive.py --out /data/vuelo1 --info
+#
+# Para leerlo: load_table / load_dataframe / load_arrays, p. ej.
+#
+#   from archive import load_dataframe
+#   df = load_dataframe('/data/vuelo1', columns=['timestamp', 'bmp_altitude'])
+
+import os
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from telemetry_schema import COLUMNS, COLUMN_TYPES, DALLAS_COLUMNS, DALLAS_COLUMN_TYPES
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+ARROW_TYPES = {
+    'TIMESTAMP': pa.timestamp('us'),
+    'REAL': pa.float32(),
+    'DOUBLE PRECISION': pa.float64(),
+    'SMALLINT': pa.int16(),
+    'INTEGER': pa.int32(),
+}
+
+TABLES = {
+    'sensor_readings': (COLUMNS, COLUMN_TYPES),
+    'dallas_readings': (DALLAS_COLUMNS, DALLAS_COLUMN_TYPES),
+}
+
+def arrow_schema(columns, types):
+    return pa.schema([pa.field(column, ARROW_TYPES[sql_type]) for column, sql_type in zip(columns, types)])
+
+def _to_datetime(value):
+    # SQLite guarda el timestamp como texto
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def record_batch(rows, schema):
+    """Lista de tuplas -> RecordBatch de Arrow con el esquema de la tabla."""
+    columns = list(zip(*rows))
+    arrays = [pa.array([_to_datetime(v) for v in columns[0]], type=schema.field(0).type)]
+    arrays += [pa.array(values, type=schema.field(i).type, from_pandas=True) for i, values in enumerate(columns[1:], 1)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+class PartitionedWriter:
+    """
+    Escribe lotes ordenados por tiempo en un fichero Parquet por día
+    (data.parquet). Las filas que ya había de ese día fuera de la ventana
+    [time_from, time_to) se copian antes y después de las nuevas; el fichero
+    se escribe aparte y sustituye a los anteriores al cerrar el día.
+    """
+
+    def __init__(self, root, table, schema, compression='zstd', time_from=None, time_to=None):
+        self.root = root
+        self.table = table
+        self.schema = schema
+        self.compression = compression
+        self.time_from = None if time_from is None else pa.scalar(_to_datetime(time_from), type=pa.timestamp('us'))
+        self.time_to = None if time_to is None else pa.scalar(_to_datetime(time_to), type=pa.timestamp('us'))
+        self.day = None
+        self.writer = None
+        self.directory = None
+        self.after = None
+        self.rows = 0
+        self.files = 0
+
+    def write(self, batch):
+        timestamps = batch.column(0).to_numpy()
+        days = timestamps.astype('datetime64[D]')
+        # Trozos contiguos del mismo día (el lote viene ordenado por tiempo)
+        bounds = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+            day = days[start]
+            if day != self.day:
+                self._open(day)
+            self.writer.write_batch(batch.slice(start, end - start))
+            self.rows += int(end - start)
+
+    def _kept(self, directory):
+        """Filas que ya había en `directory` fuera de la ventana (None si no hay ficheros)."""
+        files = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.parquet')]
+        if not files or (self.time_from is None and self.time_to is None):
+            return None
+        outside = None
+        if self.time_from is not None:
+            outside = ds.field('timestamp') < self.time_from
+        if self.time_to is not None:
+            later = ds.field('timestamp') >= self.time_to
+            outside = later if outside is None else outside | later
+        return ds.dataset(files, schema=self.schema, format='parquet').to_table(filter=outside).sort_by('timestamp')
+
+    def _open(self, day):
+        self.close()
+        self.directory = os.path.join(self.root, self.table, f"date={day}")
+        os.makedirs(self.directory, exist_ok=True)
+        kept = self._kept(self.directory)
+        # El prefijo '.' deja el fichero a medias fuera del dataset
+        self.writer = pq.ParquetWriter(os.path.join(self.directory, '.data.parquet.tmp'), self.schema,
+                                       compression=self.compression)
+        if kept is not None and kept.num_rows:
+            before = kept.filter(pc.less(kept.column('timestamp'), self.time_from)) \
+                if self.time_from is not None else kept.slice(0, 0)
+            self.writer.write_table(before)
+            self.after = kept.slice(before.num_rows)
+        self.day = day
+        self.files += 1
+
+    def close(self):
+        if self.writer:
+            if self.after is not None:
+                self.writer.write_table(self.after)
+                self.after = None
+            self.writer.close()
+            self.writer = None
+            for name in os.listdir(self.directory):
+                if name.endswith('.parquet'):
+                    os.remove(os.path.join(self.directory, name))
+            os.replace(os.path.join(self.directory, '.data.parquet.tmp'), os.path.join(self.directory, 'data.parquet'))
+
+def _window(time_from, time_to):
+    conditions, params = [], []
+    if time_from:
+        conditions.append("timestamp >= {}")
+        params.append(time_from)
+    if time_to:
+        conditions.append("timestamp < {}")
+        params.append(time_to)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+def postgres_batches(db, table, columns, time_from=None, time_to=None, batch_size=50000):
+    """Lotes de filas de una tabla de PostgreSQL (cursor de servidor)."""
+    where, params = _window(time_from, time_to)
+    query = f"SELECT {', '.join(columns)} FROM {table}{where.format(*['%s'] * len(params))} ORDER BY timestamp"
+    with db.transaction() as session:
+        yield from session.stream(query, params, batch_size)
+
+def sqlite_batches(path, table, columns, time_from=None, time_to=None, batch_size=50000):
+    """Lotes de filas del almacén SQLite de a bordo (local_store.py)."""
+    where, params = _window(time_from, time_to)
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = connection.execute(
+            f"SELECT {', '.join(columns)} FROM {table}{where.format(*['?'] * len(params))} ORDER BY timestamp", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        connection.close()
+
+def export_table(batches, root, table, compression='zstd', time_from=None, time_to=None):
+    """
+    Escribe los lotes de `table` (la ventana [time_from, time_to)) en
+    <root>/<table>/date=.../; devuelve el número de filas.
+    """
+    columns, types = TABLES[table]
+    schema = arrow_schema(columns, types)
+    writer = PartitionedWriter(root, table, schema, compression, time_from, time_to)
+    try:
+        for rows in batches:
+            writer.write(record_batch(rows, schema))
+    finally:
+        writer.close()
+    logger.info("%s: %s filas en %s ficheros.", table, writer.rows, writer.files)
+    return writer.rows
+
+def export_imu_log(path, root, compression='zstd', batch_rows=1 << 20):
+    """
+    Pasa el log de la IMU a frecuencia completa (write_IMU_log) a Parquet.
+    La columna t es el tiempo monotónico del ordenador de vuelo, como en el log.
+    """
+    from Modules.IMUmodule import LOG_DTYPE
+
+    total = os.path.getsize(path) // LOG_DTYPE.itemsize
+    schema = pa.schema([pa.field(name, pa.from_numpy_dtype(LOG_DTYPE[name])) for name in LOG_DTYPE.names])
+    directory = os.path.join(root, 'imu_stream')
+    os.makedirs(directory, exist_ok=True)
+    output = os.path.join(directory, os.path.splitext(os.path.basename(path))[0] + '.parquet')
+    with pq.ParquetWriter(output, schema, compression=compression) as writer:
+        for offset in range(0, total, batch_rows):
+            records = np.fromfile(path, dtype=LOG_DTYPE, count=min(batch_rows, total - offset),
+                                  offset=offset * LOG_DTYPE.itemsize)
+            writer.write_batch(pa.RecordBatch.from_arrays([pa.array(records[name]) for name in LOG_DTYPE.names],
+                                                          schema=schema))
+    logger.info("imu_stream: %s muestras en %s.", total, output)
+    return total
+
+def load_table(root, table='sensor_readings', columns=None, time_from=None, time_to=None):
+    """
+    Lee el archivo como una tabla de Arrow, leyendo sólo las columnas y los
+    días pedidos. Una tabla exportada sin filas (sin ficheros) se devuelve
+    vacía, con su esquema.
+    """
+    path = os.path.join(root, table)
+    dataset = ds.dataset(path, format='parquet', partitioning='hive') if os.path.isdir(path) else None
+    if dataset is None or not dataset.files:
+        schema = arrow_schema(*TABLES[table])
+        return schema.empty_table().select(columns) if columns else schema.empty_table()
+    condition = None
+    if time_from is not None:
+        condition = ds.field('timestamp') >= pa.scalar(_to_datetime(time_from), type=pa.timestamp('us'))
+        condition = condition & (ds.field('date') >= str(_to_datetime(time_from).date()))
+    if time_to is not None:
+        upper = (ds.field('timestamp') < pa.scalar(_to_datetime(time_to), type=pa.timestamp('us'))) & \
+                (ds.field('date') <= str(_to_datetime(time_to).date()))
+        condition = upper if condition is None else condition & upper
+    table = dataset.to_table(columns=columns, filter=condition)
+    if 'date' in table.column_names and (columns is None or 'date' not in columns):
+        table = table.drop_columns(['date'])
+    return table.sort_by('timestamp') if 'timestamp' in table.column_names else table
+
+def load_dataframe(root, table='sensor_readings', columns=None, time_from=None, time_to=None):
+    """Igual que load_table, como DataFrame de pandas indexado por timestamp."""
+    frame = load_table(root, table, columns, time_from, time_to).to_pandas()
+    return frame.set_index('timestamp') if 'timestamp' in frame.columns else frame
+
+def load_arrays(root, table='sensor_readings', columns=None, time_from=None, time_to=None):
+    """Igual que load_table, como dict columna -> array de NumPy (los nulos pasan a NaN)."""
+    table = load_table(root, table, columns, time_from, time_to)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+def load_imu_log(root, name='imu_stream'):
+    """Log de la IMU exportado, como array estructurado con los campos de LOG_DTYPE."""
+    table = pq.read_table(os.path.join(root, 'imu_stream', f"{name}.parquet"))
+    records = np.empty(table.num_rows, dtype=[(field.name, field.type.to_pandas_dtype()) for field in table.schema])
+    for field in table.schema:
+        records[field.name] = table.column(field.name).to_numpy()
+    return records
+
+def info(root):
+    for table in sorted(os.listdir(root)):
+        dataset = ds.dataset(os.path.join(root, table), format='parquet', partitioning='hive')
+        size = sum(os.path.getsize(path) for path in dataset.files)
+        print(f"{table}: {dataset.count_rows()} filas, {len(dataset.files)} ficheros, {size / 1e6:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo Parquet del vuelo para el análisis posterior.")
+    parser.add_argument('--out', required=True, help="Directorio del archivo")
+    parser.add_argument('--from', dest='time_from', help="Inicio de la ventana (UTC), p. ej. '2026-10-19 08:00'")
+    parser.add_argument('--to', dest='time_to', help="Fin de la ventana (UTC, excluido)")
+    parser.add_argument('--dsn', help="Cadena de conexión (por defecto la de db_functions)")
+    parser.add_argument('--sqlite', help="Lee del almacén SQLite de a bordo en vez de PostgreSQL")
+    parser.add_argument('--imu-log', help="Log de la IMU a frecuencia completa (IMU_LOG_PATH)")
+    parser.add_argument('--compression', default='zstd', help="zstd, snappy, gzip, lz4 o none")
+    parser.add_argument('--info', action='store_true', help="Resumen del archivo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.info:
+        info(args.out)
+        return
+
+    db = None
+    if not args.sqlite:
+        # psycopg2 sólo hace falta si se exporta desde PostgreSQL
+        from db_functions import DBClient
+        db = DBClient(args.dsn)
+    try:
+        for table, (columns, _) in TABLES.items():
+            if args.sqlite:
+                batches = sqlite_batches(args.sqlite, table, columns, args.time_from, args.time_to)
+            else:
+                batches = postgres_batches(db, table, columns, args.time_from, args.time_to)
+            export_table(batches, args.out, table, args.compression, args.time_from, args.time_to)
+        if args.imu_log:
+            export_imu_log(args.imu_log, args.out, args.compression)
+    finally:
+        if db:
+            db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# bench_insert.py
+#
+# Microbenchmark de la inserción de telemetría, separando las dos partes:
+#
+#   mapeo  trama (dict) -> fila (tupla); sin base de datos
+#   BD     fila -> PostgreSQL, con INSERT de texto, EXECUTE preparado y COPY binario
+#
+# La parte de BD escribe en sensor_readings (con sus particiones y el trigger
+# de los agregados) y deshace la transacción tras cada pasada, así que no
+# deja datos. Como todo el lote va en una transacción, el trigger actualiza
+# las mismas cubetas una y otra vez: las cifras fila a fila son un mínimo;
+# en producción cada trama se confirma por separado.
+#
+#   python3 bench_insert.py                  # mapeo + BD (DSN de db_functions)
+#   python3 bench_insert.py --no-db          # sólo mapeo
+#   python3 bench_insert.py --rows 5000 --dsn "host=... dbname=..."
+
+import io
+import time
+import random
+import argparse
+import datetime
+
+import numpy as np
+import psycopg2
+
+from telemetry_schema import FIELDS, COLUMNS, COLUMN_TYPES, INSERT_QUERY, record_values
+from db_functions import get_dsn, binary_copy_data, prepared_statement
+from Modules.IMUEVENTmodule import WindowStats
+from Modules.ATTITUDEmodule import AttitudeEstimator
+
+def imu_blocks(t, samples=10, rate=100.0):
+    """
+    Bloques IMU y ATT del modo de streaming: WindowStats y AttitudeEstimator
+    alimentados con `samples` muestras aleatorias que acaban en `t`.
+    """
+    r = random.random
+    block = np.array([[t - (samples - k) / rate, r(), r(), 9.8 + r(), r(), r(), r()] for k in range(samples)])
+    mag = (20 * r(), 20 * r(), 20 * r())
+    stats, attitude = WindowStats(), AttitudeEstimator()
+    stats.process(block)
+    attitude.process(block, mag)
+    imu = stats.summary()
+    imu.update({"MAGX": round(mag[0], 3), "MAGY": round(mag[1], 3), "MAGZ": round(mag[2], 3)})
+    return imu, attitude.summary()
+
+def sample_frame(i, start):
+    """Trama con la misma forma que la que arma el emisor en modo de streaming."""
+    r = random.random
+    when = start + datetime.timedelta(seconds=i)
+    imu, att = imu_blocks(when.timestamp())
+    return {
+        'IMU': imu,
+        'ATT': att,
+        'UV': {'UVA': r(), 'UVB': r(), 'UVC': r(), 'UV Temp': 25 * r()},
+        'BMP': {'pressure': 1000 * r(), 'temperature': 20 * r(), 'altitude': 1000 * r(), 'vertical_speed': r()},
+        'Dallas': {1: 2150, 2: -312},
+        'GPS': {'GGA': {'latitude': 40 + r(), 'longitude': -3 - r(), 'num_satellites': 9,
+                        'altitude': 700 + r(), 'height_geoid': 50.1},
+                'RMC': {'speed_mps': r()}, 'GSA': {'pdop': 1.2, 'hdop': 0.9, 'vdop': 0.8}, 'distance': 1000 * r()},
+        'System': {'CPU Usage (%)': 10 * r(), 'RAM Usage (%)': 40 * r(),
+                   'Sensors': {'Temperatures': {'cpu_thermal': [{'Current': 45 + r()}]}}},
+        'timestamp': when.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def legacy_values(data):
+    """Mapeo anterior de insert_data_to_db: dict con .get() encadenados y to_float anidada."""
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return {
+        'acelx': data.get('IMU', {}).get('ACELX'),
+        'acely': data.get('IMU', {}).get('ACELY'),
+        'acelz': data.get('IMU', {}).get('ACELZ'),
+        'girox': data.get('IMU', {}).get('GIROX'),
+        'giroy': data.get('IMU', {}).get('GIROY'),
+        'giroz': data.get('IMU', {}).get('GIROZ'),
+        'magx': data.get('IMU', {}).get('MAGX'),
+        'magy': data.get('IMU', {}).get('MAGY'),
+        'magz': data.get('IMU', {}).get('MAGZ'),
+        'uva': data.get('UV', {}).get('UVA'),
+        'uvb': data.get('UV', {}).get('UVB'),
+        'uvc': data.get('UV', {}).get('UVC'),
+        'uv_temp': data.get('UV', {}).get('UV Temp'),
+        'bmp_pressure': data.get('BMP', {}).get('pressure'),
+        'bmp_temperature': data.get('BMP', {}).get('temperature'),
+        'bmp_altitude': data.get('BMP', {}).get('altitude'),
+        'bmp_vertical_speed': to_float(data.get('BMP', {}).get('vertical_speed')),
+        'gps_speed_mps': to_float(data.get('GPS', {}).get('RMC', {}).get('speed_mps')),
+        'gps_gga_latitude': to_float(data.get('GPS', {}).get('GGA', {}).get('latitude')),
+        'gps_gga_longitude': to_float(data.get('GPS', {}).get('GGA', {}).get('longitude')),
+        'gps_distance': to_float(data.get('GPS', {}).get('distance')),
+        'gps_altitude': to_float(data.get('GPS', {}).get('GGA', {}).get('altitude')),
+        'gps_height_geoid': to_float(data.get('GPS', {}).get('GGA', {}).get('height_geoid')),
+        'gps_satellites': data.get('GPS', {}).get('GSV', {}).get('num_satellites'),
+        'gps_pdop': to_float(data.get('GPS', {}).get('GSA', {}).get('pdop')),
+        'gps_hdop': to_float(data.get('GPS', {}).get('GSA', {}).get('hdop')),
+        'gps_vdop': to_float(data.get('GPS', {}).get('GSA', {}).get('vdop')),
+        'system_cpu_usage_percent': data.get('System', {}).get('CPU_Usage'),
+        'system_ram_usage_percent': data.get('System', {}).get('RAM_Usage'),
+        'system_temp_cpu_thermal': data.get('System', {}).get('CPU_Temperature'),
+        'timestamp': data.get('timestamp')
+    }
+
+def field_values(data):
+    """Mapeo genérico campo a campo con Field.get (mismo resultado que record_values)."""
+    return (data.get('timestamp'),) + tuple(field.get(data) for field in FIELDS)
+
+def rate(function, items, repeat=3, cleanup=None):
+    """Mejor resultado de `repeat` pasadas, en elementos por segundo."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(items)
+        best = min(best, time.perf_counter() - start)
+        if cleanup:
+            cleanup()
+    return len(items) / best
+
+def bench_mapping(frames):
+    print("Mapeo trama -> fila")
+    for name, mapper in (("dict + .get() encadenados (anterior)", legacy_values),
+                         ("Field.get campo a campo", field_values),
+                         ("record_values precompilado", record_values)):
+        rows_per_second = rate(lambda items: [mapper(data) for data in items], frames)
+        print(f"  {name:40s} {rows_per_second:12,.0f} filas/s")
+
+def bench_db(frames, dsn):
+    rows = [record_values(data) for data in frames]
+    named_query = INSERT_QUERY.replace("%s", "{}").format(*(f"%({column})s" for column in COLUMNS))
+    named_rows = [dict(zip(COLUMNS, row)) for row in rows]
+
+    connection = psycopg2.connect(dsn)
+    cursor = connection.cursor()
+
+    def text_insert(items):
+        for row in items:
+            cursor.execute(named_query, row)
+
+    def prepared_insert(items):
+        for row in items:
+            cursor.execute(execute_query, row)
+
+    def copy_insert(items):
+        cursor.copy_expert(copy_query, io.BytesIO(binary_copy_data(items, COLUMN_TYPES)))
+
+    query, count = prepared_statement(INSERT_QUERY)
+    cursor.execute(f"PREPARE bench_insert AS {query}")
+    connection.commit()
+    execute_query = f"EXECUTE bench_insert ({', '.join(['%s'] * count)})"
+    copy_query = f"COPY sensor_readings ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+
+    print(f"Base de datos ({len(rows)} filas por pasada, transacción deshecha tras cada una)")
+    try:
+        for name, function, items in (("INSERT de texto fila a fila", text_insert, named_rows),
+                                      ("EXECUTE preparado fila a fila", prepared_insert, rows),
+                                      ("COPY binario del lote", copy_insert, rows)):
+            rows_per_second = rate(function, items, cleanup=connection.rollback)
+            print(f"  {name:40s} {rows_per_second:12,.0f} filas/s")
+    finally:
+        connection.rollback()
+        cursor.close()
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del mapeo y la inserción de telemetría.")
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--dsn', help="Cadena de conexión (por defecto la de db_functions)")
+    parser.add_argument('--no-db', action='store_true', help="Sólo el mapeo")
+    args = parser.parse_args()
+
+    random.seed(0)
+    start = datetime.datetime.utcnow().replace(microsecond=0)
+    frames = [sample_frame(i, start) for i in range(args.rows)]
+    bench_mapping(frames)
+    if not args.no_db:
+        try:
+            bench_db(frames, args.dsn or get_dsn())
+        except psycopg2.Error as e:
+            print(f"Base de datos no disponible, se omite: {e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# bench_logging.py
+#
+# Coste en CPU del logging en un ciclo de telemetría (una trama), antes y
+# después de flightlog: las mismas llamadas que hacen el emisor (lectura,
+# serialización y envío) y el receptor (un trozo del puerto serie cada ~64
+# bytes, decodificación e inserción), con la consola redirigida a /dev/null.
+#
+#   python3 bench_logging.py
+#   python3 bench_logging.py --cycles 5000
+
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import datetime
+import tempfile
+
+from bench_insert import sample_frame
+from flightlog import RateLimitFilter, RingBufferHandler
+
+emitter_log = logging.getLogger('emitteroptimiced')
+receiver_log = logging.getLogger('receiveroptimiced')
+db_log = logging.getLogger('db_functions')
+
+CHUNK_SIZE = 64
+
+def legacy_emitter(data, message):
+    """Llamadas del emisor anteriores: f-strings con los dicts completos y el mensaje a INFO."""
+    emitter_log.info("Recolectando datos de sensores...")
+    for key in ('IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System', 'timestamp'):
+        emitter_log.debug(f"Datos {key}: {data[key]}")
+    emitter_log.info("Datos de sensores recolectados exitosamente.")
+    emitter_log.info("Serializando los datos de sensores...")
+    emitter_log.debug(f"Datos serializados: {message}")
+    emitter_log.info(f"Enviando mensaje: {message}")
+    emitter_log.info("Mensaje enviado.")
+
+def current_emitter(data, message):
+    emitter_log.debug("Recolectando datos de sensores...")
+    for key in ('IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System', 'timestamp'):
+        emitter_log.debug("Datos %s: %s", key, data[key])
+    emitter_log.debug("Datos de sensores recolectados exitosamente.")
+    emitter_log.debug("Serializando los datos de sensores...")
+    emitter_log.debug("Datos serializados: %s", message)
+    emitter_log.debug("Enviando mensaje: %s", message)
+    emitter_log.info("Mensaje enviado (%d bytes).", len(message))
+
+def legacy_receiver(chunks, message, data):
+    """Llamadas del receptor anteriores: el buffer entero en cada trozo y el mensaje a INFO."""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        receiver_log.debug(f"Buffer actualizado: {buffer}")
+    receiver_log.debug(f"Mensaje completo extraído: {message}")
+    receiver_log.info(f"Mensaje limpio extraído: {message}")
+    receiver_log.info("Datos del sensor recibidos y deserializados.")
+    receiver_log.debug(f"Datos deserializados: {data}")
+    db_log.info("Insertando datos en la base de datos...")
+    db_log.info("Datos insertados exitosamente en la base de datos.")
+
+def current_receiver(chunks, message, data):
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        receiver_log.debug("Buffer actualizado: %r", buffer)
+    receiver_log.debug("Mensaje completo extraído: %s", message)
+    receiver_log.debug("Mensaje limpio extraído: %s", message)
+    receiver_log.debug("Datos deserializados: %s", data)
+    db_log.debug("Insertando datos en la base de datos...")
+    db_log.info("Datos insertados exitosamente en la base de datos (%s).", data['timestamp'])
+
+def configure(level, rate_limit=False, ring_path=None):
+    """Logger raíz como lo dejan basicConfig / setup_logging, con la consola a /dev/null."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+    console = logging.StreamHandler(open(os.devnull, 'w'))
+    console.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    root.addHandler(console)
+    handlers = [console]
+    if ring_path:
+        ring = RingBufferHandler(ring_path)
+        root.addHandler(ring)
+        handlers.append(ring)
+    if rate_limit:
+        # En vuelo sale una trama cada 5 s y nunca se llega al límite; aquí se
+        # mide el coste del filtro sin que suprima nada
+        limiter = RateLimitFilter(burst=10**9)
+        for handler in handlers:
+            handler.addFilter(limiter)
+
+def per_cycle(function, args, cycles, repeat=3):
+    """Mejor de `repeat` pasadas, en microsegundos por ciclo."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(cycles):
+            function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best / cycles * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste del logging por ciclo de telemetría.")
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--period', type=float, default=5.0, help="Periodo del ciclo del emisor (s)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    data = sample_frame(0, datetime.datetime(2026, 1, 1))
+    message = f"<<<{json.dumps(data)}>>>"
+    raw = message.encode('utf-8')
+    text_chunks = [message[i:i + CHUNK_SIZE] for i in range(0, len(message), CHUNK_SIZE)]
+    byte_chunks = [raw[i:i + CHUNK_SIZE] for i in range(0, len(raw), CHUNK_SIZE)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        ring_path = os.path.join(directory, 'bench.ring')
+        cases = (
+            ("anterior (f-strings, basicConfig INFO)", logging.INFO, {}, legacy_emitter, legacy_receiver, text_chunks),
+            ("actual (perezoso, INFO)", logging.INFO, {'rate_limit': True}, current_emitter, current_receiver, byte_chunks),
+            ("actual + registro circular", logging.INFO, {'rate_limit': True, 'ring_path': ring_path},
+             current_emitter, current_receiver, byte_chunks),
+            ("actual con DEBUG + registro circular", logging.DEBUG, {'rate_limit': True, 'ring_path': ring_path},
+             current_emitter, current_receiver, byte_chunks),
+        )
+        print(f"Trama de {len(raw)} bytes, {len(byte_chunks)} trozos en el receptor; µs de CPU por ciclo")
+        print(f"  {'':40s} {'emisor':>10s} {'% ciclo':>8s} {'receptor':>10s}")
+        for name, level, options, emitter, receiver, chunks in cases:
+            configure(level, **options)
+            emitter_us = per_cycle(emitter, (data, message), args.cycles)
+            receiver_us = per_cycle(receiver, (chunks, message, data), args.cycles)
+            print(f"  {name:40s} {emitter_us:10.1f} {emitter_us / (args.period * 1e4):7.4f}% {receiver_us:10.1f}")
+        configure(logging.WARNING)
+
+if __name__ == '__main__':
+    main()
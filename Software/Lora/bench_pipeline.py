@@ -0,0 +1,306 @@
+# bench_pipeline.py
+#
+# Benchmarks de la cadena de telemetría con el hardware simulado de
+# sim_hardware.py, para ejecutarlos en cualquier PC con Linux:
+#
+#   sensor.*        lectura de cada módulo (IMU, UV, BMP, Dallas, GPS, System)
+#   stream.*        modo de streaming: FIFO del ICM-20948 (lectura y decodificación),
+#                   FIFO del BMP390 con compensación y Kalman, Madgwick y WindowStats
+#   as7331.*        conversión de las cuentas del AS7331 a µW/cm² y °C
+#   nmea.parse      una sentencia NMEA -> dict
+#   codec.*         JSON frente al formato binario de telemetry_schema
+#   deframe         trozos de 64 bytes del puerto serie -> mensaje (Deframer)
+#   db.*            inserción en SQLite (LocalStore) y, con --dsn, en PostgreSQL
+#   pipeline.frame  de las lecturas a la fila guardada, sin la radio
+#
+# Cada medida calibra el número de llamadas por ronda (como timeit) y se
+# queda con la mediana de las rondas. Con --save se guardan los resultados
+# en JSON y con --compare se comparan con otros guardados antes: sale con
+# código 1 si algún benchmark es más lento que el de referencia más la
+# tolerancia.
+#
+#   python3 bench_pipeline.py
+#   python3 bench_pipeline.py -k codec -k deframe
+#   python3 bench_pipeline.py --save bench_base.json
+#   python3 bench_pipeline.py --compare bench_base.json --tolerance 0.25
+#   python3 bench_pipeline.py --dsn "host=... dbname=..."     # añade PostgreSQL
+#
+# System se mide con get_system_data(interval=None): sin la espera de 1 s de
+# cpu_percent, que no es trabajo de la Raspberry Pi.
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import statistics
+import subprocess
+
+import sim_hardware
+sim_hardware.install()  # Los drivers se importan al abrir cada sensor, ya con los simulados
+
+from constants import initial_lat, initial_lon
+from telemetry_schema import COLUMNS, COLUMN_TYPES, INSERT_QUERY, record_values, encode_frame, decode_frame
+from tracing import FrameTrace
+from local_store import LocalStore
+from emitteroptimiced import serialize_sensor_data
+from receiveroptimiced import Deframer, decode_message
+from Modules import IMUmodule, BMPmodule
+from Modules.IMUEVENTmodule import WindowStats
+from Modules.ATTITUDEmodule import AttitudeEstimator
+from Modules.SYSTEMmodule import get_system_data
+from Modules.UVmodule import AS7331, GAIN_512X, INTEGRATION_TIME_128MS, read_sensor_data as read_uv_data
+from Modules.DS18B20module import DallasSensor, ProbeRegistry
+from Modules.GPSmodule import collect_gps_data, process_nmea
+
+CHUNK_SIZE = 64
+PROBES = {'28-00000a1b2c3d': 21.5, '28-00000a1b2c3e': -3.12, '28-00000a1b2c3f': 4.25}
+
+class _AS7331(AS7331):
+    # Sin esperar el tiempo de integración: el simulador siempre tiene la medida lista
+    measurement_sleep_dt = 0
+
+class _AS7331Counts(_AS7331):
+    # Cuentas fijas (UVA, UVB, UVC, temperatura): sólo se mide la conversión
+    raw_values = (1200, 800, 150, 1850)
+
+def _uv_sensor(cls):
+    sensor = cls(sim_hardware.BUS)
+    sensor.gain = GAIN_512X
+    sensor.integration_time = INTEGRATION_TIME_128MS
+    return sensor
+
+class SimEmitter:
+    """Un ciclo del emisor sobre el hardware simulado, sensor a sensor como en get_all_sensor_data."""
+
+    def __init__(self, directory):
+        self.icm = IMUmodule.initialize_sensor()
+        self.uv = _uv_sensor(_AS7331)
+        self.bmp = BMPmodule.initialize_sensor()
+        base = sim_hardware.w1_bus(PROBES, os.path.join(directory, 'w1'))
+        dallas_class = type('SimDallasSensor', (DallasSensor,),
+                            {'BASE_DIR': base, 'MASTER_DIR': os.path.join(base, 'w1_bus_master1', '')})
+        self.dallas = dallas_class()
+        self.registry = ProbeRegistry(os.path.join(directory, 'probes.json'))
+        self.gps = sim_hardware.SerialPort()
+        self.seq = 0
+
+    def read(self, name):
+        if name == 'IMU':
+            return IMUmodule.read_sensor_data(self.icm)
+        if name == 'UV':
+            return read_uv_data(self.uv)
+        if name == 'BMP':
+            return BMPmodule.read_sensor_data(self.bmp)
+        if name == 'Dallas':
+            return self.registry.encode(self.dallas.get_sensor_info())
+        if name == 'GPS':
+            return collect_gps_data(self.gps, initial_lat, initial_lon)
+        return get_system_data(interval=None)
+
+    def frame(self):
+        self.seq += 1
+        trace = FrameTrace(self.seq)
+        data = {}
+        for name in ('IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System'):
+            with trace.span(name):
+                data[name] = self.read(name)
+        data['timestamp'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(trace.wall))
+        data['TRACE'] = trace.to_frame()
+        return data
+
+    def message(self):
+        return f'<<<{serialize_sensor_data(self.frame())}>>>'.encode('utf-8')
+
+def measure(function, min_time=0.05, repeat=5, cleanup=None):
+    """
+    Segundos por llamada. El número de llamadas por ronda se dobla hasta que
+    la ronda dura `min_time`; `cleanup` se llama tras cada ronda, fuera del tiempo.
+    """
+    def run(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if cleanup:
+            cleanup()
+        return elapsed
+
+    number = 1
+    elapsed = run(number)
+    while elapsed < min_time:
+        number *= 2
+        elapsed = run(number)
+    times = [elapsed / number] + [run(number) / number for _ in range(repeat - 1)]
+    return {'number': number, 'min': min(times), 'median': statistics.median(times)}
+
+def benchmarks(directory, dsn=None):
+    """(nombre, función, cleanup, nota) de cada benchmark; las funciones procesan una unidad."""
+    emitter = SimEmitter(directory)
+    frame = emitter.frame()
+    text = json.dumps(frame)
+    binary = encode_frame(frame)
+    message = f'<<<{text}>>>'.encode('utf-8')
+    chunks = [message[i:i + CHUNK_SIZE] for i in range(0, len(message), CHUNK_SIZE)]
+    sentences = list(sim_hardware.NMEA_SENTENCES)
+    counts = _uv_sensor(_AS7331Counts)
+
+    deframer = Deframer()
+    def deframe():
+        for chunk in chunks:
+            deframer.feed(chunk)
+
+    sentence_index = [0]
+    def parse_nmea():
+        sentence_index[0] += 1
+        process_nmea(sentences[sentence_index[0] % len(sentences)])
+
+    store = LocalStore(os.path.join(directory, 'bench.db'))
+    pipeline_store = LocalStore(os.path.join(directory, 'pipeline.db'))
+    pipeline_deframer = Deframer()
+    def pipeline():
+        raw = emitter.message()
+        for start in range(0, len(raw), CHUNK_SIZE):
+            for content in pipeline_deframer.feed(raw[start:start + CHUNK_SIZE]):
+                pipeline_store.append(decode_message(content))
+
+    cases = [
+        (f"sensor.{name}", (lambda name=name: emitter.read(name)), None, "")
+        for name in ('IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System')
+    ] + stream_benchmarks(emitter) + [
+        ("as7331.conversion", lambda: counts.values, None, "cuentas -> µW/cm² y °C"),
+        ("nmea.parse", parse_nmea, None, "por sentencia"),
+        ("codec.json.encode", lambda: json.dumps(frame), None, f"{len(text)} bytes"),
+        ("codec.json.decode", lambda: json.loads(text), None, ""),
+        ("codec.binary.encode", lambda: encode_frame(frame), None, f"{len(binary)} bytes"),
+        ("codec.binary.decode", lambda: decode_frame(binary), None, ""),
+        ("deframe", deframe, None, f"{len(chunks)} trozos por trama"),
+        ("db.sqlite.append", lambda: store.append(frame), None, f"lotes de {store.batch_size}"),
+        ("pipeline.frame", pipeline, None, "lectura -> JSON -> deframe -> SQLite"),
+    ]
+    if dsn:
+        cases += postgres_benchmarks(dsn, frame)
+    return cases
+
+def stream_benchmarks(emitter):
+    """Modo de streaming sobre las FIFO simuladas; cada llamada procesa un sondeo (12 muestras)."""
+    imu = IMUmodule.IMUStream(emitter.icm)
+    imu.enable_fifo()
+    bmp = BMPmodule.BMPStream()
+    raw = imu.read_fifo()
+    block = imu.decode(raw, time.monotonic())
+    mag = IMUmodule.read_magnetic(emitter.icm)
+    stats = WindowStats()
+    attitude = AttitudeEstimator()
+
+    def madgwick():
+        # Bloques consecutivos, como los entrega el hilo de la IMU
+        block[:, 0] += len(block) / imu.sample_rate
+        attitude.process(block, mag)
+
+    return [
+        ("stream.imu.poll", imu.poll, None, f"FIFO -> búfer, {len(block)} muestras"),
+        ("stream.imu.decode", lambda: imu.decode(raw, 0.0), None, f"{len(raw)} bytes"),
+        ("stream.bmp.poll", bmp.poll, None, "FIFO + compensación + Kalman"),
+        ("stream.madgwick", madgwick, None, f"{len(block)} muestras + magnetómetro"),
+        ("stream.window_stats", lambda: stats.process(block), stats.summary, f"{len(block)} muestras"),
+    ]
+
+def postgres_benchmarks(dsn, frame):
+    """Inserción en sensor_readings; la transacción se deshace tras cada ronda (no deja datos)."""
+    import psycopg2
+    from db_functions import binary_copy_data, prepared_statement
+
+    connection = psycopg2.connect(dsn)
+    cursor = connection.cursor()
+    query, count = prepared_statement(INSERT_QUERY)
+    cursor.execute(f"PREPARE bench_pipeline AS {query}")
+    connection.commit()
+    execute_query = f"EXECUTE bench_pipeline ({', '.join(['%s'] * count)})"
+    copy_query = f"COPY sensor_readings ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+    row = record_values(frame)
+    batch = [row] * 100
+
+    def execute():
+        cursor.execute(execute_query, row)
+
+    def copy():
+        cursor.copy_expert(copy_query, io.BytesIO(binary_copy_data(batch, COLUMN_TYPES)))
+
+    return [
+        ("db.postgres.execute", execute, connection.rollback, "EXECUTE preparado, una fila"),
+        ("db.postgres.copy", copy, connection.rollback, f"COPY binario de {len(batch)} filas"),
+    ]
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def print_results(results, baseline=None, tolerance=0.25):
+    """Tabla de resultados; devuelve los nombres más lentos que la referencia."""
+    slower = []
+    header = f"{'benchmark':22s} {'mediana':>11s} {'mínimo':>11s} {'ops/s':>12s}"
+    print(header + (f" {'referencia':>11s} {'cambio':>8s}" if baseline else "") + "  nota")
+    for name, result in results.items():
+        line = (f"{name:22s} {result['median'] * 1e6:9.1f}µs {result['min'] * 1e6:9.1f}µs "
+                f"{1 / result['median']:12,.0f}")
+        reference = baseline.get(name) if baseline else None
+        if reference:
+            change = result['median'] / reference['median'] - 1
+            flag = ""
+            if change > tolerance:
+                flag = " LENTO"
+                slower.append(name)
+            line += f" {reference['median'] * 1e6:9.1f}µs {change:+7.1%}{flag}"
+        elif baseline:
+            line += f" {'-':>11s} {'':>8s}"
+        print(f"{line}  {result['note']}")
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la cadena de telemetría (hardware simulado).")
+    parser.add_argument('-k', dest='patterns', action='append', help="Sólo los benchmarks que contienen el texto")
+    parser.add_argument('--dsn', help="Añade los benchmarks de PostgreSQL con esta cadena de conexión")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Duración mínima de cada ronda (s)")
+    parser.add_argument('--repeat', type=int, default=5, help="Rondas por benchmark")
+    parser.add_argument('--save', metavar='PATH', help="Guarda los resultados en JSON")
+    parser.add_argument('--compare', metavar='PATH', help="Compara con resultados guardados con --save")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Empeoramiento de la mediana admitido (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, function, cleanup, note in benchmarks(directory, args.dsn):
+            if args.patterns and not any(pattern in name for pattern in args.patterns):
+                continue
+            results[name] = dict(measure(function, args.min_time, args.repeat, cleanup), note=note)
+
+    slower = print_results(results, baseline, args.tolerance)
+    if args.save:
+        report = {
+            'meta': {'date': datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), 'commit': git_revision(),
+                     'python': platform.python_version(), 'platform': platform.platform(),
+                     'machine': platform.machine()},
+            'results': results,
+        }
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.save}")
+    if slower:
+        print(f"Más lentos que la referencia (>{args.tolerance:.0%}): {', '.join(slower)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# bench_startup.py
+#
+# Arranque en frío de los programas: tiempo de `import` de cada punto de
+# entrada en un intérprete nuevo (hasta que main() puede empezar), restando
+# el del propio intérprete, y los módulos que más tardan según
+# python -X importtime. Importar no debe tocar el hardware: el GPIO y los
+# drivers de los sensores se cargan en open_gpio() / initialize_sensor().
+#
+#   python3 bench_startup.py
+#   python3 bench_startup.py --runs 20 --top 10 emitteroptimiced
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ENTRY_POINTS = ('emitteroptimiced', 'receiveroptimiced', 'emiter', 'receiver')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def run(code, flags=()):
+    """Ejecuta `code` en un intérprete nuevo; devuelve (segundos, stderr)."""
+    result = subprocess.run([sys.executable, *flags, '-c', code], cwd=HERE, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result.stderr
+
+def cold_start(module, runs):
+    """Mediana del tiempo de import de `module`, medido dentro del proceso hijo (sin su arranque)."""
+    code = f"import time; t = time.perf_counter(); import {module}; import sys; sys.stderr.write(repr(time.perf_counter() - t))"
+    return statistics.median(float(run(code)) for _ in range(runs))
+
+def slowest_imports(module, top):
+    """(µs acumulados, módulo) de los imports de primer nivel más lentos."""
+    lines = []
+    for line in run(f"import {module}", ('-X', 'importtime')).splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        # Sangría de dos espacios por nivel; cada módulo sale después de los que importa
+        lines.append(((len(name) - len(name.lstrip()) - 1) // 2, int(cumulative_us), name.strip()))
+    entries = []
+    for level, cumulative_us, name in reversed(lines[:-1]):
+        if level == 0:
+            break  # Imports del arranque del intérprete, anteriores al del punto de entrada
+        if level == 1:
+            entries.append((cumulative_us, name))
+    return sorted(entries, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de los programas.")
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=6, help="Imports más lentos que se muestran")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        try:
+            seconds = cold_start(module, args.runs)
+        except RuntimeError as e:
+            print(f"{module}: no se puede importar ({e})")
+            continue
+        print(f"{module}: {seconds * 1000:.1f} ms")
+        for cumulative_us, name in slowest_imports(module, args.top):
+            print(f"    {cumulative_us / 1000:7.1f} ms  {name}")
+
+if __name__ == '__main__':
+    main()
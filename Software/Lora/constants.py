@@ -1,8 +1,8 @@
 # constants.py
 
-import RPi.GPIO as GPIO
+import os
 
-# Definiciones de pines GPIO
+# Definiciones de pines GPIO (se configuran en lora_functions.open_gpio())
 M0_PIN = 17
 M1_PIN = 27
 AUX_PIN = 22
@@ -14,8 +14,39 @@ initial_lon = -3.79028  # Longitud Final (Jaén)
 SERIAL_PORT = '/dev/ttyUSB0'  # Ajusta según tu sistema
 BAUD_RATE = 9600  # Debe coincidir con la configuración del módulo LoRa
 
-# Inicializar GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(M0_PIN, GPIO.OUT)
-GPIO.setup(M1_PIN, GPIO.OUT)
-GPIO.setup(AUX_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
\ No newline at end of file
+# Streaming de la IMU (FIFO del ICM-20948)
+IMU_SAMPLE_RATE = 225.0  # Hz
+IMU_ACCEL_RANGE = 3  # AccelRange: 0=2G, 1=4G, 2=8G, 3=16G (el detector de choques necesita > 4G)
+IMU_GYRO_RANGE = 3  # GyroRange: 0=250, 1=500, 2=1000, 3=2000 dps
+IMU_LOG_PATH = '/home/cubesat/imu_stream.bin'  # Log local a frecuencia completa
+IMU_EVENT_DIR = '/home/cubesat/imu_events'  # Capturas pre/post-trigger de eventos
+# Sondas DS18B20: resolución en bits (9=94 ms ... 12=750 ms por conversión)
+DALLAS_RESOLUTION = 11
+DALLAS_PROBES_PATH = '/home/cubesat/dallas_probes.json'  # Número de serie -> canal; las sondas nuevas se añaden aquí
+DALLAS_PROBES_SEED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dallas_probes.json')  # Copia inicial (repo)
+
+# Streaming del barómetro (FIFO del BMP390)
+BMP_ODR = 0x03  # 25 Hz (0x00=200, 0x01=100, 0x02=50, 0x03=25, 0x04=12.5 Hz)
+BMP_IIR_COEFFICIENT = 3
+MAG_CALIBRATION_PATH = '/home/cubesat/mag_calibration.json'  # Generado con Modules/ATTITUDEmodule.py
+
+# Telemetría guardada a bordo (SQLite en modo WAL, ver local_store.py)
+LOCAL_STORE_PATH = '/home/cubesat/telemetry.db'
+FLIGHT_LOG_PATH = '/home/cubesat/flight_log.ring'  # Registro circular de logs (flightlog.py)
+LATENCY_REPORT_PATH = '/home/cubesat/latency.json'  # Histogramas de latencia del receptor (tracing.py)
+FRAME_LOG_DIR = '/home/cubesat/frames'  # Tramas en NDJSON/CSV cuando no hay base de datos (frame_log.py)
+
+# Endpoints de métricas para Prometheus/Grafana (metrics.py)
+METRICS_HOST = '127.0.0.1'
+EMITTER_METRICS_PORT = 9101
+RECEIVER_METRICS_PORT = 9102
+FANIN_METRICS_PORT = 9103
+
+# Concentrador de varios receptores (fanin.py): socket Unix o host:puerto
+FANIN_ADDRESS = '/tmp/uaxsat_fanin.sock'
+
+# Broker MQTT de la estación de tierra (mqtt_bridge.py)
+MQTT_HOST = 'localhost'
+MQTT_PORT = 1883
+MQTT_TOPIC_PREFIX = 'uaxsat'
+
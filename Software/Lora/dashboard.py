@@ -0,0 +1,118 @@
+# dashboard.py
+#
+# Genera las consultas del dashboard de Grafana a partir de los paneles
+# declarados en telemetry_schema.PANELS. Las series leen de sensor_rollups
+# (migrations/003_rollups.sql) con la resolución (10 s, 1 min o 10 min) que
+# corresponde al rango mostrado; tablas y mapas leen sensor_readings. Todas
+# filtran por tiempo para que sólo se lean las particiones del rango.
+# La disposición y el estilo de los paneles se conservan del JSON existente.
+#
+#   python3 dashboard.py                   # reescribe el JSON del dashboard
+#   python3 dashboard.py --output otro.json
+
+import os
+import json
+import logging
+import argparse
+
+from telemetry_schema import PANELS, panel_metrics
+
+# Configuración del logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DASHBOARD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                              'Communications', 'UAXSAT GRAFANA VISUALIZATION.json')
+
+RESOLUTION = "rollup_resolution($__timeFrom(), $__timeTo())"
+
+def _metric_list(metrics):
+    return ", ".join(sorted({f"'{metric}'" for metric, _ in metrics}))
+
+def series_query(metrics):
+    """Media por cubeta de cada métrica, una columna por alias."""
+    columns = ",\n    ".join(
+        f"max(total / n) FILTER (WHERE metric = '{metric}') AS \"{alias}\"" for metric, alias in metrics
+    )
+    return (
+        f"SELECT bucket AS \"timestamp\",\n    {columns}\n"
+        f"FROM sensor_rollups\n"
+        f"WHERE resolution = {RESOLUTION}\n"
+        f"  AND metric IN ({_metric_list(metrics)})\n"
+        f"  AND $__timeFilter(bucket)\n"
+        f"GROUP BY bucket\nORDER BY bucket"
+    )
+
+def count_query(metrics):
+    """Número de lecturas de cada métrica en el rango."""
+    columns = ",\n    ".join(
+        f"sum(n) FILTER (WHERE metric = '{metric}') AS \"{alias}\"" for metric, alias in metrics
+    )
+    return (
+        f"SELECT\n    {columns}\n"
+        f"FROM sensor_rollups\n"
+        f"WHERE resolution = {RESOLUTION}\n"
+        f"  AND metric IN ({_metric_list(metrics)})\n"
+        f"  AND $__timeFilter(bucket)"
+    )
+
+def latest_query():
+    return 'SELECT max("timestamp") AS "timestamp" FROM sensor_readings WHERE $__timeFilter("timestamp")'
+
+def raw_query(metrics, time_alias='timestamp'):
+    """Lecturas completas del rango, ordenadas por tiempo (particiones + BRIN)."""
+    columns = ",\n    ".join(f'{metric} AS "{alias}"' for metric, alias in metrics)
+    return (
+        f"SELECT\n    {columns},\n    \"timestamp\" AS \"{time_alias}\"\n"
+        f"FROM sensor_readings\n"
+        f"WHERE $__timeFilter(\"timestamp\")\n"
+        f"ORDER BY \"timestamp\""
+    )
+
+def panel_query(panel_id):
+    kind = PANELS[panel_id][0]
+    metrics = panel_metrics(panel_id)
+    if kind == 'series':
+        return series_query(metrics)
+    if kind == 'count':
+        return count_query(metrics)
+    if kind == 'latest':
+        return latest_query()
+    if kind == 'raw':
+        return raw_query(metrics, *PANELS[panel_id][2:])
+    raise ValueError(f"Panel {panel_id}: tipo desconocido {kind}")
+
+def regenerate(dashboard):
+    """Reescribe rawSql de los paneles declarados. Devuelve los ids modificados."""
+    changed = []
+    for panel in dashboard['panels']:
+        pid = panel.get('id')
+        if pid not in PANELS:
+            logger.warning("Panel %s (%s) no está en telemetry_schema.PANELS", pid, panel.get('title'))
+            continue
+        sql = panel_query(pid)
+        if PANELS[pid][0] == 'count':
+            # La consulta ya devuelve el total: una sola fila
+            panel['options']['reduceOptions']['calcs'] = ['lastNotNull']
+        for target in panel.get('targets', []):
+            target['rawSql'] = sql
+            target['rawQuery'] = True
+            target['editorMode'] = 'code'
+        changed.append(pid)
+    return changed
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenera las consultas del dashboard de Grafana.")
+    parser.add_argument('--input', default=DASHBOARD_PATH)
+    parser.add_argument('--output', help="Fichero de salida (por defecto sobrescribe --input)")
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        dashboard = json.load(f)
+    changed = regenerate(dashboard)
+    with open(args.output or args.input, 'w', encoding='utf-8') as f:
+        json.dump(dashboard, f, indent=2, ensure_ascii=False)
+    print(f"{len(changed)} paneles regenerados.")
+
+if __name__ == '__main__':
+    main()
@@ -1,106 +1,383 @@
 # db_functions.py
 
-import psycopg2
+import io
+import os
+import re
+import time
+import struct
 import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+import psycopg2
+
+from Modules.DS18B20module import decode_dallas
+from telemetry_schema import INSERT_QUERY, DALLAS_INSERT_QUERY, COLUMNS, COLUMN_TYPES, DALLAS_COLUMNS, DALLAS_COLUMN_TYPES, record_values
+from metrics import REGISTRY
 
 # Configuración del logger
 logger = logging.getLogger(__name__)
 
-def connect_to_db():
+DB_INSERT_SECONDS = REGISTRY.histogram('uaxsat_db_insert_seconds', "Duración de cada inserción confirmada", ['kind'])
+DB_INSERT_FAILURES = REGISTRY.counter('uaxsat_db_insert_failures_total', "Inserciones fallidas", ['kind'])
+
+# Sentencias que se preparan (PREPARE) en cada conexión del pool
+STATEMENTS = {
+    'insert_reading': INSERT_QUERY,
+    'insert_dallas': DALLAS_INSERT_QUERY,
+}
+
+def get_dsn():
+    """
+    Cadena de conexión: UAXSAT_DB_DSN si está definida; si no, las variables
+    estándar de libpq (PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD) con
+    los valores de siempre por defecto.
+    """
+    dsn = os.environ.get('UAXSAT_DB_DSN')
+    if dsn:
+        return dsn
+    return "dbname={} user={} password={} host={} port={}".format(
+        os.environ.get('PGDATABASE', 'cubesat'),
+        os.environ.get('PGUSER', 'cubesat'),
+        os.environ.get('PGPASSWORD', 'cubesat'),
+        os.environ.get('PGHOST', 'localhost'),
+        os.environ.get('PGPORT', '5432'),
+    )
+
+# COPY ... FROM STDIN (FORMAT binary): cabecera, filas (nº de campos y cada
+# campo como longitud + bytes big-endian, -1 = NULL) y -1 al final
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_COPY_NULL = struct.pack(">i", -1)
+_PG_EPOCH = datetime(2000, 1, 1)
+
+def _pack_timestamp(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    delta = value - _PG_EPOCH
+    return struct.pack(">iq", 8, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+def _fixed_size(fmt):
+    packer = struct.Struct(">i" + fmt)
+    size = packer.size - 4
+    return lambda value: packer.pack(size, value)
+
+_COPY_PACKERS = {
+    'TIMESTAMP': _pack_timestamp,
+    'REAL': _fixed_size("f"),
+    'DOUBLE PRECISION': _fixed_size("d"),
+    'SMALLINT': _fixed_size("h"),
+    'INTEGER': _fixed_size("i"),
+}
+
+def binary_copy_data(rows, types):
+    """Filas (tuplas en el orden de `types`) -> datos para COPY en formato binario."""
+    packers = [_COPY_PACKERS[sql_type] for sql_type in types]
+    row_header = struct.pack(">h", len(types))
+    chunks = [_COPY_HEADER]
+    append = chunks.append
+    for row in rows:
+        append(row_header)
+        for pack, value in zip(packers, row):
+            append(_COPY_NULL if value is None else pack(value))
+    append(_COPY_TRAILER)
+    return b"".join(chunks)
+
+def connect_to_db(dsn=None):
     """Conecta a la base de datos y retorna la conexión y el cursor."""
     try:
         logger.info("Conectando a la base de datos...")
-        connection = psycopg2.connect(
-            database="cubesat",
-            user="cubesat",
-            password="cubesat",
-            host="localhost",
-            port="5432"
-        )
+        connection = psycopg2.connect(dsn or get_dsn())
         cursor = connection.cursor()
         logger.info("Conexión a la base de datos establecida.")
         return connection, cursor
     except psycopg2.Error as error:
-        logger.error(f"Error al conectar con la base de datos: {error}")
+        logger.error("Error al conectar con la base de datos: %s", error)
         return None, None
 
-def insert_data_to_db(cursor, connection, data):
-    """Inserta los datos recibidos en la base de datos."""
-    try:
-        logger.info("Insertando datos en la base de datos...")
-        insert_query = """
-        INSERT INTO sensor_readings (
-            acelx, acely, acelz, girox, giroy, giroz,
-            magx, magy, magz, uva, uvb, uvc, uv_temp,
-            bmp_pressure, bmp_temperature, bmp_altitude, bmp_vertical_speed,
-            dallas_intern, dallas_extern,
-            gps_speed_mps, gps_gga_latitude, gps_gga_longitude, gps_distance,
-            gps_altitude, gps_height_geoid, gps_satellites,
-            gps_pdop, gps_hdop, gps_vdop,
-            system_cpu_usage_percent, system_ram_usage_percent,
-            system_temp_cpu_thermal, timestamp
-        ) VALUES (
-            %(acelx)s, %(acely)s, %(acelz)s, %(girox)s, %(giroy)s, %(giroz)s,
-            %(magx)s, %(magy)s, %(magz)s, %(uva)s, %(uvb)s, %(uvc)s, %(uv_temp)s,
-            %(bmp_pressure)s, %(bmp_temperature)s, %(bmp_altitude)s, %(bmp_vertical_speed)s,
-            %(dallas_intern)s, %(dallas_extern)s,
-            %(gps_speed_mps)s, %(gps_gga_latitude)s, %(gps_gga_longitude)s, %(gps_distance)s,
-            %(gps_altitude)s, %(gps_height_geoid)s, %(gps_satellites)s,
-            %(gps_pdop)s, %(gps_hdop)s, %(gps_vdop)s,
-            %(system_cpu_usage_percent)s, %(system_ram_usage_percent)s,
-            %(system_temp_cpu_thermal)s, %(timestamp)s
-        );
-        """
 
-        # Función auxiliar para convertir valores a float
-        def to_float(value):
+def prepared_statement(query):
+    """SQL con %s -> (SQL con $1, $2... para PREPARE, número de parámetros)."""
+    counter = iter(range(1, query.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f"${next(counter)}", query).strip().rstrip(';'), query.count('%s')
+
+
+class DBUnavailable(Exception):
+    """La base de datos no responde y el cliente está esperando para reintentar."""
+
+
+class _PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_used = time.monotonic()
+        self.prepared = set()
+
+
+class DBSession:
+    """Cursor de una transacción de DBClient.transaction()."""
+
+    def __init__(self, client, pooled):
+        self.client = client
+        self.pooled = pooled
+        self.cursor = pooled.connection.cursor()
+
+    def execute(self, query, params=None):
+        self.cursor.execute(query, params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def _prepare(self, name):
+        query, count = self.client.statements[name]
+        if name not in self.pooled.prepared:
+            self.cursor.execute(f"PREPARE {name} AS {query}")
+            self.pooled.prepared.add(name)
+        return f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f"EXECUTE {name}"
+
+    def execute_prepared(self, name, params=()):
+        self.cursor.execute(self._prepare(name), params)
+
+    def executemany_prepared(self, name, rows):
+        self.cursor.executemany(self._prepare(name), rows)
+
+    def copy_rows(self, table, columns, types, rows):
+        """Inserta `rows` con un único COPY binario (sin parsear texto en el servidor)."""
+        data = io.BytesIO(binary_copy_data(rows, types))
+        self.cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", data)
+
+    def stream(self, query, params=None, batch_size=10000):
+        """Resultado de `query` en lotes de filas, con un cursor de servidor (no lo carga entero)."""
+        with self.pooled.connection.cursor(name='stream') as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
+
+class DBClient:
+    """
+    Pool pequeño de conexiones a PostgreSQL compartido por el emisor y el receptor.
+
+    - Las conexiones ociosas más de `health_interval` segundos se comprueban
+      con SELECT 1 antes de reutilizarse; las caídas se descartan.
+    - Si la conexión falla, los intentos siguientes esperan con backoff
+      exponencial (min_backoff, 2x, ... hasta max_backoff). Mientras tanto
+      transaction() lanza DBUnavailable al instante en vez de bloquear el
+      bucle principal.
+    - Las sentencias de `statements` ({nombre: SQL con %s}) se preparan con
+      PREPARE la primera vez que se usan en cada conexión, también tras
+      reconectar.
+    """
+
+    def __init__(self, dsn=None, statements=None, max_connections=2, health_interval=30.0,
+                 min_backoff=1.0, max_backoff=60.0, connect_timeout=5):
+        self.dsn = dsn or get_dsn()
+        self.max_connections = max_connections
+        self.health_interval = health_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.statements = {}
+        for name, query in (statements or STATEMENTS).items():
+            self.register(name, query)
+
+        self.lock = threading.Condition()
+        self.idle = []
+        self.in_use = 0
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+
+    def register(self, name, query):
+        """Añade una sentencia preparada."""
+        self.statements[name] = prepared_statement(query)
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self.next_attempt:
+            raise DBUnavailable(f"reintento en {self.next_attempt - now:.1f} s")
+        try:
+            connection = psycopg2.connect(self.dsn, connect_timeout=self.connect_timeout)
+        except psycopg2.Error as error:
+            self.backoff = min(max(self.backoff * 2, self.min_backoff), self.max_backoff)
+            self.next_attempt = time.monotonic() + self.backoff
+            logger.error("Error al conectar con la base de datos (reintento en %.1f s): %s", self.backoff, error)
+            raise DBUnavailable(str(error)) from error
+        if self.backoff:
+            logger.info("Conexión a la base de datos recuperada.")
+        else:
+            logger.info("Conexión a la base de datos establecida.")
+        self.backoff = 0.0
+        return _PooledConnection(connection)
+
+    def _healthy(self, pooled):
+        if pooled.connection.closed:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_interval:
+            return True
+        try:
+            with pooled.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            pooled.connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _acquire(self, timeout=10.0):
+        with self.lock:
+            while not self.idle and self.in_use >= self.max_connections:
+                if not self.lock.wait(timeout):
+                    raise DBUnavailable("no hay conexiones libres en el pool")
+            pooled = self.idle.pop() if self.idle else None
+            self.in_use += 1
+        try:
+            while pooled is not None and not self._healthy(pooled):
+                logger.warning("Conexión caída descartada del pool.")
+                self._close(pooled)
+                with self.lock:
+                    pooled = self.idle.pop() if self.idle else None
+            return pooled or self._connect()
+        except Exception:
+            self._release(None)
+            raise
+
+    def _release(self, pooled):
+        with self.lock:
+            self.in_use -= 1
+            if pooled is not None:
+                pooled.last_used = time.monotonic()
+                self.idle.append(pooled)
+            self.lock.notify()
+
+    @staticmethod
+    def _close(pooled):
+        try:
+            pooled.connection.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def transaction(self):
+        """
+        Sesión dentro de una transacción: COMMIT al salir, ROLLBACK si hay
+        error. Un fallo de conexión descarta la conexión y se relanza como
+        DBUnavailable; los errores de datos se relanzan tal cual.
+        """
+        pooled = self._acquire()
+        try:
+            session = DBSession(self, pooled)
+            yield session
+            pooled.connection.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as error:
+            self._close(pooled)
+            self._release(None)
+            pooled = None
+            raise DBUnavailable(str(error)) from error
+        except Exception:
             try:
-                return float(value)
-            except (TypeError, ValueError):
-                return None
-
-        # Mapeo de datos para la consulta
-        data_map = {
-            'acelx': data.get('IMU', {}).get('ACELX'),
-            'acely': data.get('IMU', {}).get('ACELY'),
-            'acelz': data.get('IMU', {}).get('ACELZ'),
-            'girox': data.get('IMU', {}).get('GIROX'),
-            'giroy': data.get('IMU', {}).get('GIROY'),
-            'giroz': data.get('IMU', {}).get('GIROZ'),
-            'magx': data.get('IMU', {}).get('MAGX'),
-            'magy': data.get('IMU', {}).get('MAGY'),
-            'magz': data.get('IMU', {}).get('MAGZ'),
-            'uva': data.get('UV', {}).get('UVA'),
-            'uvb': data.get('UV', {}).get('UVB'),
-            'uvc': data.get('UV', {}).get('UVC'),
-            'uv_temp': data.get('UV', {}).get('UV Temp'),
-            'bmp_pressure': data.get('BMP', {}).get('pressure'),
-            'bmp_temperature': data.get('BMP', {}).get('temperature'),
-            'bmp_altitude': data.get('BMP', {}).get('altitude'),
-            'bmp_vertical_speed': to_float(data.get('BMP', {}).get('vertical_speed')),
-            'dallas_intern': data.get('Dallas', {}).get('28-03a0d446ef0a'),
-            'dallas_extern': data.get('Dallas', {}).get('28-6fc2d44578f0'),
-            'gps_speed_mps': to_float(data.get('GPS', {}).get('RMC', {}).get('speed_mps')),
-            'gps_gga_latitude': to_float(data.get('GPS', {}).get('GGA', {}).get('latitude')),
-            'gps_gga_longitude': to_float(data.get('GPS', {}).get('GGA', {}).get('longitude')),
-            'gps_distance': to_float(data.get('GPS', {}).get('distance')),
-            'gps_altitude': to_float(data.get('GPS', {}).get('GGA', {}).get('altitude')),
-            'gps_height_geoid': to_float(data.get('GPS', {}).get('GGA', {}).get('height_geoid')),
-            'gps_satellites': data.get('GPS', {}).get('GSV', {}).get('num_satellites'),
-            'gps_pdop': to_float(data.get('GPS', {}).get('GSA', {}).get('pdop')),
-            'gps_hdop': to_float(data.get('GPS', {}).get('GSA', {}).get('hdop')),
-            'gps_vdop': to_float(data.get('GPS', {}).get('GSA', {}).get('vdop')),
-            'system_cpu_usage_percent': data.get('System', {}).get('CPU_Usage'),
-            'system_ram_usage_percent': data.get('System', {}).get('RAM_Usage'),
-            'system_temp_cpu_thermal': data.get('System', {}).get('CPU_Temperature'),
-            'timestamp': data.get('timestamp')
-        }
-
-        # Ejecutar la consulta de inserción
-        cursor.execute(insert_query, data_map)
-        connection.commit()
-        logger.info("Datos insertados exitosamente en la base de datos.")
+                pooled.connection.rollback()
+            except psycopg2.Error:
+                self._close(pooled)
+                self._release(None)
+                pooled = None
+            raise
+        finally:
+            if pooled is not None:
+                self._release(pooled)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for pooled in idle:
+            self._close(pooled)
+        logger.debug("Conexiones a la base de datos cerradas.")
 
+
+def ensure_partitions(db, days=7):
+    """Crea las particiones diarias de sensor_readings que falten para los próximos días."""
+    try:
+        with db.transaction() as session:
+            session.execute("SELECT create_daily_partitions(current_date, %s);", (days,))
+    except DBUnavailable as error:
+        logger.error("Base de datos no disponible, no se crean las particiones: %s", error)
+    except psycopg2.Error as error:
+        logger.error("Error al crear las particiones (¿falta ejecutar migrate.py?): %s", error)
+
+class PartitionKeeper:
+    """
+    Para los procesos que corren días seguidos (receptor, concentrador):
+    run_due(), llamado desde el bucle principal, vuelve a ejecutar
+    ensure_partitions cada `interval` segundos, para que los días nuevos
+    tengan partición antes de llegar y no caigan en DEFAULT.
+    """
+
+    def __init__(self, db, days=7, interval=3600.0):
+        self.db = db
+        self.days = days
+        self.interval = interval
+        self.last_run = time.monotonic()
+
+    def run_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now - self.last_run >= self.interval:
+            self.last_run = now
+            ensure_partitions(self.db, self.days)
+
+def insert_data_to_db(db, data):
+    """Inserta los datos recibidos en la base de datos. Devuelve True si se guardaron."""
+    start = time.monotonic()
+    try:
+        logger.debug("Insertando datos en la base de datos...")
+        with db.transaction() as session:
+            # Columnas y mapeo trama -> fila generados desde telemetry_schema
+            session.execute_prepared('insert_reading', record_values(data))
+
+            # Sondas DS18B20: una fila (timestamp, canal, valor) por sonda
+            dallas_rows = [(data.get('timestamp'), channel, value) for channel, value in decode_dallas(data.get('Dallas'))]
+            if dallas_rows:
+                session.executemany_prepared('insert_dallas', dallas_rows)
+        DB_INSERT_SECONDS.labels('frame').observe(time.monotonic() - start)
+        logger.info("Datos insertados exitosamente en la base de datos (%s).", data.get('timestamp'))
+        return True
+    except DBUnavailable as e:
+        logger.error("Base de datos no disponible, datos no insertados: %s", e)
+    except Exception as e:
+        logger.error("Error al insertar datos en la base de datos: %s", e)
+    DB_INSERT_FAILURES.labels('frame').inc()
+    return False
+
+def copy_batch(db, frames):
+    """
+    Como insert_batch_to_db, pero sin capturar errores: DBUnavailable si la
+    base de datos no responde y cualquier otra excepción si fallan los datos.
+    """
+    rows = [record_values(data) for data in frames]
+    rows = [row for row in rows if row[0] is not None]
+    dallas_rows = [(data.get('timestamp'), channel, value)
+                   for data in frames if data.get('timestamp') is not None
+                   for channel, value in decode_dallas(data.get('Dallas'))]
+    start = time.monotonic()
+    with db.transaction() as session:
+        if rows:
+            session.copy_rows('sensor_readings', COLUMNS, COLUMN_TYPES, rows)
+        if dallas_rows:
+            session.copy_rows('dallas_readings', DALLAS_COLUMNS, DALLAS_COLUMN_TYPES, dallas_rows)
+    DB_INSERT_SECONDS.labels('batch').observe(time.monotonic() - start)
+    logger.info("%s tramas insertadas en la base de datos.", len(rows))
+    return len(rows)
+
+def insert_batch_to_db(db, frames):
+    """
+    Inserta muchas tramas de una vez (volcados, recuperación tras un corte)
+    con COPY binario en una sola transacción. Devuelve las filas insertadas.
+    """
+    try:
+        return copy_batch(db, frames)
+    except DBUnavailable as e:
+        logger.error("Base de datos no disponible, lote no insertado: %s", e)
     except Exception as e:
-        logger.error(f"Error al insertar datos en la base de datos: {e}")
-        connection.rollback()
\ No newline at end of file
+        logger.error("Error al insertar el lote en la base de datos: %s", e)
+    DB_INSERT_FAILURES.labels('batch').inc()
+    return 0
@@ -14,8 +14,9 @@ import serial
 import time
 import json
 import logging
-import RPi.GPIO as GPIO
-import psycopg2
+
+from telemetry_schema import INSERT_QUERY, DALLAS_INSERT_QUERY, record_values
+from constants import DALLAS_PROBES_PATH, DALLAS_PROBES_SEED
 
 # Logger configuration
 logging.basicConfig(level=logging.INFO)
@@ -25,7 +26,7 @@ logger = logging.getLogger(__name__)
 from Modules.IMUmodule import get_IMU_data
 from Modules.UVmodule import get_UV_data
 from Modules.BMPmodule import get_BMP_data
-from Modules.DS18B20module import get_DS18B20_data
+from Modules.DS18B20module import get_DS18B20_data, decode_dallas, ProbeRegistry
 from Modules.GPSmodule import get_GPS_data
 from Modules.SYSTEMmodule import get_system_data
 
@@ -38,11 +39,17 @@ AUX_PIN = 22
 SERIAL_PORT = '/dev/ttyUSB0'  # Adjust according to your system
 BAUD_RATE = 9600  # Must match the LoRa module configuration
 
-# Initialize GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(M0_PIN, GPIO.OUT)
-GPIO.setup(M1_PIN, GPIO.OUT)
-GPIO.setup(AUX_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+# RPi.GPIO is imported and configured by setup_gpio() in main(), not at import time
+GPIO = None
+
+def setup_gpio():
+    """Import RPi.GPIO and configure the M0, M1 and AUX pins."""
+    global GPIO
+    import RPi.GPIO as GPIO
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(M0_PIN, GPIO.OUT)
+    GPIO.setup(M1_PIN, GPIO.OUT)
+    GPIO.setup(AUX_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
 def wait_aux_high(timeout=10):
     """Wait until the AUX pin is HIGH."""
@@ -79,6 +86,15 @@ def enter_normal_mode():
     else:
         logger.error("Failed to configure the module in NORMAL mode.")
 
+# DS18B20 channels, opened on the first read
+_DALLAS_REGISTRY = None
+
+def get_dallas_registry():
+    global _DALLAS_REGISTRY
+    if _DALLAS_REGISTRY is None:
+        _DALLAS_REGISTRY = ProbeRegistry(DALLAS_PROBES_PATH, DALLAS_PROBES_SEED)
+    return _DALLAS_REGISTRY
+
 def get_all_sensor_data():
     sensor_data = {}
     try:
@@ -87,44 +103,46 @@ def get_all_sensor_data():
         initial_lon = None  # Define your initial longitude if necessary
 
         sensor_data['IMU'] = get_IMU_data()
-        logger.debug(f"IMU data: {sensor_data['IMU']}")
+        logger.debug("IMU data: %s", sensor_data['IMU'])
 
         sensor_data['UV'] = get_UV_data()
-        logger.debug(f"UV data: {sensor_data['UV']}")
+        logger.debug("UV data: %s", sensor_data['UV'])
 
         sensor_data['BMP'] = get_BMP_data()
-        logger.debug(f"BMP data: {sensor_data['BMP']}")
+        logger.debug("BMP data: %s", sensor_data['BMP'])
 
-        sensor_data['Dallas'] = get_DS18B20_data()
-        logger.debug(f"Dallas data: {sensor_data['Dallas']}")
+        # {channel: centidegrees}, the same block as emitteroptimiced
+        sensor_data['Dallas'] = get_dallas_registry().encode(get_DS18B20_data())
+        logger.debug("Dallas data: %s", sensor_data['Dallas'])
 
         sensor_data['GPS'] = get_GPS_data(initial_lat, initial_lon)
-        logger.debug(f"GPS data: {sensor_data['GPS']}")
+        logger.debug("GPS data: %s", sensor_data['GPS'])
 
         sensor_data['System'] = get_system_data()
-        logger.debug(f"System data: {sensor_data['System']}")
+        logger.debug("System data: %s", sensor_data['System'])
 
         sensor_data['timestamp'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
-        logger.debug(f"Timestamp: {sensor_data['timestamp']}")
+        logger.debug("Timestamp: %s", sensor_data['timestamp'])
 
         logger.info("Sensor data collected successfully.")
         return sensor_data
     except Exception as e:
-        logger.error(f"Error obtaining sensor data: {e}")
+        logger.error("Error obtaining sensor data: %s", e)
         return None
 
 def serialize_sensor_data(sensor_data):
     try:
         logger.info("Serializing sensor data...")
         serialized_data = json.dumps(sensor_data)
-        logger.debug(f"Serialized data: {serialized_data}")
+        logger.debug("Serialized data: %s", serialized_data)
         return serialized_data
     except Exception as e:
-        logger.error(f"Error serializing data: {e}")
+        logger.error("Error serializing data: %s", e)
         return None
 
 def connect_to_db():
     """Connect to the database and return the connection and cursor."""
+    import psycopg2  # Only needed once the program runs
     try:
         logger.info("Connecting to the database...")
         connection = psycopg2.connect(
@@ -138,98 +156,29 @@ def connect_to_db():
         logger.info("Database connection established.")
         return connection, cursor
     except psycopg2.Error as error:
-        logger.error(f"Error connecting to the database: {error}")
+        logger.error("Error connecting to the database: %s", error)
         return None, None
 
 def insert_data_to_db(cursor, connection, data):
     """Insert the received data into the database."""
     try:
         logger.info("Inserting data into the database...")
-        insert_query = """
-        INSERT INTO sensor_readings (
-            imu_acelx, imu_acely, imu_acelz, imu_girox, imu_giroy, imu_giroz,
-            imu_magx, imu_magy, imu_magz, uv_uva, uv_uvb, uv_uvc, uv_uv_temp,
-            bmp_pressure, bmp_temperature, bmp_altitude, bmp_vertical_speed,
-            dallas_28_03a0d446ef0a, dallas_28_6fc2d44578f0,
-            gps_rmc_utc_time, gps_rmc_speed_mps, gps_vtg_speed_kmh,
-            gps_gga_utc_time, gps_gga_latitude, gps_gga_longitude, gps_distance,
-            gps_gga_altitude, gps_gga_height_geoid, gps_gsv_total_satellites,
-            gps_gsv_total_azimuth, gps_gsv_total_elevation, gps_gsv_total_SNR,
-            system_cpu_usage_percent, system_ram_usage_percent,
-            system_temp_cpu_thermal, timestamp
-        ) VALUES (
-            %(imu_acelx)s, %(imu_acely)s, %(imu_acelz)s, %(imu_girox)s, %(imu_giroy)s, %(imu_giroz)s,
-            %(imu_magx)s, %(imu_magy)s, %(imu_magz)s, %(uv_uva)s, %(uv_uvb)s, %(uv_uvc)s, %(uv_uv_temp)s,
-            %(bmp_pressure)s, %(bmp_temperature)s, %(bmp_altitude)s, %(bmp_vertical_speed)s,
-            %(dallas_28_03a0d446ef0a)s, %(dallas_28_6fc2d44578f0)s,
-            %(gps_rmc_utc_time)s, %(gps_rmc_speed_mps)s, %(gps_vtg_speed_kmh)s,
-            %(gps_gga_utc_time)s, %(gps_gga_latitude)s, %(gps_gga_longitude)s, %(gps_distance)s,
-            %(gps_gga_altitude)s, %(gps_gga_height_geoid)s, %(gps_gsv_total_satellites)s,
-            %(gps_gsv_total_azimuth)s, %(gps_gsv_total_elevation)s, %(gps_gsv_total_SNR)s,
-            %(system_cpu_usage_percent)s, %(system_ram_usage_percent)s,
-            %(system_temp_cpu_thermal)s, %(timestamp)s
-        );
-        """
-
-        # Helper function to convert values to float
-        def to_float(value):
-            try:
-                return float(value)
-            except (TypeError, ValueError):
-                return None
-
-        # Data mapping for the query
-        data_map = {
-            'imu_acelx': data.get('IMU', {}).get('ACELX'),
-            'imu_acely': data.get('IMU', {}).get('ACELY'),
-            'imu_acelz': data.get('IMU', {}).get('ACELZ'),
-            'imu_girox': data.get('IMU', {}).get('GIROX'),
-            'imu_giroy': data.get('IMU', {}).get('GIROY'),
-            'imu_giroz': data.get('IMU', {}).get('GIROZ'),
-            'imu_magx': data.get('IMU', {}).get('MAGX'),
-            'imu_magy': data.get('IMU', {}).get('MAGY'),
-            'imu_magz': data.get('IMU', {}).get('MAGZ'),
-            'uv_uva': data.get('UV', {}).get('UVA'),
-            'uv_uvb': data.get('UV', {}).get('UVB'),
-            'uv_uvc': data.get('UV', {}).get('UVC'),
-            'uv_uv_temp': data.get('UV', {}).get('UV Temp'),
-            'bmp_pressure': data.get('BMP', {}).get('pressure'),
-            'bmp_temperature': data.get('BMP', {}).get('temperature'),
-            'bmp_altitude': data.get('BMP', {}).get('altitude'),
-            'bmp_vertical_speed': to_float(data.get('BMP', {}).get('vertical_speed')),
-            'dallas_28_03a0d446ef0a': data.get('Dallas', {}).get('28-03a0d446ef0a'),
-            'dallas_28_6fc2d44578f0': data.get('Dallas', {}).get('28-6fc2d44578f0'),
-            'gps_rmc_utc_time': data.get('GPS', {}).get('RMC', {}).get('utc_time'),
-            'gps_rmc_speed_mps': to_float(data.get('GPS', {}).get('RMC', {}).get('speed_mps')),
-            'gps_vtg_speed_kmh': to_float(data.get('GPS', {}).get('VTG', {}).get('speed_kmh')),
-            'gps_gga_utc_time': data.get('GPS', {}).get('GGA', {}).get('utc_time'),
-            'gps_gga_latitude': to_float(data.get('GPS', {}).get('GGA', {}).get('latitude')),
-            'gps_gga_longitude': to_float(data.get('GPS', {}).get('GGA', {}).get('longitude')),
-            'gps_distance': to_float(data.get('GPS', {}).get('distance')),
-            'gps_gga_altitude': to_float(data.get('GPS', {}).get('GGA', {}).get('altitude')),
-            'gps_gga_height_geoid': to_float(data.get('GPS', {}).get('GGA', {}).get('height_geoid')),
-            'gps_gsv_total_satellites': data.get('GPS', {}).get('GSV', {}).get('total_satellites'),
-            'gps_gsv_total_azimuth': to_float(data.get('GPS', {}).get('GSV', {}).get('total_azimuth')),
-            'gps_gsv_total_elevation': to_float(data.get('GPS', {}).get('GSV', {}).get('total_elevation')),
-            'gps_gsv_total_SNR': to_float(data.get('GPS', {}).get('GSV', {}).get('total_SNR')),
-            'system_cpu_usage_percent': data.get('System', {}).get('CPU Usage (%)'),
-            'system_ram_usage_percent': data.get('System', {}).get('RAM Usage (%)'),
-            'system_temp_cpu_thermal': data.get('System', {}).get('CPU Temperature'),
-            'timestamp': data.get('timestamp')
-        }
-
-        # Execute the insert query
-        cursor.execute(insert_query, data_map)
+        # Columns and frame -> row mapping come from telemetry_schema
+        cursor.execute(INSERT_QUERY, record_values(data))
+        # DS18B20 probes: one (timestamp, channel, value) row per probe, as in db_functions
+        dallas_rows = [(data.get('timestamp'), channel, value) for channel, value in decode_dallas(data.get('Dallas'))]
+        if dallas_rows:
+            cursor.executemany(DALLAS_INSERT_QUERY, dallas_rows)
         connection.commit()
         logger.info("Data inserted successfully into the database.")
 
     except Exception as e:
-        logger.error(f"Error inserting data into the database: {e}")
+        logger.error("Error inserting data into the database: %s", e)
         connection.rollback()
 
 def send_message(message):
     """Send a message via LoRa."""
-    logger.info(f"Sending message: {message}")
+    logger.info("Sending message: %s", message)
     try:
         with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser:
             ser.write(message.encode('utf-8'))
@@ -241,9 +190,9 @@ def send_message(message):
                 return
         logger.info("Message sent.")
     except serial.SerialException as e:
-        logger.error(f"Serial communication error: {e}")
+        logger.error("Serial communication error: %s", e)
     except Exception as e:
-        logger.error(f"Unexpected error sending the message: {e}")
+        logger.error("Unexpected error sending the message: %s", e)
 
 def send_sensor_data(cursor, connection):
     sensor_data = get_all_sensor_data()
@@ -265,6 +214,7 @@ def main():
     cursor = None
     try:
         logger.info("Starting emitter program...")
+        setup_gpio()
         enter_normal_mode()
         connection, cursor = connect_to_db()
         if not connection or not cursor:
@@ -276,7 +226,7 @@ def main():
     except KeyboardInterrupt:
         logger.info("Program interrupted by the user.")
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
     finally:
         if cursor:
             cursor.close()
@@ -285,8 +235,9 @@ def main():
             connection.close()
             logger.debug("Database connection closed.")
         logger.info("Ending emitter program. Cleaning up GPIO...")
-        GPIO.cleanup()
-        logger.debug("GPIO cleaned up.")
+        if GPIO:
+            GPIO.cleanup()
+            logger.debug("GPIO cleaned up.")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,193 @@
+# emitter_config.py
+#
+# Configuración del emisor (uaxsat_emitter.py) en un fichero TOML o YAML.
+# Los valores que no aparecen en el fichero se toman de DEFAULTS, que sale de
+# constants.py, así que un fichero vacío da el mismo emisor que antes. Una
+# sección o una clave desconocida es un error (para que una errata no se
+# ignore sin avisar), igual que un valor del tipo equivocado.
+#
+#   python3 emitter_config.py emitter.toml        # comprueba y muestra la configuración final
+#
+# Ver emitter.toml para la descripción de cada clave.
+
+import os
+import copy
+import json
+import argparse
+
+from airtime import AIR_RATE_MODULATION
+from frame_log import FORMATS, COMPRESSIONS, FSYNC_POLICIES
+from constants import *
+
+DEFAULTS = {
+    'station': {
+        'initial_lat': initial_lat,
+        'initial_lon': initial_lon,
+    },
+    'rates': {
+        'period': 5.0,
+    },
+    'sensors': {
+        'enabled': ['IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System'],
+        'imu': {
+            'stream': True,
+            'sample_rate': IMU_SAMPLE_RATE,
+            'accel_range': IMU_ACCEL_RANGE,
+            'gyro_range': IMU_GYRO_RANGE,
+            'log_path': IMU_LOG_PATH,
+            'event_dir': IMU_EVENT_DIR,
+            'calibration_path': MAG_CALIBRATION_PATH,
+        },
+        'bmp': {
+            'stream': True,
+            'odr': BMP_ODR,
+            'iir_coefficient': BMP_IIR_COEFFICIENT,
+        },
+        'dallas': {
+            'resolution': DALLAS_RESOLUTION,
+        },
+    },
+    'radio': {
+        'serial_port': SERIAL_PORT,
+        'baud_rate': BAUD_RATE,
+        # Parámetros del E220 (E220900T30D.setparam); sólo se escriben con configure = true
+        'configure': False,
+        'air_rate': 2400,
+        'power': 30,
+        'packet_size': 200,
+        'channel': 18,
+    },
+    'codec': {
+        'format': 'json',
+    },
+    'persistence': {
+        'local_store': LOCAL_STORE_PATH,
+        'batch_size': 12,
+        'flush_interval': 60.0,
+    },
+    # Etapa 'log' (frame_log.py): tramas en ficheros NDJSON o CSV rotados
+    'frame_log': {
+        'directory': FRAME_LOG_DIR,
+        'format': 'ndjson',
+        'max_bytes': 64 * 1024 * 1024,
+        'max_age': 3600.0,
+        'fsync': 'interval',
+        'fsync_interval': 10.0,
+        'compress': '',
+    },
+    'logging': {
+        'level': '',  # Vacío: UAXSAT_LOG_LEVEL o INFO
+        'ring_path': FLIGHT_LOG_PATH,
+    },
+    'metrics': {
+        'host': METRICS_HOST,
+        'port': EMITTER_METRICS_PORT,
+    },
+    'pipeline': {
+        'stages': ['sample', 'encode', 'transmit', 'store'],
+    },
+    # Presupuesto de tiempo en el aire (airtime.py): ciclo de trabajo en una ventana deslizante
+    'airtime': {
+        'enabled': False,
+        'duty_cycle': 0.01,
+        'window': 3600.0,
+        'queue_size': 4,
+    },
+    # Etapa 'schedule' (scheduler.py): periodo en segundos y prioridad de bajada de cada canal
+    'scheduler': {
+        'headroom': 8,
+        'channels': {
+            'GPS': {'period': 1.0, 'priority': 0},
+            'BMP': {'period': 1.0, 'priority': 1},
+            'UV': {'period': 0.5, 'priority': 2},
+            'IMU': {'period': 1.0, 'priority': 3},
+            'Dallas': {'period': 30.0, 'priority': 4},
+            'System': {'period': 60.0, 'priority': 5},
+        },
+    },
+}
+
+SENSOR_NAMES = ('IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System')
+CODECS = ('json', 'json-compact')
+PACKET_SIZES = (32, 64, 128, 200)
+
+def _read(path):
+    """Fichero TOML (.toml) o YAML (.yaml/.yml) -> dict."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path}: para leer YAML hace falta PyYAML (pip3 install pyyaml)")
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    raise ValueError(f"{path}: formato desconocido (se admite .toml, .yaml o .yml)")
+
+def _merge(defaults, values, path=''):
+    """Copia de `defaults` con `values` encima, comprobando claves y tipos."""
+    merged = copy.deepcopy(defaults)
+    for key, value in values.items():
+        name = f"{path}.{key}" if path else key
+        if key not in defaults:
+            raise ValueError(f"Clave desconocida en la configuración: {name}")
+        default = defaults[key]
+        if isinstance(default, dict):
+            if not isinstance(value, dict):
+                raise ValueError(f"{name} debe ser una sección")
+            merged[key] = _merge(default, value, name)
+            continue
+        if isinstance(default, bool) or default is None:
+            valid = isinstance(value, bool) if isinstance(default, bool) else True
+        elif isinstance(default, float):
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            value = float(value) if valid else value
+        else:
+            valid = isinstance(value, type(default)) and not isinstance(value, bool)
+        if not valid:
+            raise ValueError(f"{name} debe ser de tipo {type(default).__name__}, no {type(value).__name__}")
+        merged[key] = value
+    return merged
+
+def validate(config):
+    unknown = set(config['sensors']['enabled']) - set(SENSOR_NAMES)
+    if unknown:
+        raise ValueError(f"sensors.enabled: sensores desconocidos {sorted(unknown)} (válidos: {', '.join(SENSOR_NAMES)})")
+    if config['codec']['format'] not in CODECS:
+        raise ValueError(f"codec.format debe ser uno de {', '.join(CODECS)}")
+    if config['rates']['period'] <= 0:
+        raise ValueError("rates.period debe ser mayor que 0")
+    if not config['pipeline']['stages']:
+        raise ValueError("pipeline.stages no puede estar vacío")
+    if config['radio']['air_rate'] not in AIR_RATE_MODULATION:
+        raise ValueError(f"radio.air_rate debe ser uno de {', '.join(map(str, AIR_RATE_MODULATION))}")
+    if config['radio']['packet_size'] not in PACKET_SIZES:
+        raise ValueError(f"radio.packet_size debe ser uno de {', '.join(map(str, PACKET_SIZES))}")
+    if not 0 < config['airtime']['duty_cycle'] <= 1:
+        raise ValueError("airtime.duty_cycle debe estar entre 0 y 1")
+    frame_log = config['frame_log']
+    if frame_log['format'] not in FORMATS or frame_log['compress'] not in COMPRESSIONS or frame_log['fsync'] not in FSYNC_POLICIES:
+        raise ValueError(f"frame_log: format en {FORMATS}, compress en {COMPRESSIONS}, fsync en {FSYNC_POLICIES}")
+    if config['airtime']['window'] <= 0 or config['airtime']['queue_size'] < 1:
+        raise ValueError("airtime.window y airtime.queue_size deben ser mayores que 0")
+    for name, channel in config['scheduler']['channels'].items():
+        if channel['period'] <= 0:
+            raise ValueError(f"scheduler.channels.{name}.period debe ser mayor que 0")
+    return config
+
+def load_config(path=None):
+    """Configuración del emisor: DEFAULTS con el fichero `path` (si lo hay) encima."""
+    values = _read(path) if path else {}
+    return validate(_merge(DEFAULTS, values))
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprueba una configuración del emisor.")
+    parser.add_argument('path', nargs='?', help="Fichero TOML o YAML (sin él, los valores por defecto)")
+    args = parser.parse_args()
+    print(json.dumps(load_config(args.path), indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
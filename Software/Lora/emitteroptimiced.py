@@ -1,130 +1,224 @@
 # emitter.py
 
+import os
 import serial
 import time
 import json
 import logging
-import RPi.GPIO as GPIO
 
-# Importar funciones de PostgreSQL y de LoRa desde los módulos
-from db_functions import *
+# Importar las funciones de LoRa desde los módulos (el bucle está en uaxsat_emitter.py)
+from tracing import FrameTrace
+from metrics import REGISTRY, SIZE_BUCKETS
 from lora_functions import *
 from constants import *
 
 # Importar módulos de sensores
-from Modules.IMUmodule import get_IMU_data
+from Modules.IMUmodule import get_IMU_data, get_IMU_stream_data, write_IMU_log, IMUStream
 from Modules.UVmodule import get_UV_data
-from Modules.BMPmodule import get_BMP_data
-from Modules.DS18B20module import get_DS18B20_data
+from Modules.BMPmodule import get_BMP_data, get_BMP_stream_data, BMPStream
+from Modules.DS18B20module import get_DS18B20_data, ProbeRegistry
 from Modules.GPSmodule import get_GPS_data
 from Modules.SYSTEMmodule import get_system_data
+from Modules.ATTITUDEmodule import start_attitude_estimation, get_attitude_data
+from Modules.IMUEVENTmodule import start_imu_monitoring
 
-# Configuración del logger
-logging.basicConfig(level=logging.INFO)
+# Configuración del logger (en el bucle, formato perezoso con %s)
 logger = logging.getLogger(__name__)
 
-def get_all_sensor_data(initial_lat, initial_lon):
+# Métricas en http://127.0.0.1:EMITTER_METRICS_PORT/metrics
+SENSOR_READ_SECONDS = REGISTRY.histogram('uaxsat_sensor_read_seconds', "Lectura de cada sensor", ['sensor'])
+FRAME_BYTES = REGISTRY.histogram('uaxsat_frame_bytes', "Tamaño de las tramas enviadas", buckets=SIZE_BUCKETS)
+TX_SECONDS = REGISTRY.histogram('uaxsat_tx_seconds', "Desde la escritura en el puerto serie hasta que AUX vuelve a HIGH")
+AUX_WAIT_SECONDS = REGISTRY.histogram('uaxsat_aux_wait_seconds', "Espera de cada flanco de AUX", ['edge'])
+FRAMES_SENT = REGISTRY.counter('uaxsat_frames_sent_total', "Tramas enviadas")
+TX_FAILURES = REGISTRY.counter('uaxsat_tx_failures_total', "Envíos fallidos", ['reason'])
+SENSOR_FAILURES = REGISTRY.counter('uaxsat_sensor_failures_total', "Ciclos sin trama por un error de los sensores")
+
+# Canales de las sondas DS18B20; el registro se abre en la primera lectura,
+# no al importar el módulo
+_DALLAS_REGISTRY = None
+
+def get_dallas_registry():
+    global _DALLAS_REGISTRY
+    if _DALLAS_REGISTRY is None:
+        _DALLAS_REGISTRY = ProbeRegistry(DALLAS_PROBES_PATH, DALLAS_PROBES_SEED)
+    return _DALLAS_REGISTRY
+
+# Sensores que se leen en cada ciclo, en este orden
+SENSORS = ('IMU', 'UV', 'BMP', 'Dallas', 'GPS', 'System')
+
+def get_all_sensor_data(initial_lat, initial_lon, imu=None, bmp_stream=None, trace=None, sensors=SENSORS,
+                        imu_log_path=IMU_LOG_PATH, dallas_resolution=DALLAS_RESOLUTION):
     sensor_data = {}
+    # Marcas de inicio y fin de cada sensor (ver tracing.py)
+    trace = trace or FrameTrace(0)
     try:
-        logger.info("Recolectando datos de sensores...")
-
-        sensor_data['IMU'] = get_IMU_data()
-        logger.debug(f"Datos IMU: {sensor_data['IMU']}")
-
-        sensor_data['UV'] = get_UV_data()
-        logger.debug(f"Datos UV: {sensor_data['UV']}")
-
-        sensor_data['BMP'] = get_BMP_data()
-        logger.debug(f"Datos BMP: {sensor_data['BMP']}")
-
-        sensor_data['Dallas'] = get_DS18B20_data()
-        logger.debug(f"Datos Dallas: {sensor_data['Dallas']}")
-
-        sensor_data['GPS'] = get_GPS_data(initial_lat, initial_lon)
-        logger.debug(f"Datos GPS: {sensor_data['GPS']}")
-
-        sensor_data['System'] = get_system_data()
-        logger.debug(f"Datos del sistema: {sensor_data['System']}")
-
-        sensor_data['timestamp'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
-        logger.debug(f"Timestamp: {sensor_data['timestamp']}")
-
-        logger.info("Datos de sensores recolectados exitosamente.")
+        logger.debug("Recolectando datos de sensores...")
+
+        if 'IMU' in sensors:
+            with trace.span('IMU'):
+                if imu is not None:
+                    sensor_data['IMU'] = get_IMU_stream_data(imu['stream'], imu['stats'])
+                    write_IMU_log(imu['stream'], imu_log_path)
+                    sensor_data['ATT'] = get_attitude_data(imu['attitude'])
+                    logger.debug("Datos de actitud: %s", sensor_data['ATT'])
+                else:
+                    sensor_data['IMU'] = get_IMU_data()
+            logger.debug("Datos IMU: %s", sensor_data['IMU'])
+
+        if 'UV' in sensors:
+            with trace.span('UV'):
+                sensor_data['UV'] = get_UV_data()
+            logger.debug("Datos UV: %s", sensor_data['UV'])
+
+        if 'BMP' in sensors:
+            with trace.span('BMP'):
+                if bmp_stream is not None:
+                    sensor_data['BMP'] = get_BMP_stream_data(bmp_stream)
+                else:
+                    sensor_data['BMP'] = get_BMP_data()
+            logger.debug("Datos BMP: %s", sensor_data['BMP'])
+
+        if 'Dallas' in sensors:
+            with trace.span('Dallas'):
+                sensor_data['Dallas'] = get_dallas_registry().encode(get_DS18B20_data(dallas_resolution))
+            logger.debug("Datos Dallas: %s", sensor_data['Dallas'])
+
+        if 'GPS' in sensors:
+            with trace.span('GPS'):
+                sensor_data['GPS'] = get_GPS_data(initial_lat, initial_lon)
+            logger.debug("Datos GPS: %s", sensor_data['GPS'])
+            if bmp_stream is not None and sensor_data['GPS']:
+                bmp_stream.update_gps(sensor_data['GPS'].get('GGA', {}).get('altitude'))
+
+        if 'System' in sensors:
+            with trace.span('System'):
+                sensor_data['System'] = get_system_data()
+            logger.debug("Datos del sistema: %s", sensor_data['System'])
+
+        # Hora del inicio del muestreo, no la de después de leer todos los sensores
+        sensor_data['timestamp'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(trace.wall))
+        logger.debug("Timestamp: %s", sensor_data['timestamp'])
+
+        logger.debug("Datos de sensores recolectados exitosamente.")
         return sensor_data
     except Exception as e:
-        logger.error(f"Error obteniendo los datos de los sensores: {e}")
+        logger.error("Error obteniendo los datos de los sensores: %s", e)
         return None
 
-def serialize_sensor_data(sensor_data):
+def serialize_sensor_data(sensor_data, compact=False):
     try:
-        logger.info("Serializando los datos de sensores...")
-        serialized_data = json.dumps(sensor_data)
-        logger.debug(f"Datos serializados: {serialized_data}")
+        logger.debug("Serializando los datos de sensores...")
+        # compact: sin espacios tras ',' y ':' (unos 100 bytes menos por trama, el receptor lo lee igual)
+        serialized_data = json.dumps(sensor_data, separators=(',', ':') if compact else None)
+        logger.debug("Datos serializados: %s", serialized_data)
         return serialized_data
     except Exception as e:
-        logger.error(f"Error serializando los datos: {e}")
+        logger.error("Error serializando los datos: %s", e)
         return None
 
-def send_message(message):
-    """Envía un mensaje vía LoRa."""
-    logger.info(f"Enviando mensaje: {message}")
+def send_message(message, trace=None, port=SERIAL_PORT, baudrate=BAUD_RATE, budget=None):
+    """Envía un mensaje vía LoRa; con `budget` (airtime.AirtimeBudget) apunta su tiempo en el aire."""
+    logger.debug("Enviando mensaje: %s", message)
+    payload = message.encode('utf-8')
+    FRAME_BYTES.observe(len(payload))
     try:
-        with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser:
-            ser.write(message.encode('utf-8'))
-            if not wait_aux_low():
+        with serial.Serial(port, baudrate, timeout=1) as ser:
+            start = time.monotonic()
+            ser.write(payload)
+            if not wait_aux_low(timeout=1):
                 logger.error("Fallo al enviar el mensaje: AUX no bajó a LOW.")
+                TX_FAILURES.labels('aux_low').inc()
                 return
-            if not wait_aux_high():
+            low = time.monotonic()
+            AUX_WAIT_SECONDS.labels('low').observe(low - start)
+            if trace:
+                trace.mark('aux_low')
+            # AUX vuelve a HIGH cuando el módulo ha vaciado su buffer por radio
+            if not wait_aux_high(timeout=30):
                 logger.error("Fallo al enviar el mensaje: AUX no regresó a HIGH.")
+                TX_FAILURES.labels('aux_high').inc()
                 return
-        logger.info("Mensaje enviado.")
+            end = time.monotonic()
+            AUX_WAIT_SECONDS.labels('high').observe(end - low)
+            TX_SECONDS.observe(end - start)
+        FRAMES_SENT.inc()
+        if budget:
+            budget.record(budget.airtime(len(payload)))
+        logger.info("Mensaje enviado (%d bytes).", len(payload))
     except serial.SerialException as e:
-        logger.error(f"Error en la comunicación serial: {e}")
+        logger.error("Error en la comunicación serial: %s", e)
+        TX_FAILURES.labels('serial').inc()
     except Exception as e:
-        logger.error(f"Error inesperado al enviar el mensaje: {e}")
-
-def send_sensor_data(cursor, connection, initial_lat, initial_lon):
-    sensor_data = get_all_sensor_data(initial_lat, initial_lon)
-    if sensor_data:
-        message_content = serialize_sensor_data(sensor_data)
-        if message_content:
-            # Envuelve el mensaje con marcadores <<< y >>>
-            full_message = f'<<<{message_content}>>>'
-            send_message(full_message)
-            # Guarda los datos en la base de datos
-            insert_data_to_db(cursor, connection, sensor_data)
-        else:
-            logger.error("No se pudo serializar los datos.")
-    else:
-        logger.error("Datos no enviados debido a un error en la recolección.")
+        logger.error("Error inesperado al enviar el mensaje: %s", e)
+        TX_FAILURES.labels('error').inc()
+
+def send_event_frame(events, port=SERIAL_PORT, baudrate=BAUD_RATE, compact=False, budget=None):
+    """
+    Envía de inmediato una trama prioritaria con los eventos detectados por
+    la IMU. No espera al presupuesto de tiempo en el aire, pero cuenta en él.
+    """
+    for event in events:
+        logger.warning("Evento IMU: %s (pico %s)", event['type'], event['peak'])
+    message_content = serialize_sensor_data({
+        'EVENT': events,
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    }, compact)
+    if message_content:
+        send_message(f'<<<{message_content}>>>', port=port, baudrate=baudrate, budget=budget)
+
+def start_imu_stream(sample_rate=IMU_SAMPLE_RATE, accel_range=IMU_ACCEL_RANGE, gyro_range=IMU_GYRO_RANGE,
+                     event_dir=IMU_EVENT_DIR, calibration_path=MAG_CALIBRATION_PATH):
+    """
+    Arranca el streaming de la IMU con la estimación de actitud, las
+    estadísticas por ventana y el detector de eventos. Si falla se usa la
+    lectura puntual.
+    """
+    try:
+        imu_stream = IMUStream(sample_rate=sample_rate, accel_range=accel_range, gyro_range=gyro_range)
+        os.makedirs(event_dir, exist_ok=True)
+        stats, events = start_imu_monitoring(imu_stream, log_dir=event_dir)
+        imu = {
+            'stream': imu_stream,
+            'attitude': start_attitude_estimation(imu_stream, calibration_path),
+            'stats': stats,
+            'events': events,
+        }
+        imu_stream.start()
+        logger.info("Streaming de la IMU a %.1f Hz.", imu_stream.sample_rate)
+        return imu
+    except Exception as e:
+        logger.error("No se pudo arrancar el streaming de la IMU: %s", e)
+        return None
 
-def main():
-    connection = None
-    cursor = None
+def start_bmp_stream(odr=BMP_ODR, iir_coefficient=BMP_IIR_COEFFICIENT):
+    """Arranca el FIFO del BMP390 con su filtro de velocidad vertical."""
     try:
-        logger.info("Iniciando el programa emisor...")
-        enter_normal_mode()
-        connection, cursor = connect_to_db()
-        if not connection or not cursor:
-            logger.error("No se pudo establecer conexión con la base de datos.")
-            return
-        while True:
-            send_sensor_data(cursor, connection, initial_lat, initial_lon)
-            time.sleep(5)  # Espera 5 segundos antes de enviar nuevamente
-    except KeyboardInterrupt:
-        logger.info("Programa interrumpido por el usuario.")
+        bmp_stream = BMPStream(odr=odr, iir_coefficient=iir_coefficient)
+        bmp_stream.start()
+        logger.info("Streaming del BMP390 a %s Hz.", bmp_stream.sample_rate)
+        return bmp_stream
     except Exception as e:
-        logger.error(f"Error inesperado: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-            logger.debug("Cursor de la base de datos cerrado.")
-        if connection:
-            connection.close()
-            logger.debug("Conexión a la base de datos cerrada.")
-        logger.info("Terminando el programa emisor. Limpiando GPIO...")
-        GPIO.cleanup()
-        logger.debug("GPIO limpiado.")
+        logger.error("No se pudo arrancar el streaming del BMP390: %s", e)
+        return None
+
+def wait_next_cycle(imu, period, port=SERIAL_PORT, baudrate=BAUD_RATE, compact=False, budget=None):
+    """Espera al siguiente ciclo; un evento de la IMU lo interrumpe con una trama prioritaria."""
+    end_time = time.monotonic() + period
+    if imu is None:
+        time.sleep(period)
+        return
+    remaining = period
+    while remaining > 0:
+        events = imu['events'].wait(remaining)
+        if events:
+            send_event_frame(events, port, baudrate, compact, budget)
+        remaining = end_time - time.monotonic()
+
+def main():
+    # El bucle del emisor está en uaxsat_emitter.py (sin --config usa los valores de constants.py)
+    from uaxsat_emitter import main as run_emitter
+    run_emitter()
 
 if __name__ == '__main__':
     main()
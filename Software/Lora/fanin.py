@@ -0,0 +1,337 @@
+# fanin.py
+#
+# Concentrador de varias estaciones de tierra. Cada receptor
+# (receiveroptimiced.py --fanin DIRECCION) envía las tramas ya decodificadas
+# por un socket local (Unix) o TCP, una línea JSON por trama:
+#
+#   {"receiver": "jaen-1", "rssi": -97, "received": 1760870000.5, "frame": {...}}
+#
+# Una misma trama llega una vez por cada receptor que la oyó. Se agrupan por
+# clave (frame_key) durante `hold` segundos desde la primera copia, se queda
+# la de mejor RSSI y se escribe una sola vez en PostgreSQL, por lotes
+# (copy_batch). Las claves ya escritas se recuerdan en una ventana LRU de
+# `window` tramas para descartar las copias que llegan tarde.
+#
+#   python3 fanin.py                                   # escucha en FANIN_ADDRESS
+#   python3 fanin.py --listen 0.0.0.0:9200 --hold 3 --batch-size 100
+#
+# Los receptores remotos se conectan por TCP (o por un túnel SSH al socket Unix).
+
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import argparse
+import datetime
+import threading
+import collections
+import socketserver
+
+from metrics import REGISTRY, start_http_server
+from flightlog import setup_logging
+from constants import FANIN_ADDRESS, FANIN_METRICS_PORT, METRICS_HOST
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+FANIN_FRAMES = REGISTRY.counter('uaxsat_fanin_frames_total', "Copias de tramas recibidas de cada receptor", ['receiver'])
+FANIN_DUPLICATES = REGISTRY.counter('uaxsat_fanin_duplicates_total',
+                                    "Copias descartadas: 'merged' antes de escribir, 'late' después", ['kind'])
+FANIN_BEST_COPY = REGISTRY.counter('uaxsat_fanin_best_copy_total', "Tramas escritas con la copia de cada receptor",
+                                   ['receiver'])
+FANIN_ROWS = REGISTRY.counter('uaxsat_fanin_rows_written_total', "Tramas escritas en la base de datos")
+FANIN_PENDING = REGISTRY.gauge('uaxsat_fanin_pending_frames', "Tramas a la espera de escribirse")
+FANIN_REJECTED = REGISTRY.counter('uaxsat_fanin_rejected_total',
+                                  "Tramas descartadas: 'timestamp' no válido o 'error' al escribirlas", ['reason'])
+
+def frame_key(data):
+    """
+    Clave de una trama: (hora, número de secuencia del bloque TRACE). La
+    trama no lleva identificador de vuelo y el número de secuencia vuelve a 1
+    si el emisor se reinicia, así que la hora hace ese papel. Las tramas sin
+    TRACE (eventos) usan su contenido.
+    """
+    seq = (data.get('TRACE') or {}).get('seq')
+    if seq is None:
+        seq = json.dumps(data, sort_keys=True)
+    return (data.get('timestamp'), seq)
+
+def _better(rssi, best):
+    """Un RSSI desconocido (None) pierde contra cualquiera conocido."""
+    return rssi is not None and (best is None or rssi > best)
+
+class Deduplicator:
+    """
+    Copias de la misma trama de varios receptores. offer() devuelve 'new',
+    'merged' (se une a una copia pendiente) o 'late' (ya se escribió);
+    ready() devuelve las tramas cuyo plazo `hold` ha vencido, con la mejor
+    copia de cada una.
+    """
+
+    def __init__(self, window=4096, hold=2.0):
+        self.window = window
+        self.hold = hold
+        self.seen = collections.OrderedDict()  # clave -> entrada, LRU
+        self.pending = collections.deque()     # claves por orden de llegada
+        self.evicted = []
+
+    def offer(self, data, rssi, receiver, now=None):
+        now = time.monotonic() if now is None else now
+        key = frame_key(data)
+        entry = self.seen.get(key)
+        if entry is not None:
+            self.seen.move_to_end(key)
+            if entry['written']:
+                FANIN_DUPLICATES.labels('late').inc()
+                return 'late'
+            FANIN_DUPLICATES.labels('merged').inc()
+            if _better(rssi, entry['rssi']):
+                entry.update(data=data, rssi=rssi, receiver=receiver)
+            return 'merged'
+        self.seen[key] = {'first_seen': now, 'data': data, 'rssi': rssi, 'receiver': receiver, 'written': False}
+        self.pending.append(key)
+        while len(self.seen) > self.window:
+            _, old = self.seen.popitem(last=False)
+            if not old['written']:
+                # La ventana se ha quedado corta: se escribe ya, sin esperar más copias
+                old['written'] = True
+                self.evicted.append(old)
+        return 'new'
+
+    def ready(self, now=None, flush=False):
+        now = time.monotonic() if now is None else now
+        entries, self.evicted = self.evicted, []
+        while self.pending:
+            entry = self.seen.get(self.pending[0])
+            if entry is not None and not entry['written']:
+                if not flush and entry['first_seen'] + self.hold > now:
+                    break
+                entry['written'] = True
+                entries.append(entry)
+            self.pending.popleft()
+        for entry in entries:
+            FANIN_BEST_COPY.labels(entry['receiver']).inc()
+        return [entry['data'] for entry in entries]
+
+class BatchWriter:
+    """
+    Escribe las tramas en lotes de `batch_size` o cada `flush_interval`
+    segundos. Si la base de datos no está disponible el lote se conserva y se
+    reintenta (hasta `max_pending` tramas; después se descartan las más
+    antiguas). Si el lote falla por los datos se parte en mitades hasta
+    aislar las tramas que fallan, que se descartan. Las tramas de eventos
+    sólo se registran, como en el receptor.
+    """
+
+    def __init__(self, db, batch_size=50, flush_interval=2.0, max_pending=10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.frames = collections.deque(maxlen=max_pending)
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+
+    def add(self, data):
+        if 'EVENT' in data:
+            for event in data['EVENT']:
+                logger.warning("Evento IMU recibido: %s", event)
+            return
+        try:
+            datetime.datetime.fromisoformat(data['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            logger.error("Trama con timestamp no válido, descartada: %r", data.get('timestamp'))
+            FANIN_REJECTED.labels('timestamp').inc()
+            return
+        if len(self.frames) == self.frames.maxlen:
+            logger.warning("Demasiadas tramas sin escribir: se descarta la más antigua.")
+        self.frames.append(data)
+        FANIN_PENDING.set(len(self.frames))
+
+    def flush_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        if len(self.frames) >= self.batch_size or (self.frames and now - self.last_flush >= self.flush_interval):
+            self.flush(now)
+
+    def flush(self, now=None):
+        from db_functions import DBUnavailable
+
+        self.last_flush = time.monotonic() if now is None else now
+        if not self.frames:
+            return 0
+        before = self.rows_written
+        try:
+            self._write(list(self.frames))
+        except DBUnavailable as e:
+            # Lo ya confirmado ha salido de la cola; el resto se reintenta en el siguiente flush
+            logger.error("Base de datos no disponible, lote no insertado: %s", e)
+        FANIN_PENDING.set(len(self.frames))
+        return self.rows_written - before
+
+    def _write(self, frames):
+        """
+        Escribe `frames` (las primeras de la cola) y las quita de la cola.
+        DBUnavailable se relanza; con otro error el lote se parte en dos.
+        """
+        from db_functions import copy_batch, DBUnavailable
+
+        try:
+            written = copy_batch(self.db, frames)
+        except DBUnavailable:
+            raise
+        except Exception as e:
+            if len(frames) > 1:
+                middle = len(frames) // 2
+                self._write(frames[:middle])
+                self._write(frames[middle:])
+                return
+            logger.error("Trama descartada al escribirla (%s): %s", frames[0].get('timestamp'), e)
+            FANIN_REJECTED.labels('error').inc()
+            written = 0
+        for _ in frames:
+            self.frames.popleft()
+        self.rows_written += written
+        FANIN_ROWS.inc(written)
+
+def parse_address(address):
+    """'host:puerto' -> (AF_INET, (host, puerto)); cualquier otra cosa es la ruta de un socket Unix."""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and '/' not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                frame = message['frame']
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error("Línea no válida de %s: %s", self.client_address or 'socket local', e)
+                continue
+            self.server.frames.put((frame, message.get('rssi'), str(message.get('receiver', '?'))))
+
+def serve(address):
+    """Arranca el servidor en un hilo; devuelve (servidor, cola de (trama, rssi, receptor))."""
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(target):
+            os.unlink(target)
+        server = socketserver.ThreadingUnixStreamServer(target, _Handler)
+    else:
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        server = socketserver.ThreadingTCPServer(target, _Handler)
+    server.daemon_threads = True
+    server.frames = queue.Queue()
+    threading.Thread(target=server.serve_forever, name='fanin', daemon=True).start()
+    logger.info("Concentrador escuchando en %s.", address)
+    return server, server.frames
+
+def run(frames, deduplicator, writer, stop=None, partitions=None):
+    """
+    Bucle único que deduplica y escribe (sin bloqueos: sólo este hilo toca su
+    estado). Con `partitions` (un db_functions.PartitionKeeper) mantiene
+    además las particiones diarias.
+    """
+    stop = stop or threading.Event()
+    try:
+        while not stop.is_set():
+            try:
+                frame, rssi, receiver = frames.get(timeout=0.2)
+                FANIN_FRAMES.labels(receiver).inc()
+                deduplicator.offer(frame, rssi, receiver)
+            except queue.Empty:
+                pass
+            for data in deduplicator.ready():
+                writer.add(data)
+            writer.flush_due()
+            if partitions:
+                partitions.run_due()
+    finally:
+        for data in deduplicator.ready(flush=True):
+            writer.add(data)
+        writer.flush()
+
+class FanInClient:
+    """
+    Lado del receptor: envía cada trama al concentrador. Si la conexión se
+    cae se reintenta como mucho cada `retry` segundos y, mientras tanto, las
+    tramas esperan en una cola de `max_pending`.
+    """
+
+    def __init__(self, address, receiver, retry=5.0, max_pending=1000):
+        self.address = address
+        self.receiver = receiver
+        self.retry = retry
+        self.pending = collections.deque(maxlen=max_pending)
+        self.sock = None
+        self.next_attempt = 0.0
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self.next_attempt:
+            return False
+        family, target = parse_address(self.address)
+        try:
+            self.sock = socket.socket(family, socket.SOCK_STREAM)
+            self.sock.settimeout(5)
+            self.sock.connect(target)
+            logger.info("Conectado al concentrador %s.", self.address)
+            return True
+        except OSError as e:
+            logger.error("No se pudo conectar al concentrador %s: %s", self.address, e)
+            self.close()
+            self.next_attempt = now + self.retry
+            return False
+
+    def send(self, data, rssi=None):
+        message = {'receiver': self.receiver, 'rssi': rssi, 'received': round(time.time(), 3), 'frame': data}
+        self.pending.append((json.dumps(message, separators=(',', ':')) + '\n').encode('utf-8'))
+        if self.sock is None and not self._connect():
+            return False
+        try:
+            while self.pending:
+                self.sock.sendall(self.pending[0])
+                self.pending.popleft()
+            return True
+        except OSError as e:
+            logger.error("Conexión con el concentrador perdida: %s", e)
+            self.close()
+            self.next_attempt = time.monotonic() + self.retry
+            return False
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Concentrador de tramas de varios receptores.")
+    parser.add_argument('--listen', default=FANIN_ADDRESS, help="Ruta del socket Unix o host:puerto")
+    parser.add_argument('--window', type=int, default=4096, help="Tramas recordadas para descartar duplicados")
+    parser.add_argument('--hold', type=float, default=2.0, help="Segundos de espera de más copias de una trama")
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--flush-interval', type=float, default=2.0)
+    parser.add_argument('--dsn', help="Cadena de conexión (por defecto la de db_functions)")
+    args = parser.parse_args()
+
+    from db_functions import DBClient, PartitionKeeper, ensure_partitions
+
+    setup_logging()
+    start_http_server(FANIN_METRICS_PORT, METRICS_HOST)
+    db = DBClient(args.dsn)
+    ensure_partitions(db)
+    server, frames = serve(args.listen)
+    try:
+        run(frames, Deduplicator(args.window, args.hold), BatchWriter(db, args.batch_size, args.flush_interval),
+            partitions=PartitionKeeper(db))
+    except KeyboardInterrupt:
+        logger.info("Concentrador detenido por el usuario.")
+    finally:
+        server.shutdown()
+        server.server_close()
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# flightlog.py
+#
+# Configuración del logging de los programas de vuelo y de tierra:
+#
+#   - Formato perezoso: en los bucles se usa logger.debug("Datos: %s", datos),
+#     que sólo construye el texto si el nivel está activo (con un f-string
+#     el texto se construye siempre, aunque luego se descarte).
+#   - Límite de frecuencia: cada mensaje (logger, nivel y plantilla) sale como
+#     mucho `burst` veces por `interval` segundos; el resto se cuenta y se
+#     indica en el siguiente que sale.
+#   - Registro circular binario en disco (RingBufferHandler): ranuras de
+#     tamaño fijo en un fichero mapeado en memoria, sin crecer nunca. Los
+#     avisos y errores se llevan al disco (msync) en cuanto se escriben y el
+#     resto como mucho cada `sync_interval` segundos: un corte de corriente
+#     pierde, como mucho, los mensajes de menos nivel de ese último intervalo.
+#
+#   python3 flightlog.py /home/cubesat/flight_log.ring          # vuelca el registro
+#   python3 flightlog.py /home/cubesat/flight_log.ring --tail 50
+#
+# El nivel se puede cambiar sin tocar el código con UAXSAT_LOG_LEVEL=DEBUG.
+
+import os
+import mmap
+import time
+import struct
+import logging
+import argparse
+
+MAGIC = b'UAXRING1'
+FILE_HEADER = struct.Struct('<8sII')     # magic, tamaño de ranura, número de ranuras
+SLOT_HEADER = struct.Struct('<IdBH')     # secuencia (0 = libre), hora epoch, nivel, longitud del texto
+
+class RateLimitFilter(logging.Filter):
+    """
+    Deja pasar como mucho `burst` registros iguales (logger, nivel, plantilla)
+    por ventana de `interval` segundos. Se puede poner en varios handlers:
+    cada registro se decide una sola vez.
+    """
+
+    def __init__(self, burst=20, interval=60.0, max_keys=1000):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_keys = max_keys
+        self.windows = {}
+        self.last_record = None
+        self.last_decision = True
+
+    def filter(self, record):
+        if record is self.last_record:
+            return self.last_decision
+        now = time.monotonic()
+        key = (record.name, record.levelno, record.msg)
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            if len(self.windows) >= self.max_keys:
+                self.windows.clear()
+            self.windows[key] = window = [now, 0, 0]
+            if suppressed:
+                record.msg = f"{record.msg} [{suppressed} mensajes iguales suprimidos]"
+        window[1] += 1
+        allowed = window[1] <= self.burst
+        if not allowed:
+            window[2] += 1
+        self.last_record, self.last_decision = record, allowed
+        return allowed
+
+class RingBufferHandler(logging.Handler):
+    """
+    Registro circular en un fichero de `slots` ranuras de `slot_size` bytes.
+    Cada ranura lleva un número de secuencia, así que no hay puntero que
+    actualizar: al abrir se sigue tras la ranura más reciente. Los mensajes
+    más largos que la ranura se recortan. Los registros de `sync_level` o más
+    se llevan al disco al momento; los demás, con el primero que llegue
+    pasados `sync_interval` segundos del último msync.
+    """
+
+    def __init__(self, path, slot_size=256, slots=16384, level=logging.NOTSET, sync_level=logging.WARNING,
+                 sync_interval=1.0):
+        super().__init__(level)
+        self.slot_size = slot_size
+        self.slots = slots
+        self.sync_level = sync_level
+        self.sync_interval = sync_interval
+        self.last_sync = time.monotonic()
+        size = FILE_HEADER.size + slot_size * slots
+        new = not os.path.exists(path) or os.path.getsize(path) != size
+        self.file = open(path, 'w+b' if new else 'r+b')
+        if new:
+            self.file.truncate(size)
+            self.file.write(FILE_HEADER.pack(MAGIC, slot_size, slots))
+            self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), size)
+        if FILE_HEADER.unpack_from(self.map)[0] != MAGIC:
+            raise ValueError(f"{path} no es un registro circular.")
+        self.seq = max((seq for seq, _ in _slots(self.map, slot_size, slots)), default=0)
+
+    def emit(self, record):
+        try:
+            text = f"{record.name}\x00{record.getMessage()}".encode('utf-8', errors='replace')
+            text = text[:self.slot_size - SLOT_HEADER.size]
+            self.acquire()
+            try:
+                self.seq += 1
+                offset = FILE_HEADER.size + ((self.seq - 1) % self.slots) * self.slot_size
+                self.map[offset:offset + self.slot_size] = (
+                    SLOT_HEADER.pack(self.seq, record.created, record.levelno, len(text)) + text
+                ).ljust(self.slot_size, b'\x00')
+                now = time.monotonic()
+                if record.levelno >= self.sync_level or now - self.last_sync >= self.sync_interval:
+                    self.map.flush()  # msync: sólo escribe las páginas modificadas
+                    self.last_sync = now
+            finally:
+                self.release()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.acquire()
+        try:
+            if not self.map.closed:
+                self.map.flush()
+                self.map.close()
+                self.file.close()
+        finally:
+            self.release()
+        super().close()
+
+def _slots(buffer, slot_size, slots):
+    """(secuencia, offset) de las ranuras ocupadas."""
+    for index in range(slots):
+        offset = FILE_HEADER.size + index * slot_size
+        seq = struct.unpack_from('<I', buffer, offset)[0]
+        if seq:
+            yield seq, offset
+
+def read_ring(path):
+    """Registros del fichero en orden: (secuencia, hora epoch, nivel, logger, mensaje)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, slot_size, slots = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} no es un registro circular.")
+    records = []
+    for seq, offset in sorted(_slots(data, slot_size, slots)):
+        _, created, level, length = SLOT_HEADER.unpack_from(data, offset)
+        start = offset + SLOT_HEADER.size
+        name, _, message = data[start:start + length].decode('utf-8', errors='replace').partition('\x00')
+        records.append((seq, created, level, name, message))
+    return records
+
+def setup_logging(level=None, ring_path=None, burst=20, interval=60.0, console=True):
+    """
+    Configura el logger raíz: consola (mismo formato que basicConfig) y,
+    con `ring_path`, el registro circular en disco, ambos con el límite de
+    frecuencia. Devuelve el RingBufferHandler (o None).
+    """
+    level = level or os.environ.get('UAXSAT_LOG_LEVEL', 'INFO')
+    root = logging.getLogger()
+    root.setLevel(level)
+    rate_limit = RateLimitFilter(burst, interval)
+    ring = None
+    if console:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        handler.addFilter(rate_limit)
+        root.addHandler(handler)
+    if ring_path:
+        try:
+            ring = RingBufferHandler(ring_path)
+            ring.addFilter(rate_limit)
+            root.addHandler(ring)
+        except (OSError, ValueError) as e:
+            logging.getLogger(__name__).error(f"No se pudo abrir el registro circular {ring_path}: {e}")
+    return ring
+
+def main():
+    parser = argparse.ArgumentParser(description="Vuelca un registro circular de vuelo.")
+    parser.add_argument('path')
+    parser.add_argument('--tail', type=int, help="Sólo los N últimos registros")
+    args = parser.parse_args()
+
+    records = read_ring(args.path)
+    for seq, created, level, name, message in records[-args.tail:] if args.tail else records:
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(created))
+        print(f"{seq:8d} {stamp}.{int(created % 1 * 1000):03d} {logging.getLevelName(level):8s} {name}: {message}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+# frame_log.py
+#
+# Registro de tramas en ficheros planos, sin base de datos ni dependencias:
+# NDJSON (una trama JSON por línea, tal cual) o CSV (las columnas de
+# sensor_readings, de telemetry_schema, y las sondas Dallas en JSON).
+#
+# - Sólo se añade al final, con un buffer de `buffer_size` bytes.
+# - Segmentos <prefijo>-AAAAMMDD-HHMMSS.<ext>: se cierra el actual y se abre
+#   otro al pasar de `max_bytes` o de `max_age` segundos.
+# - Los segmentos cerrados se comprimen en segundo plano con zstd
+#   (zstandard, o compression.zstd en Python 3.14) o gzip. Sin módulo de zstd
+#   se quedan sin comprimir, con un aviso.
+# - fsync: 'always' (cada trama), 'interval' (como mucho cada fsync_interval
+#   segundos) o 'never' (sólo al rotar y al cerrar).
+#
+# Lo usan la etapa 'log' del emisor (uaxsat_emitter.py) y el receptor
+# (receiveroptimiced.py --log DIR, y FRAME_LOG_DIR cuando no hay base de datos).
+#
+#   python3 frame_log.py /home/cubesat/frames                          # segmentos y tamaños
+#   python3 frame_log.py /home/cubesat/frames --cat telemetry-20261019-101500.ndjson.zst
+
+import os
+import csv
+import io
+import sys
+import glob
+import gzip
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+
+from telemetry_schema import COLUMNS, record_values
+from metrics import REGISTRY
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+FRAME_LOG_WRITES = REGISTRY.counter('uaxsat_frame_log_frames_total', "Tramas escritas en los ficheros planos")
+FRAME_LOG_BYTES = REGISTRY.counter('uaxsat_frame_log_bytes_total', "Bytes escritos en los ficheros planos")
+FRAME_LOG_ROTATIONS = REGISTRY.counter('uaxsat_frame_log_rotations_total', "Segmentos cerrados", ['reason'])
+
+FORMATS = ('ndjson', 'csv')
+COMPRESSIONS = ('', 'zstd', 'gzip')
+FSYNC_POLICIES = ('always', 'interval', 'never')
+CSV_COLUMNS = COLUMNS + ['dallas']
+_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+_warned_zstd = False
+
+def _zstd_copy(source, target, level):
+    """Comprime `source` en `target` con zstd; False si no hay módulo de zstd."""
+    try:
+        import zstandard
+    except ImportError:
+        try:
+            from compression import zstd
+        except ImportError:
+            return False
+        with open(source, 'rb') as fin, zstd.open(target, 'wb', level=level) as fout:
+            shutil.copyfileobj(fin, fout)
+        return True
+    with open(source, 'rb') as fin, open(target, 'wb') as fout:
+        zstandard.ZstdCompressor(level=level).copy_stream(fin, fout)
+    return True
+
+def compress_segment(path, method, level=3):
+    """Comprime un segmento cerrado y borra el original; devuelve la ruta resultante."""
+    target = path + _EXTENSIONS[method]
+    temporary = target + '.tmp'
+    try:
+        if method == 'zstd':
+            if not _zstd_copy(path, temporary, level):
+                global _warned_zstd
+                if not _warned_zstd:
+                    logger.warning("Sin zstandard (pip3 install zstandard): los segmentos se quedan sin comprimir.")
+                    _warned_zstd = True
+                return path
+        else:
+            with open(path, 'rb') as fin, gzip.open(temporary, 'wb', compresslevel=min(level, 9)) as fout:
+                shutil.copyfileobj(fin, fout)
+        os.replace(temporary, target)
+        os.remove(path)
+        return target
+    except OSError as e:
+        logger.error("No se pudo comprimir %s: %s", path, e)
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return path
+
+def open_segment(path):
+    """Abre un segmento para leer, comprimido o no (texto)."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+            return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')), 'utf-8', newline='')
+        except ImportError:
+            from compression import zstd
+            return zstd.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+class FrameLog:
+    """
+    Escribe tramas en segmentos rotados de `directory`. El primer segmento
+    se abre con la primera trama (un programa que no escribe nada no deja
+    ficheros vacíos).
+    """
+
+    def __init__(self, directory, fmt='ndjson', prefix='telemetry', max_bytes=64 * 1024 * 1024, max_age=3600.0,
+                 fsync='interval', fsync_interval=10.0, compress='', buffer_size=64 * 1024):
+        if fmt not in FORMATS or compress not in COMPRESSIONS or fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Formato, compresión o fsync no válidos: {fmt!r}, {compress!r}, {fsync!r}")
+        self.directory = directory
+        self.fmt = fmt
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.opened = 0.0
+        self.last_sync = 0.0
+        self.compressors = []
+        os.makedirs(directory, exist_ok=True)
+        if compress:
+            # Segmentos que quedaron sin comprimir de una ejecución anterior
+            for path in self.segments():
+                if not path.endswith(tuple(_EXTENSIONS.values())):
+                    self._compress_later(path)
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.prefix}-*.{self.fmt}*")))
+
+    def _open(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        path = os.path.join(self.directory, f"{self.prefix}-{stamp}.{self.fmt}")
+        counter = 0
+        while os.path.exists(path) or glob.glob(path + '.*'):
+            counter += 1
+            path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{counter}.{self.fmt}")
+        self.file = open(path, 'a', encoding='utf-8', newline='', buffering=self.buffer_size)
+        self.path = path
+        self.size = 0
+        self.opened = time.time()
+        self.last_sync = time.monotonic()
+        if self.fmt == 'csv':
+            self.size = self._write_row(CSV_COLUMNS)
+        logger.info("Registro de tramas en %s.", path)
+
+    def _write_row(self, row):
+        line = io.StringIO()
+        csv.writer(line).writerow(row)
+        text = line.getvalue()
+        self.file.write(text)
+        return len(text.encode('utf-8'))
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def _compress_later(self, path):
+        thread = threading.Thread(target=compress_segment, args=(path, self.compress), name='frame-log-compress')
+        thread.start()
+        self.compressors = [worker for worker in self.compressors if worker.is_alive()] + [thread]
+
+    def rotate(self, reason='manual'):
+        """Cierra el segmento actual (y lo comprime si toca); el siguiente se abre con la próxima trama."""
+        if self.file is None:
+            return
+        self._sync()
+        self.file.close()
+        FRAME_LOG_ROTATIONS.labels(reason).inc()
+        if self.compress:
+            self._compress_later(self.path)
+        self.file = None
+
+    def append(self, data):
+        """Añade una trama; en CSV, las tramas de eventos (sin lecturas) no se escriben."""
+        if self.fmt == 'csv' and 'EVENT' in data:
+            return
+        if self.file is not None:
+            if self.size >= self.max_bytes:
+                self.rotate('size')
+            elif time.time() - self.opened >= self.max_age:
+                self.rotate('age')
+        if self.file is None:
+            self._open()
+        if self.fmt == 'ndjson':
+            line = json.dumps(data, separators=(',', ':'), ensure_ascii=False) + '\n'
+            self.file.write(line)
+            written = len(line.encode('utf-8'))
+        else:
+            dallas = data.get('Dallas')
+            written = self._write_row(list(record_values(data)) + [json.dumps(dallas) if dallas else ''])
+        self.size += written
+        FRAME_LOG_WRITES.inc()
+        FRAME_LOG_BYTES.inc(written)
+        if self.fsync == 'always' or (self.fsync == 'interval' and time.monotonic() - self.last_sync >= self.fsync_interval):
+            self._sync()
+
+    def close(self):
+        self.rotate('close')
+        for worker in self.compressors:
+            worker.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmentos del registro de tramas.")
+    parser.add_argument('directory')
+    parser.add_argument('--cat', metavar='SEGMENTO', help="Muestra un segmento (descomprimido)")
+    args = parser.parse_args()
+
+    if args.cat:
+        with open_segment(os.path.join(args.directory, args.cat)) as f:
+            shutil.copyfileobj(f, sys.stdout)
+        return
+    for path in sorted(glob.glob(os.path.join(args.directory, '*'))):
+        print(f"{os.path.getsize(path) / 1024:10.1f} KiB  {os.path.basename(path)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+# link_capture.py
+#
+# Captura y reproducción del enlace LoRa en el receptor. Con
+# `receiveroptimiced.py --capture enlace.bin` se guarda cada trozo leído del
+# puerto serie, sin tocar, con su instante (reloj monotónico). Después se
+# puede pasar la captura otra vez por el receptor (deframer -> JSON -> BD)
+# a velocidad real o a la máxima posible, midiendo cada etapa:
+#
+#   python3 link_capture.py enlace.bin                      # resumen de la captura
+#   python3 link_capture.py enlace.bin --replay             # máxima velocidad, sin BD
+#   python3 link_capture.py enlace.bin --replay --speed 1   # al ritmo original
+#   python3 link_capture.py enlace.bin --replay --db --dsn "host=... dbname=pruebas"
+#
+# Formato: MAGIC y luego registros <QI (instante en ns, longitud) seguidos
+# de los bytes. Un registro de longitud 0 abre una sesión (cada arranque del
+# receptor) y lleva detrás la hora UTC del arranque (<d, segundos epoch).
+
+import os
+import time
+import struct
+import logging
+import argparse
+from datetime import datetime, timezone
+
+
+from flightlog import setup_logging
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+MAGIC = b'UAXLINK1'
+RECORD = struct.Struct('<QI')
+SESSION = struct.Struct('<d')
+
+class CaptureWriter:
+    """Añade los trozos recibidos a un fichero de captura (se abre en modo append)."""
+
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} no es una captura del enlace.")
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(MAGIC)
+        self.file.write(RECORD.pack(time.monotonic_ns(), 0) + SESSION.pack(time.time()))
+        self.file.flush()
+
+    def write(self, chunk):
+        # Un write por trozo: a 9600 baudios llegan pocos por segundo y así un corte no pierde nada
+        self.file.write(RECORD.pack(time.monotonic_ns(), len(chunk)) + chunk)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_capture(path):
+    """
+    Genera (t, trozo) con t en segundos desde el inicio de la captura. Las
+    sesiones se encadenan sin hueco entre ellas (el reloj monotónico no
+    sirve entre arranques).
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es una captura del enlace.")
+        offset = None
+        last = 0
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            t_ns, length = RECORD.unpack(header)
+            if length == 0:
+                f.read(SESSION.size)
+                offset = t_ns - last
+                continue
+            chunk = f.read(length)
+            if len(chunk) < length:
+                logger.warning("Captura truncada en el último registro.")
+                return
+            last = t_ns - offset
+            yield last / 1e9, chunk
+
+def capture_info(path):
+    sessions = []
+    chunks = size = 0
+    duration = 0.0
+    with open(path, 'rb') as f:
+        f.read(len(MAGIC))
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            t_ns, length = RECORD.unpack(header)
+            if length == 0:
+                sessions.append(SESSION.unpack(f.read(SESSION.size))[0])
+            else:
+                f.seek(length, os.SEEK_CUR)
+                chunks += 1
+                size += length
+    for t, _ in read_capture(path):
+        duration = t
+    return {'sessions': sessions, 'chunks': chunks, 'bytes': size, 'duration': duration}
+
+def replay(path, speed=0.0, db=None):
+    """
+    Pasa la captura por las etapas del receptor y devuelve los tiempos de
+    cada una en segundos: deframe por trozo; decode, db y latencia (desde
+    que llega el trozo que completa el mensaje hasta que está guardado) por
+    mensaje. speed=0 va tan rápido como puede; speed=1 respeta los tiempos
+    originales. Sin `db` no se escribe en la base de datos.
+    """
+    from receiveroptimiced import Deframer, decode_message, store_data
+
+    deframer = Deframer()
+    stages = {'deframe': [], 'decode': [], 'db': [], 'latency': []}
+    counts = {'chunks': 0, 'bytes': 0, 'messages': 0, 'invalid': 0}
+    start = time.perf_counter()
+    for t, chunk in read_capture(path):
+        if speed:
+            delay = start + t / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        arrival = time.perf_counter()
+        messages = deframer.feed(chunk)
+        stages['deframe'].append(time.perf_counter() - arrival)
+        counts['chunks'] += 1
+        counts['bytes'] += len(chunk)
+        for message in messages:
+            counts['messages'] += 1
+            begin = time.perf_counter()
+            data = decode_message(message)
+            decoded = time.perf_counter()
+            stages['decode'].append(decoded - begin)
+            if data is None:
+                counts['invalid'] += 1
+                continue
+            if db is not None:
+                store_data(db, data)
+                stages['db'].append(time.perf_counter() - decoded)
+            stages['latency'].append(time.perf_counter() - arrival)
+    counts['elapsed'] = time.perf_counter() - start
+    return counts, stages
+
+def print_report(counts, stages):
+    import numpy as np  # Sólo para el informe: el receptor importa este módulo sin necesitarlo
+    elapsed = counts['elapsed']
+    print(f"{counts['chunks']} trozos, {counts['bytes']} bytes, {counts['messages']} mensajes "
+          f"({counts['invalid']} no válidos) en {elapsed:.3f} s: "
+          f"{counts['bytes'] / elapsed:,.0f} B/s, {counts['messages'] / elapsed:,.1f} mensajes/s")
+    print(f"  {'etapa':10s} {'n':>7s} {'total s':>9s} {'por s':>10s} {'p50 ms':>8s} {'p95 ms':>8s} {'máx ms':>8s}")
+    for name, values in stages.items():
+        if not values:
+            continue
+        values = np.array(values)
+        total = values.sum()
+        p50, p95 = np.percentile(values, [50, 95]) * 1000
+        print(f"  {name:10s} {len(values):7d} {total:9.3f} {len(values) / total if total else 0:10,.0f} "
+              f"{p50:8.3f} {p95:8.3f} {values.max() * 1000:8.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Captura y reproducción del enlace LoRa.")
+    parser.add_argument('path', help="Fichero de captura")
+    parser.add_argument('--replay', action='store_true', help="Reproduce la captura por el receptor")
+    parser.add_argument('--speed', type=float, default=0.0, help="1 = tiempo real, 2 = doble... (0 = máximo)")
+    parser.add_argument('--db', action='store_true', help="Incluye la escritura en la base de datos")
+    parser.add_argument('--dsn', help="Cadena de conexión (por defecto la de db_functions)")
+    parser.add_argument('--verbose', action='store_true', help="Mantiene el log por mensaje del receptor")
+    args = parser.parse_args()
+
+    if not args.replay:
+        info = capture_info(args.path)
+        print(f"{info['chunks']} trozos, {info['bytes']} bytes, {info['duration']:.1f} s de enlace")
+        for started in info['sessions']:
+            print(f"  sesión iniciada {datetime.fromtimestamp(started, timezone.utc):%Y-%m-%d %H:%M:%S} UTC")
+        return
+
+    setup_logging()
+    db = None
+    if args.db:
+        from db_functions import DBClient
+        db = DBClient(args.dsn)
+    # El log INFO por mensaje del receptor dominaría los tiempos
+    for name in ('receiveroptimiced', 'db_functions'):
+        logging.getLogger(name).setLevel(logging.INFO if args.verbose else logging.WARNING)
+    try:
+        print_report(*replay(args.path, args.speed, db))
+    finally:
+        if db:
+            db.close()
+
+if __name__ == '__main__':
+    main()
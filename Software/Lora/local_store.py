@@ -0,0 +1,177 @@
+# local_store.py
+#
+# Almacén local de la telemetría en el ordenador de vuelo: SQLite en modo
+# WAL, sin servidor, con las mismas columnas que sensor_readings (salen de
+# telemetry_schema). Las tramas se acumulan en memoria y se escriben por
+# lotes en una sola transacción. Tras recuperar la carga útil, el fichero
+# se vuelca a PostgreSQL con COPY binario:
+#
+#   python3 local_store.py --stats
+#   python3 local_store.py --export --path /media/sd/telemetry.db [--dsn "host=..."]
+
+import time
+import sqlite3
+import collections
+import logging
+import argparse
+
+from Modules.DS18B20module import decode_dallas
+from telemetry_schema import FIELDS, COLUMNS, COLUMN_TYPES, DALLAS_COLUMNS, DALLAS_COLUMN_TYPES, record_values
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+_SQLITE_TYPES = {'REAL': 'REAL', 'DOUBLE PRECISION': 'REAL', 'SMALLINT': 'INTEGER', 'INTEGER': 'INTEGER'}
+
+class LocalStore:
+    """
+    Telemetría en un fichero SQLite.
+
+    append() sólo encola; el lote se escribe al llegar a `batch_size` tramas
+    o cuando pasan `flush_interval` segundos desde la última escritura. Un
+    corte de corriente pierde como mucho ese lote. Si SQLite no puede
+    escribir (tarjeta llena o de sólo lectura) las tramas siguen en memoria
+    hasta `max_pending`; después se descartan las más antiguas. La caché de
+    páginas se limita a `cache_kib` KiB.
+    """
+
+    def __init__(self, path, batch_size=12, flush_interval=60.0, cache_kib=256, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+        self._create_tables()
+
+        self.insert_reading = "INSERT INTO sensor_readings ({}) VALUES ({})".format(
+            ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS)))
+        self.pending = collections.deque(maxlen=max_pending)  # (fila, filas de las sondas Dallas)
+        self.last_flush = time.monotonic()
+
+    def _create_tables(self):
+        columns = ["timestamp TEXT NOT NULL"] + [f"{field.column} {_SQLITE_TYPES[field.sql_type]}" for field in FIELDS]
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS sensor_readings ({', '.join(columns)})")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS dallas_readings (timestamp TEXT NOT NULL, channel INTEGER NOT NULL, value REAL)")
+            # Último rowid volcado a PostgreSQL por tabla
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS export_state (table_name TEXT PRIMARY KEY, last_rowid INTEGER NOT NULL)")
+            # Ficheros creados con una versión anterior del esquema
+            existing = {row[1] for row in self.connection.execute("PRAGMA table_info(sensor_readings)")}
+            for field in FIELDS:
+                if field.column not in existing:
+                    self.connection.execute(
+                        f"ALTER TABLE sensor_readings ADD COLUMN {field.column} {_SQLITE_TYPES[field.sql_type]}")
+
+    def append(self, data):
+        """Encola una trama de sensores; escribe el lote si toca."""
+        row = record_values(data)
+        if row[0] is None:
+            logger.warning("Trama sin timestamp, no se guarda en local.")
+            return
+        if len(self.pending) == self.pending.maxlen:
+            logger.warning("Demasiadas tramas sin guardar en local: se descarta la más antigua.")
+        self.pending.append((row, [(row[0], channel, value) for channel, value in decode_dallas(data.get('Dallas'))]))
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Escribe las tramas encoladas en una transacción."""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        try:
+            with self.connection:
+                self.connection.executemany(self.insert_reading, [row for row, _ in self.pending])
+                self.connection.executemany("INSERT INTO dallas_readings (timestamp, channel, value) VALUES (?, ?, ?)",
+                                            [dallas for _, rows in self.pending for dallas in rows])
+            logger.debug("%s tramas guardadas en %s.", len(self.pending), self.path)
+            self.pending.clear()
+        except sqlite3.Error as e:
+            # Se reintenta en el siguiente lote
+            logger.error("Error al guardar en el almacén local: %s", e)
+
+    def stats(self):
+        counts = {}
+        for table in ('sensor_readings', 'dallas_readings'):
+            total, first, last = self.connection.execute(
+                f"SELECT count(*), min(timestamp), max(timestamp) FROM {table}").fetchone()
+            counts[table] = {'rows': total, 'first': first, 'last': last,
+                             'pending_export': total - self._exported_count(table)}
+        return counts
+
+    def _last_exported(self, table):
+        row = self.connection.execute("SELECT last_rowid FROM export_state WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def _exported_count(self, table):
+        return self.connection.execute(
+            f"SELECT count(*) FROM {table} WHERE rowid <= ?", (self._last_exported(table),)).fetchone()[0]
+
+    def export(self, db, batch_size=5000):
+        """
+        Vuelca a PostgreSQL (un db_functions.DBClient) las filas aún no
+        exportadas, en lotes de `batch_size` con COPY binario. Se puede
+        interrumpir y repetir: continúa desde el último lote confirmado.
+        Devuelve el número de filas de sensor_readings exportadas.
+        """
+        self.flush()
+        exported = 0
+        for table, columns, types in (('sensor_readings', COLUMNS, COLUMN_TYPES),
+                                      ('dallas_readings', DALLAS_COLUMNS, DALLAS_COLUMN_TYPES)):
+            while True:
+                last = self._last_exported(table)
+                rows = self.connection.execute(
+                    f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, batch_size)).fetchall()
+                if not rows:
+                    break
+                with db.transaction() as session:
+                    session.copy_rows(table, columns, types, [row[1:] for row in rows])
+                # Sólo tras confirmar en PostgreSQL se avanza la marca
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT INTO export_state (table_name, last_rowid) VALUES (?, ?) "
+                        "ON CONFLICT (table_name) DO UPDATE SET last_rowid = excluded.last_rowid",
+                        (table, rows[-1][0]))
+                if table == 'sensor_readings':
+                    exported += len(rows)
+                logger.info("%s: %s filas exportadas (hasta rowid %s).", table, len(rows), rows[-1][0])
+        return exported
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+def main():
+    from constants import LOCAL_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Almacén local de telemetría (SQLite).")
+    parser.add_argument('--path', default=LOCAL_STORE_PATH)
+    parser.add_argument('--stats', action='store_true', help="Filas guardadas y pendientes de exportar")
+    parser.add_argument('--export', action='store_true', help="Vuelca las filas pendientes a PostgreSQL")
+    parser.add_argument('--dsn', help="Cadena de conexión (por defecto la de db_functions)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = LocalStore(args.path)
+    try:
+        if args.export:
+            # psycopg2 sólo hace falta en la estación de tierra
+            from db_functions import DBClient, ensure_partitions
+            db = DBClient(args.dsn)
+            ensure_partitions(db)
+            logger.info("%s tramas exportadas a PostgreSQL.", store.export(db))
+            db.close()
+        if args.stats or not args.export:
+            for table, info in store.stats().items():
+                print(f"{table}: {info['rows']} filas ({info['first']} .. {info['last']}), "
+                      f"{info['pending_export']} pendientes de exportar")
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
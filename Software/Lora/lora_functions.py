@@ -1,6 +1,5 @@
 # lora_functions.py
 
-import RPi.GPIO as GPIO
 import logging
 import time
 from constants import M0_PIN, M1_PIN, AUX_PIN
@@ -8,15 +7,50 @@ from constants import M0_PIN, M1_PIN, AUX_PIN
 # Configuración del logger
 logger = logging.getLogger(__name__)
 
-def wait_aux_high():
-    while GPIO.input(AUX_PIN) == GPIO.LOW:
-        time.sleep(0.01)
+# RPi.GPIO sólo se importa y se configura en open_gpio(): importar este módulo
+# no toca el hardware y funciona fuera de la Raspberry Pi
+_GPIO = None
+
+def open_gpio():
+    """Configura M0, M1 (salidas) y AUX (entrada con pull-up). Devuelve el módulo RPi.GPIO."""
+    global _GPIO
+    if _GPIO is None:
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(M0_PIN, GPIO.OUT)
+        GPIO.setup(M1_PIN, GPIO.OUT)
+        GPIO.setup(AUX_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        _GPIO = GPIO
+        logger.debug("GPIO configured.")
+    return _GPIO
+
+def close_gpio():
+    """Libera los pines si se llegaron a configurar."""
+    global _GPIO
+    if _GPIO is not None:
+        _GPIO.cleanup()
+        _GPIO = None
+        logger.debug("GPIO cleaned up.")
 
-def wait_aux_low():
-    while GPIO.input(AUX_PIN) == GPIO.HIGH:
+def _wait_aux(high, timeout):
+    """Espera a que AUX esté en HIGH (o LOW); devuelve False si pasan `timeout` segundos."""
+    GPIO = open_gpio()
+    level = GPIO.HIGH if high else GPIO.LOW
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while GPIO.input(AUX_PIN) != level:
+        if deadline is not None and time.monotonic() > deadline:
+            return False
         time.sleep(0.01)
+    return True
+
+def wait_aux_high(timeout=None):
+    return _wait_aux(True, timeout)
+
+def wait_aux_low(timeout=None):
+    return _wait_aux(False, timeout)
 
 def enter_config_mode():
+    GPIO = open_gpio()
     GPIO.output(M0_PIN, GPIO.HIGH)
     GPIO.output(M1_PIN, GPIO.HIGH)
     wait_aux_high()
@@ -24,8 +58,9 @@ def enter_config_mode():
     logger.debug("Entered configuration mode.")
 
 def enter_normal_mode():
+    GPIO = open_gpio()
     GPIO.output(M0_PIN, GPIO.LOW)
     GPIO.output(M1_PIN, GPIO.LOW)
     wait_aux_high()
     time.sleep(0.1)
-    logger.debug("Entered normal mode.")
\ No newline at end of file
+    logger.debug("Entered normal mode.")
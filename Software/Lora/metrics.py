@@ -0,0 +1,219 @@
+# metrics.py
+#
+# Registro de métricas en memoria (contadores, gauges e histogramas) con un
+# endpoint HTTP en el formato de texto de Prometheus, para que Prometheus o
+# Grafana lo lean. Cada programa define sus métricas al importar el módulo y
+# arranca el servidor en main():
+#
+#   SENSOR_READ = REGISTRY.histogram('uaxsat_sensor_read_seconds', "Lectura de cada sensor", ['sensor'])
+#   SENSOR_READ.labels('IMU').observe(0.004)
+#   start_http_server(EMITTER_METRICS_PORT)
+#
+#   curl http://127.0.0.1:9101/metrics
+#
+# En prometheus.yml de la estación de tierra (Grafana lee de Prometheus):
+#
+#   scrape_configs:
+#     - job_name: uaxsat
+#       static_configs:
+#         - targets: ['127.0.0.1:9102']   # receptor (y 9101 si el emisor está en la red)
+#
+# Actualizar una métrica cuesta un lock y una suma; el texto sólo se genera
+# cuando alguien lo pide.
+
+import bisect
+import logging
+import threading
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+# Límites superiores (s) de las cubetas de latencia, escala aproximadamente logarítmica
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 60)
+# Tamaños de trama en bytes
+SIZE_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+class Histogram:
+    """Histograma acumulado con cubetas fijas (`counts` por cubeta, no acumulados)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # la última es > máximo
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """Cuantil aproximado: límite superior de la cubeta donde cae."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {'buckets': list(self.buckets), 'counts': self.counts, 'count': self.count, 'sum': self.sum}
+
+class Family:
+    """Una métrica con nombre y sus valores por combinación de etiquetas."""
+
+    def __init__(self, name, help, kind, labelnames, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            with self.lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    # Métricas sin etiquetas: se usan directamente
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _register(self, name, help, kind, labelnames, factory):
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = Family(name, help, kind, labelnames, factory)
+            elif family.kind != kind:
+                raise ValueError(f"{name} ya está registrada como {family.kind}")
+        return family
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(name, help, 'counter', labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(name, help, 'gauge', labelnames, Gauge)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(name, help, 'histogram', labelnames, lambda: Histogram(buckets))
+
+    def render(self):
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+        lines = []
+        with self.lock:
+            families = list(self.families.values())
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            # Copia bajo el bloqueo: labels() puede añadir una combinación nueva durante la lectura
+            with family.lock:
+                children = sorted(family.children.items())
+            for values, child in children:
+                if family.kind != 'histogram':
+                    lines.append(f"{family.name}{_labels(family.labelnames, values)} {_number(child.value)}")
+                    continue
+                with child.lock:
+                    counts, count, total = list(child.counts), child.count, child.sum
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = _labels(family.labelnames, values, f'le="{_number(bound)}"')
+                    lines.append(f"{family.name}_bucket{le} {cumulative}")
+                lines.append(f"{family.name}_sum{_labels(family.labelnames, values)} {_number(total)}")
+                lines.append(f"{family.name}_count{_labels(family.labelnames, values)} {count}")
+        return "\n".join(lines) + "\n"
+
+# Registro compartido por los módulos de un mismo programa
+REGISTRY = Registry()
+
+def _handler_class(registry):
+    # http.server (y con él email y http.client) sólo se importa si se sirve el endpoint
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Sin una línea de log por cada lectura
+            pass
+
+    return MetricsHandler
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    """Sirve /metrics en un hilo aparte; devuelve el servidor (o None si no se pudo abrir el puerto)."""
+    from http.server import ThreadingHTTPServer
+    handler = _handler_class(registry)
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error("No se pudo abrir el endpoint de métricas en %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info("Métricas en http://%s:%s/metrics", host, port)
+    return server
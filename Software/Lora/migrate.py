@@ -0,0 +1,102 @@
+# migrate.py
+#
+# Aplica en orden las migraciones SQL de migrations/ que aún no se han
+# ejecutado en la base de datos y registra cada una en schema_migrations.
+#
+#   python3 migrate.py                 # aplica las pendientes
+#   python3 migrate.py --status        # lista aplicadas / pendientes
+#   python3 migrate.py --partitions 30 # crea particiones diarias para 30 días
+
+import os
+import sys
+import argparse
+import logging
+import psycopg2
+
+from db_functions import connect_to_db
+
+# Configuración del logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Devuelve [(versión, ruta)] ordenado por nombre de fichero (001_..., 002_...)."""
+    files = sorted(f for f in os.listdir(directory) if f.endswith('.sql'))
+    return [(os.path.splitext(f)[0], os.path.join(directory, f)) for f in files]
+
+def applied_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """)
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+def migrate(connection, cursor):
+    """Aplica cada migración pendiente en su propia transacción. Devuelve las aplicadas."""
+    done = applied_migrations(cursor)
+    connection.commit()
+    applied = []
+    for version, path in list_migrations():
+        if version in done:
+            continue
+        logger.info("Aplicando migración %s...", version)
+        with open(path, 'r') as f:
+            sql = f.read()
+        try:
+            cursor.execute(sql)
+            for notice in connection.notices:
+                logger.info("%s: %s", version, notice.strip())
+            del connection.notices[:]
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (version,))
+            connection.commit()
+        except psycopg2.Error as e:
+            connection.rollback()
+            logger.error("Error en la migración %s: %s", version, e)
+            raise
+        applied.append(version)
+    return applied
+
+def create_partitions(connection, cursor, days):
+    cursor.execute("SELECT create_daily_partitions(current_date, %s);", (days,))
+    connection.commit()
+    logger.info("Particiones diarias creadas para los próximos %s días.", days)
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de la estación de tierra.")
+    parser.add_argument('--dsn', help="Cadena de conexión de psycopg2 (por defecto la de db_functions)")
+    parser.add_argument('--status', action='store_true', help="Muestra las migraciones aplicadas y pendientes")
+    parser.add_argument('--partitions', type=int, metavar='DAYS', help="Crea particiones diarias a partir de hoy")
+    args = parser.parse_args()
+
+    if args.dsn:
+        connection = psycopg2.connect(args.dsn)
+        cursor = connection.cursor()
+    else:
+        connection, cursor = connect_to_db()
+        if not connection:
+            sys.exit(1)
+    try:
+        if args.status:
+            done = applied_migrations(cursor)
+            connection.commit()
+            for version, _ in list_migrations():
+                print(f"{'aplicada ' if version in done else 'pendiente'}  {version}")
+            return
+        applied = migrate(connection, cursor)
+        if applied:
+            logger.info("%s migraciones aplicadas.", len(applied))
+        else:
+            logger.info("El esquema está al día.")
+        if args.partitions:
+            create_partitions(connection, cursor, args.partitions)
+    finally:
+        cursor.close()
+        connection.close()
+
+if __name__ == '__main__':
+    main()
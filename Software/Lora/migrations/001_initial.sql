@@ -0,0 +1,56 @@
+-- 001_initial.sql
+-- Esquema de partida (PSQL TABLE.md antes de las migraciones). IF NOT EXISTS
+-- para que las bases de datos ya desplegadas lo acepten sin cambios; si su
+-- sensor_readings aún tiene dallas_intern / dallas_extern, 002 las pasa a
+-- dallas_readings.
+
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    acelx NUMERIC,
+    acely NUMERIC,
+    acelz NUMERIC,
+    girox NUMERIC,
+    giroy NUMERIC,
+    giroz NUMERIC,
+    magx NUMERIC,
+    magy NUMERIC,
+    magz NUMERIC,
+    uva NUMERIC,
+    uvb NUMERIC,
+    uvc NUMERIC,
+    uv_temp NUMERIC,
+    bmp_pressure NUMERIC,
+    bmp_temperature NUMERIC,
+    bmp_altitude NUMERIC,
+    bmp_vertical_speed NUMERIC,
+    gps_speed_mps NUMERIC,
+    gps_gga_latitude NUMERIC,
+    gps_gga_longitude NUMERIC,
+    gps_distance NUMERIC,
+    gps_altitude NUMERIC,
+    gps_height_geoid NUMERIC,
+    gps_satellites INTEGER,
+    gps_pdop NUMERIC,
+    gps_hdop NUMERIC,
+    gps_vdop NUMERIC,
+    system_cpu_usage_percent NUMERIC,
+    system_ram_usage_percent NUMERIC,
+    system_temp_cpu_thermal NUMERIC,
+    timestamp TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS dallas_channels (
+    channel SMALLINT PRIMARY KEY,
+    serial TEXT UNIQUE NOT NULL,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS dallas_readings (
+    timestamp TIMESTAMP NOT NULL,
+    channel SMALLINT NOT NULL,
+    value REAL
+);
+
+INSERT INTO dallas_channels (channel, serial, name) VALUES
+    (1, '28-03a0d446ef0a', 'intern'),
+    (2, '28-6fc2d44578f0', 'extern')
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,135 @@
+-- 002_timeseries.sql
+-- sensor_readings y dallas_readings pasan a tablas particionadas por día con
+-- tipos REAL / DOUBLE PRECISION e índice BRIN sobre timestamp. Con un filtro
+-- de tiempo ($__timeFilter en Grafana) PostgreSQL sólo abre las particiones
+-- del rango pedido, así que el coste de una consulta no crece con el vuelo.
+
+ALTER TABLE sensor_readings RENAME TO sensor_readings_legacy;
+ALTER TABLE dallas_readings RENAME TO dallas_readings_legacy;
+DROP INDEX IF EXISTS dallas_readings_channel_timestamp_idx;
+
+CREATE TABLE sensor_readings (
+    timestamp TIMESTAMP NOT NULL,
+    acelx REAL,
+    acely REAL,
+    acelz REAL,
+    girox REAL,
+    giroy REAL,
+    giroz REAL,
+    magx REAL,
+    magy REAL,
+    magz REAL,
+    uva REAL,
+    uvb REAL,
+    uvc REAL,
+    uv_temp REAL,
+    bmp_pressure REAL,
+    bmp_temperature REAL,
+    bmp_altitude REAL,
+    bmp_vertical_speed REAL,
+    gps_speed_mps REAL,
+    gps_gga_latitude DOUBLE PRECISION,
+    gps_gga_longitude DOUBLE PRECISION,
+    gps_distance DOUBLE PRECISION,
+    gps_altitude REAL,
+    gps_height_geoid REAL,
+    gps_satellites SMALLINT,
+    gps_pdop REAL,
+    gps_hdop REAL,
+    gps_vdop REAL,
+    system_cpu_usage_percent REAL,
+    system_ram_usage_percent REAL,
+    system_temp_cpu_thermal REAL
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE dallas_readings (
+    timestamp TIMESTAMP NOT NULL,
+    channel SMALLINT NOT NULL,
+    value REAL
+) PARTITION BY RANGE (timestamp);
+
+-- Filas fuera de cualquier partición diaria (p. ej. reloj sin sincronizar)
+CREATE TABLE sensor_readings_default PARTITION OF sensor_readings DEFAULT;
+CREATE TABLE dallas_readings_default PARTITION OF dallas_readings DEFAULT;
+
+-- Los índices del padre se crean en cada partición
+CREATE INDEX sensor_readings_timestamp_brin ON sensor_readings USING BRIN (timestamp);
+CREATE INDEX dallas_readings_timestamp_brin ON dallas_readings USING BRIN (timestamp);
+CREATE INDEX dallas_readings_channel_timestamp_idx ON dallas_readings (channel, timestamp);
+
+-- Crea (si faltan) las particiones diarias de [first_day, first_day + days)
+CREATE OR REPLACE FUNCTION create_daily_partitions(first_day DATE, days INTEGER)
+RETURNS void AS $$
+DECLARE
+    day DATE;
+    parent TEXT;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['sensor_readings', 'dallas_readings'] LOOP
+        FOR i IN 0 .. days - 1 LOOP
+            day := first_day + i;
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                parent || '_' || to_char(day, 'YYYYMMDD'), parent, day, day + 1
+            );
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Particiones para los días con datos existentes y para la semana siguiente
+SELECT create_daily_partitions(day, 1)
+FROM (
+    SELECT DISTINCT timestamp::date AS day FROM sensor_readings_legacy WHERE timestamp IS NOT NULL
+    UNION
+    SELECT DISTINCT timestamp::date FROM dallas_readings_legacy
+) AS days;
+SELECT create_daily_partitions(current_date, 8);
+
+INSERT INTO sensor_readings (
+    timestamp, acelx, acely, acelz, girox, giroy, giroz, magx, magy, magz,
+    uva, uvb, uvc, uv_temp, bmp_pressure, bmp_temperature, bmp_altitude, bmp_vertical_speed,
+    gps_speed_mps, gps_gga_latitude, gps_gga_longitude, gps_distance, gps_altitude,
+    gps_height_geoid, gps_satellites, gps_pdop, gps_hdop, gps_vdop,
+    system_cpu_usage_percent, system_ram_usage_percent, system_temp_cpu_thermal
+)
+SELECT
+    timestamp, acelx, acely, acelz, girox, giroy, giroz, magx, magy, magz,
+    uva, uvb, uvc, uv_temp, bmp_pressure, bmp_temperature, bmp_altitude, bmp_vertical_speed,
+    gps_speed_mps, gps_gga_latitude, gps_gga_longitude, gps_distance, gps_altitude,
+    gps_height_geoid, gps_satellites, gps_pdop, gps_hdop, gps_vdop,
+    system_cpu_usage_percent, system_ram_usage_percent, system_temp_cpu_thermal
+FROM sensor_readings_legacy
+WHERE timestamp IS NOT NULL;
+
+INSERT INTO dallas_readings (timestamp, channel, value)
+SELECT timestamp, channel, value FROM dallas_readings_legacy;
+
+-- Las bases de datos anteriores a dallas_readings guardaban las dos sondas en
+-- sensor_readings.dallas_intern / dallas_extern (PSQL TABLE.md). Pasan a
+-- dallas_readings como los canales 1 y 2 de dallas_channels. Las filas sin
+-- timestamp no caben en una tabla particionada: se descartan y se avisa.
+DO $$
+DECLARE
+    discarded BIGINT;
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'sensor_readings_legacy' AND column_name = 'dallas_intern') THEN
+        INSERT INTO dallas_readings (timestamp, channel, value)
+        SELECT timestamp, 1, dallas_intern FROM sensor_readings_legacy
+        WHERE timestamp IS NOT NULL AND dallas_intern IS NOT NULL;
+    END IF;
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'sensor_readings_legacy' AND column_name = 'dallas_extern') THEN
+        INSERT INTO dallas_readings (timestamp, channel, value)
+        SELECT timestamp, 2, dallas_extern FROM sensor_readings_legacy
+        WHERE timestamp IS NOT NULL AND dallas_extern IS NOT NULL;
+    END IF;
+    SELECT count(*) INTO discarded FROM sensor_readings_legacy WHERE timestamp IS NULL;
+    IF discarded > 0 THEN
+        RAISE NOTICE '002_timeseries: % filas de sensor_readings sin timestamp descartadas', discarded;
+    END IF;
+END;
+$$;
+
+DROP TABLE sensor_readings_legacy;
+DROP TABLE dallas_readings_legacy;
@@ -0,0 +1,160 @@
+-- 003_rollups.sql
+-- Agregados min/max/media por métrica en cubetas de 10 s, 1 min y 10 min.
+-- Se actualizan de forma incremental con triggers por sentencia al insertar
+-- en sensor_readings / dallas_readings, así Grafana lee unos cientos de filas
+-- ya agregadas en vez de todas las lecturas del rango y diezmarlas él.
+
+CREATE TABLE sensor_rollups (
+    resolution INTEGER NOT NULL,              -- segundos: 10, 60 o 600
+    bucket TIMESTAMP NOT NULL,                -- inicio de la cubeta
+    metric TEXT NOT NULL,                     -- nombre de columna o dallas_<canal>
+    n INTEGER NOT NULL,
+    total DOUBLE PRECISION NOT NULL,          -- media = total / n
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (resolution, metric, bucket)
+);
+
+CREATE TABLE rollup_resolutions (resolution INTEGER PRIMARY KEY);
+INSERT INTO rollup_resolutions VALUES (10), (60), (600);
+
+CREATE OR REPLACE FUNCTION rollup_bucket(ts TIMESTAMP, seconds INTEGER)
+RETURNS TIMESTAMP AS $$
+    SELECT TIMESTAMP 'epoch' + floor(extract(epoch FROM ts) / seconds) * seconds * INTERVAL '1 second';
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Resolución que usa cada panel según el rango de tiempo pedido
+-- (entre ~500 y ~3000 puntos por serie)
+CREATE OR REPLACE FUNCTION rollup_resolution(time_from TIMESTAMPTZ, time_to TIMESTAMPTZ)
+RETURNS INTEGER AS $$
+    SELECT CASE
+        WHEN time_to - time_from <= INTERVAL '6 hours' THEN 10
+        WHEN time_to - time_from <= INTERVAL '2 days' THEN 60
+        ELSE 600
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Una fila (métrica, valor) por cada columna numérica de sensor_readings
+CREATE OR REPLACE FUNCTION sensor_metrics(s sensor_readings)
+RETURNS TABLE (metric TEXT, value DOUBLE PRECISION) AS $$
+    SELECT * FROM (VALUES
+        ('acelx', s.acelx::DOUBLE PRECISION),
+        ('acely', s.acely),
+        ('acelz', s.acelz),
+        ('girox', s.girox),
+        ('giroy', s.giroy),
+        ('giroz', s.giroz),
+        ('magx', s.magx),
+        ('magy', s.magy),
+        ('magz', s.magz),
+        ('uva', s.uva),
+        ('uvb', s.uvb),
+        ('uvc', s.uvc),
+        ('uv_temp', s.uv_temp),
+        ('bmp_pressure', s.bmp_pressure),
+        ('bmp_temperature', s.bmp_temperature),
+        ('bmp_altitude', s.bmp_altitude),
+        ('bmp_vertical_speed', s.bmp_vertical_speed),
+        ('gps_speed_mps', s.gps_speed_mps),
+        ('gps_gga_latitude', s.gps_gga_latitude),
+        ('gps_gga_longitude', s.gps_gga_longitude),
+        ('gps_distance', s.gps_distance),
+        ('gps_altitude', s.gps_altitude),
+        ('gps_height_geoid', s.gps_height_geoid),
+        ('gps_satellites', s.gps_satellites),
+        ('gps_pdop', s.gps_pdop),
+        ('gps_hdop', s.gps_hdop),
+        ('gps_vdop', s.gps_vdop),
+        ('system_cpu_usage_percent', s.system_cpu_usage_percent),
+        ('system_ram_usage_percent', s.system_ram_usage_percent),
+        ('system_temp_cpu_thermal', s.system_temp_cpu_thermal)
+    ) AS m (metric, value)
+    WHERE m.value IS NOT NULL AND m.value <> 'NaN';
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Vista (timestamp, métrica, valor) sobre las dos tablas de lecturas
+CREATE VIEW sensor_metric_values AS
+    SELECT s.timestamp, m.metric, m.value
+    FROM sensor_readings s CROSS JOIN LATERAL sensor_metrics(s) AS m
+    UNION ALL
+    SELECT timestamp, 'dallas_' || channel, value
+    FROM dallas_readings
+    WHERE value IS NOT NULL AND value <> 'NaN';
+
+-- Funde en sensor_rollups las filas (timestamp, metric, value) de una tabla
+-- temporal. Los triggers la rellenan con las filas nuevas de cada sentencia.
+CREATE OR REPLACE FUNCTION merge_rollups(source TEXT)
+RETURNS void AS $$
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO sensor_rollups AS r (resolution, bucket, metric, n, total, min_value, max_value)
+        SELECT res.resolution, rollup_bucket(v.timestamp, res.resolution), v.metric,
+               count(*), sum(v.value), min(v.value), max(v.value)
+        FROM %I v CROSS JOIN rollup_resolutions res
+        GROUP BY 1, 2, 3
+        ON CONFLICT (resolution, metric, bucket) DO UPDATE SET
+            n = r.n + EXCLUDED.n,
+            total = r.total + EXCLUDED.total,
+            min_value = LEAST(r.min_value, EXCLUDED.min_value),
+            max_value = GREATEST(r.max_value, EXCLUDED.max_value)
+    $sql$, source);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_sensor_readings()
+RETURNS trigger AS $$
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS rollup_batch (
+        timestamp TIMESTAMP, metric TEXT, value DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS;
+    TRUNCATE rollup_batch;
+    IF TG_TABLE_NAME = 'dallas_readings' THEN
+        INSERT INTO rollup_batch
+        SELECT timestamp, 'dallas_' || channel, value
+        FROM new_rows
+        WHERE value IS NOT NULL AND value <> 'NaN';
+    ELSE
+        INSERT INTO rollup_batch
+        SELECT s.timestamp, m.metric, m.value
+        FROM new_rows s CROSS JOIN LATERAL sensor_metrics(s::sensor_readings) AS m;
+    END IF;
+    PERFORM merge_rollups('rollup_batch');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sensor_readings_rollup
+    AFTER INSERT ON sensor_readings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_sensor_readings();
+
+CREATE TRIGGER dallas_readings_rollup
+    AFTER INSERT ON dallas_readings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_sensor_readings();
+
+-- Recalcula desde las lecturas las cubetas que tocan [time_from, time_to),
+-- p. ej. tras borrar o corregir datos (los UPDATE y DELETE no pasan por el
+-- trigger). Trabaja con cubetas de 10 min completas.
+CREATE OR REPLACE FUNCTION rebuild_rollups(time_from TIMESTAMP, time_to TIMESTAMP)
+RETURNS void AS $$
+DECLARE
+    first_bucket TIMESTAMP := rollup_bucket(time_from, 600);
+    last_bucket TIMESTAMP := rollup_bucket(time_to, 600) + INTERVAL '10 minutes';
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS rollup_batch (
+        timestamp TIMESTAMP, metric TEXT, value DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS;
+    TRUNCATE rollup_batch;
+    INSERT INTO rollup_batch
+    SELECT timestamp, metric, value FROM sensor_metric_values
+    WHERE timestamp >= first_bucket AND timestamp < last_bucket;
+    DELETE FROM sensor_rollups WHERE bucket >= first_bucket AND bucket < last_bucket;
+    PERFORM merge_rollups('rollup_batch');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Agregados de los datos que ya había
+SELECT rebuild_rollups(min(timestamp), max(timestamp))
+FROM sensor_metric_values
+HAVING count(*) > 0;
@@ -0,0 +1,38 @@
+-- 004_rollup_trigger.sql
+-- El trigger de 003 pasaba cada sentencia por una tabla temporal (CREATE IF
+-- NOT EXISTS + TRUNCATE + merge_rollups con SQL dinámico), varios ms por
+-- cada INSERT de una fila. Ahora agrega new_rows directamente con SQL
+-- estático, cuyo plan PL/pgSQL guarda en caché.
+
+CREATE OR REPLACE FUNCTION rollup_sensor_readings()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'dallas_readings' THEN
+        INSERT INTO sensor_rollups AS r (resolution, bucket, metric, n, total, min_value, max_value)
+        SELECT res.resolution, rollup_bucket(v.timestamp, res.resolution), 'dallas_' || v.channel,
+               count(*), sum(v.value), min(v.value), max(v.value)
+        FROM new_rows v CROSS JOIN rollup_resolutions res
+        WHERE v.value IS NOT NULL AND v.value <> 'NaN'
+        GROUP BY 1, 2, 3
+        ON CONFLICT (resolution, metric, bucket) DO UPDATE SET
+            n = r.n + EXCLUDED.n,
+            total = r.total + EXCLUDED.total,
+            min_value = LEAST(r.min_value, EXCLUDED.min_value),
+            max_value = GREATEST(r.max_value, EXCLUDED.max_value);
+    ELSE
+        INSERT INTO sensor_rollups AS r (resolution, bucket, metric, n, total, min_value, max_value)
+        SELECT res.resolution, rollup_bucket(s.timestamp, res.resolution), m.metric,
+               count(*), sum(m.value), min(m.value), max(m.value)
+        FROM new_rows s
+            CROSS JOIN LATERAL sensor_metrics(s::sensor_readings) AS m
+            CROSS JOIN rollup_resolutions res
+        GROUP BY 1, 2, 3
+        ON CONFLICT (resolution, metric, bucket) DO UPDATE SET
+            n = r.n + EXCLUDED.n,
+            total = r.total + EXCLUDED.total,
+            min_value = LEAST(r.min_value, EXCLUDED.min_value),
+            max_value = GREATEST(r.max_value, EXCLUDED.max_value);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
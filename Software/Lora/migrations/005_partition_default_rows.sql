@@ -0,0 +1,43 @@
+-- 005_partition_default_rows.sql
+-- Si pasan más días de los que cubren las particiones creadas, las filas
+-- nuevas caen en la partición DEFAULT y, a partir de ahí, CREATE TABLE ...
+-- PARTITION OF para esos días falla: choca con las filas que ya están en
+-- DEFAULT. Ahora cada partición se crea suelta, recibe las filas de su día
+-- que había en DEFAULT y se adjunta después (ATTACH PARTITION). Las filas se
+-- mueven directamente entre particiones, sin pasar por el padre, así que el
+-- trigger de los rollups no las cuenta dos veces.
+
+CREATE OR REPLACE FUNCTION create_daily_partitions(first_day DATE, days INTEGER)
+RETURNS void AS $$
+DECLARE
+    day DATE;
+    parent TEXT;
+    partition TEXT;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['sensor_readings', 'dallas_readings'] LOOP
+        FOR i IN 0 .. days - 1 LOOP
+            day := first_day + i;
+            partition := parent || '_' || to_char(day, 'YYYYMMDD');
+            CONTINUE WHEN to_regclass(partition) IS NOT NULL;
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition, parent);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                parent || '_default', day, day + 1, partition
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                parent, partition, day, day + 1
+            );
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Particiones para los días que ya tienen filas en DEFAULT
+SELECT create_daily_partitions(day, 1)
+FROM (
+    SELECT DISTINCT timestamp::date AS day FROM sensor_readings_default
+    UNION
+    SELECT DISTINCT timestamp::date FROM dallas_readings_default
+) AS days;
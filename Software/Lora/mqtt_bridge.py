@@ -0,0 +1,428 @@
+# mqtt_bridge.py
+#
+# Publicación de la telemetría recibida en un broker MQTT (mosquitto), para
+# paneles y servicios que no leen de PostgreSQL. Sustituye a
+# .old/RaspberryPi/MQTTdata.py, que abría una conexión nueva por mensaje con
+# publish.single.
+#
+# - Un solo cliente persistente (MQTT 3.1.1, sólo publicación, sin
+#   dependencias; igual que metrics.py no necesita prometheus_client), con
+#   keepalive y reconexión con backoff.
+# - Las lecturas se agrupan por tema: cada sección de la trama va a
+#   <prefijo>/<sección> (uaxsat/gps, uaxsat/bmp, ...) como una lista JSON
+#   de hasta batch_size lecturas, o lo que haya cada flush_interval segundos.
+#   Los eventos de la IMU salen al momento en <prefijo>/event.
+# - QoS 0 o 1. Con QoS 1 los mensajes sin PUBACK se reenvían (DUP) al
+#   reconectar; sin conexión, los mensajes esperan en una cola de
+#   max_queue (se descartan los más antiguos).
+#
+#   python3 receiveroptimiced.py --mqtt localhost:1883
+#   python3 mqtt_bridge.py --bench 2000                 # contra un broker simulado en el proceso
+#   python3 mqtt_bridge.py --bench 2000 --host localhost --qos 0
+
+import json
+import time
+import socket
+import struct
+import logging
+import argparse
+import datetime
+import threading
+import collections
+
+from metrics import REGISTRY
+from constants import MQTT_HOST, MQTT_PORT, MQTT_TOPIC_PREFIX
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+MQTT_MESSAGES = REGISTRY.counter('uaxsat_mqtt_messages_published_total', "Mensajes MQTT publicados", ['qos'])
+MQTT_BYTES = REGISTRY.counter('uaxsat_mqtt_bytes_published_total', "Bytes de carga publicados por MQTT")
+MQTT_READINGS = REGISTRY.counter('uaxsat_mqtt_readings_total', "Lecturas publicadas (varias por mensaje)")
+MQTT_QUEUED = REGISTRY.gauge('uaxsat_mqtt_offline_queue', "Mensajes MQTT a la espera de conexión")
+MQTT_DROPPED = REGISTRY.counter('uaxsat_mqtt_dropped_total', "Mensajes MQTT descartados con la cola llena")
+MQTT_CONNECTS = REGISTRY.counter('uaxsat_mqtt_connects_total', "Conexiones al broker", ['result'])
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PINGREQ, PINGRESP, DISCONNECT = 1, 2, 3, 4, 12, 13, 14
+
+def _string(value):
+    data = value.encode('utf-8')
+    return struct.pack('!H', len(data)) + data
+
+def _packet(kind, flags, body):
+    """Paquete MQTT: cabecera fija (tipo, flags, longitud restante en base 128) + cuerpo."""
+    header = bytearray([kind << 4 | flags])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | (0x80 if length else 0))
+        if not length:
+            break
+    return bytes(header) + body
+
+def _read_packet(sock_file):
+    """(tipo, flags, cuerpo) del siguiente paquete, o None si se cerró la conexión."""
+    first = sock_file.read(1)
+    if not first:
+        return None
+    length, shift = 0, 0
+    while True:
+        byte = sock_file.read(1)
+        if not byte:
+            return None
+        length |= (byte[0] & 0x7F) << shift
+        shift += 7
+        if not byte[0] & 0x80:
+            break
+    body = sock_file.read(length) if length else b''
+    return first[0] >> 4, first[0] & 0x0F, body
+
+def publish_packet(topic, payload, qos=0, packet_id=0, dup=False):
+    body = _string(topic) + (struct.pack('!H', packet_id) if qos else b'') + payload
+    return _packet(PUBLISH, (dup << 3) | (qos << 1), body)
+
+class MQTTClient:
+    """
+    Cliente MQTT 3.1.1 de sólo publicación sobre una conexión persistente.
+    publish() nunca bloquea esperando al broker: si no hay conexión (y no
+    toca reintentar todavía) devuelve False y el llamante decide.
+    """
+
+    def __init__(self, host=MQTT_HOST, port=MQTT_PORT, client_id=None, keepalive=60,
+                 username=None, password=None, min_backoff=1.0, max_backoff=60.0, max_inflight=100, send_timeout=5.0):
+        self.host = host
+        self.port = port
+        self.client_id = client_id or f"uaxsat-{socket.gethostname()}"
+        self.keepalive = keepalive
+        self.username = username
+        self.password = password
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_inflight = max_inflight
+        self.send_timeout = send_timeout
+        self.sock = None
+        self.lock = threading.Lock()
+        self.inflight = collections.OrderedDict()  # packet_id -> (topic, payload), QoS 1 sin PUBACK
+        self.packet_id = 0
+        self.last_sent = 0.0
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def connect(self):
+        """Conecta si no lo está y toca intentarlo; devuelve si hay conexión."""
+        if self.sock is not None:
+            return True
+        now = time.monotonic()
+        if now < self.next_attempt:
+            return False
+        flags = 0x02  # Sesión limpia
+        payload = _string(self.client_id)
+        if self.username:
+            flags |= 0x80
+            payload += _string(self.username)
+            if self.password:
+                flags |= 0x40
+                payload += _string(self.password)
+        body = _string('MQTT') + bytes([4, flags]) + struct.pack('!H', self.keepalive) + payload
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=5)
+            sock.sendall(_packet(CONNECT, 0, body))
+            sock_file = sock.makefile('rb')
+            reply = _read_packet(sock_file)
+            if reply is None or reply[0] != CONNACK or reply[2][1] != 0:
+                raise ConnectionError(f"CONNACK rechazado: {reply}")
+            # El hilo lector espera sin plazo; el envío lo tiene (SO_SNDTIMEO), para
+            # que un broker que deja de leer no bloquee el bucle del receptor
+            sock.settimeout(None)
+            seconds, fraction = divmod(self.send_timeout, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', int(seconds), int(fraction * 1e6)))
+        except (OSError, ConnectionError, IndexError) as e:
+            self.backoff = min(max(self.backoff * 2, self.min_backoff), self.max_backoff)
+            self.next_attempt = now + self.backoff
+            MQTT_CONNECTS.labels('error').inc()
+            logger.error("No se pudo conectar al broker MQTT %s:%s: %s (reintento en %.0f s)",
+                         self.host, self.port, e, self.backoff)
+            return False
+        self.backoff = 0.0
+        self.sock = sock
+        self.last_sent = now
+        MQTT_CONNECTS.labels('ok').inc()
+        logger.info("Conectado al broker MQTT %s:%s.", self.host, self.port)
+        threading.Thread(target=self._reader, args=(sock, sock_file), name='mqtt-reader', daemon=True).start()
+        # Lo que quedó sin confirmar en la conexión anterior se reenvía con DUP
+        with self.lock:
+            for packet_id, (topic, payload) in list(self.inflight.items()):
+                self._send(publish_packet(topic, payload, 1, packet_id, dup=True))
+        return self.sock is not None
+
+    def _reader(self, sock, sock_file):
+        """Hilo que lee PUBACK y PINGRESP hasta que se cierra la conexión."""
+        while True:
+            try:
+                packet = _read_packet(sock_file)
+            except OSError:
+                packet = None
+            if packet is None:
+                break
+            kind, _, body = packet
+            if kind == PUBACK:
+                with self.lock:
+                    self.inflight.pop(struct.unpack('!H', body[:2])[0], None)
+        with self.lock:
+            if self.sock is sock:
+                logger.warning("Conexión con el broker MQTT cerrada.")
+                self._drop()
+
+    def _drop(self):
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)  # Despierta al hilo lector
+            except OSError:
+                pass
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+            self.next_attempt = time.monotonic() + self.min_backoff
+
+    def _send(self, data):
+        """Envía con el lock tomado; si falla, deja la conexión cerrada."""
+        if self.sock is None:
+            return False
+        try:
+            self.sock.sendall(data)
+            self.last_sent = time.monotonic()
+            return True
+        except (socket.timeout, BlockingIOError):
+            # Plazo de envío agotado (puede quedar un paquete a medias): se trata como una desconexión
+            logger.error("El broker MQTT no acepta datos en %.0f s; se cierra la conexión.", self.send_timeout)
+            self._drop()
+            return False
+        except OSError as e:
+            logger.error("Error enviando al broker MQTT: %s", e)
+            self._drop()
+            return False
+
+    def publish(self, topic, payload, qos=0):
+        """Publica `payload` (bytes); devuelve False si no se pudo entregar al socket."""
+        if not self.connect():
+            return False
+        with self.lock:
+            if qos and len(self.inflight) >= self.max_inflight:
+                return False  # El broker no confirma: que espere en la cola
+            packet_id = 0
+            if qos:
+                self.packet_id = self.packet_id % 65535 + 1
+                packet_id = self.packet_id
+                self.inflight[packet_id] = (topic, payload)
+            if not self._send(publish_packet(topic, payload, qos, packet_id)):
+                return bool(qos)  # Con QoS 1 ya está en inflight y se reenvía al reconectar
+        MQTT_MESSAGES.labels(str(qos)).inc()
+        MQTT_BYTES.inc(len(payload))
+        return True
+
+    def ping(self):
+        """PINGREQ si la conexión lleva media keepalive sin enviar nada."""
+        if self.sock is not None and time.monotonic() - self.last_sent > self.keepalive / 2:
+            with self.lock:
+                self._send(_packet(PINGREQ, 0, b''))
+
+    def close(self):
+        with self.lock:
+            if self.sock is not None:
+                self._send(_packet(DISCONNECT, 0, b''))
+            self._drop()
+
+class MQTTBridge:
+    """Agrupa las tramas del receptor en mensajes por tema y los publica con `client`."""
+
+    def __init__(self, client, prefix=MQTT_TOPIC_PREFIX, qos=1, batch_size=20, flush_interval=2.0, max_queue=10000):
+        self.client = client
+        self.prefix = prefix.rstrip('/')
+        self.qos = qos
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches = collections.defaultdict(list)
+        self.queue = collections.deque()  # (tema, carga, lecturas) sin publicar
+        self.max_queue = max_queue
+        self.last_flush = time.monotonic()
+
+    def topic(self, section):
+        return f"{self.prefix}/{section.lower()}"
+
+    def add(self, data):
+        timestamp = data.get('timestamp')
+        if 'EVENT' in data:
+            self._enqueue(self.topic('event'), [{'timestamp': timestamp, 'events': data['EVENT']}])
+            self.publish_queued()
+            return
+        for section, values in data.items():
+            if section in ('timestamp', 'TRACE'):
+                continue
+            readings = self.batches[section]
+            readings.append({'timestamp': timestamp, 'values': values})
+            if len(readings) >= self.batch_size:
+                self._enqueue(self.topic(section), readings)
+                del self.batches[section]
+
+    def _enqueue(self, topic, readings):
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            MQTT_DROPPED.inc()
+        payload = json.dumps(readings, separators=(',', ':')).encode('utf-8')
+        self.queue.append((topic, payload, len(readings)))
+
+    def publish_queued(self):
+        """Publica la cola por orden; lo que no sale espera al siguiente intento."""
+        while self.queue:
+            topic, payload, readings = self.queue[0]
+            if not self.client.publish(topic, payload, self.qos):
+                break
+            self.queue.popleft()
+            MQTT_READINGS.inc(readings)
+        MQTT_QUEUED.set(len(self.queue))
+
+    def flush(self, now=None):
+        self.last_flush = time.monotonic() if now is None else now
+        for section, readings in self.batches.items():
+            self._enqueue(self.topic(section), readings)
+        self.batches.clear()
+        self.publish_queued()
+
+    def flush_due(self, now=None):
+        """Llamar en cada vuelta del bucle del receptor."""
+        now = time.monotonic() if now is None else now
+        if now - self.last_flush >= self.flush_interval:
+            self.flush(now)
+        elif self.queue:
+            self.publish_queued()
+        self.client.ping()
+
+    def close(self):
+        self.flush()
+        self.client.close()
+
+class BrokerStub:
+    """
+    Broker MQTT mínimo en el proceso, para pruebas: acepta CONNECT, responde
+    PUBACK a QoS 1 y PINGRESP, y guarda (tema, carga, qos) en `messages`.
+    disconnect_all() corta las conexiones abiertas.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+        self.messages = []
+        self.connections = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accept, name='mqtt-broker', daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        sock_file = conn.makefile('rb')
+        try:
+            while True:
+                packet = _read_packet(sock_file)
+                if packet is None:
+                    return
+                kind, flags, body = packet
+                if kind == CONNECT:
+                    conn.sendall(_packet(CONNACK, 0, b'\x00\x00'))
+                elif kind == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    length = struct.unpack('!H', body[:2])[0]
+                    topic = body[2:2 + length].decode('utf-8')
+                    offset = 2 + length + (2 if qos else 0)
+                    with self.lock:
+                        self.messages.append((topic, body[offset:], qos))
+                    if qos:
+                        conn.sendall(_packet(PUBACK, 0, body[2 + length:offset]))
+                elif kind == PINGREQ:
+                    conn.sendall(_packet(PINGRESP, 0, b''))
+                elif kind == DISCONNECT:
+                    return
+        except OSError:
+            return
+        finally:
+            conn.close()
+
+    def disconnect_all(self):
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.connections = []
+
+    def close(self):
+        self.disconnect_all()
+        self.server.close()
+
+def bench(frames, host, port, qos, batch_size):
+    """Tramas por segundo con el puente frente a una conexión por mensaje (publish.single)."""
+    from bench_insert import sample_frame
+
+    data = [sample_frame(i, datetime.datetime(2026, 1, 1) + datetime.timedelta(seconds=i)) for i in range(frames)]
+    client = MQTTClient(host, port, client_id='uaxsat-bench')
+    bridge = MQTTBridge(client, qos=qos, batch_size=batch_size)
+    start = time.perf_counter()
+    for frame in data:
+        bridge.add(frame)
+        bridge.flush_due()
+    bridge.flush()
+    while client.inflight:
+        time.sleep(0.001)
+    bridged = time.perf_counter() - start
+    client.close()
+
+    # Como MQTTdata.py: conexión nueva y un mensaje con la trama entera por lectura
+    single = data[:min(frames, 200)]
+    start = time.perf_counter()
+    for frame in single:
+        client = MQTTClient(host, port, client_id='uaxsat-bench-single')
+        client.publish('data', json.dumps(frame).encode('utf-8'), qos)
+        while client.inflight:
+            time.sleep(0.0001)
+        client.close()
+    one_by_one = time.perf_counter() - start
+    return frames / bridged, len(single) / one_by_one
+
+def main():
+    parser = argparse.ArgumentParser(description="Puente MQTT de la telemetría.")
+    parser.add_argument('--bench', type=int, metavar='TRAMAS', help="Mide el rendimiento con TRAMAS tramas")
+    parser.add_argument('--host', help="Broker real (por defecto uno simulado en el proceso)")
+    parser.add_argument('--port', type=int, default=MQTT_PORT)
+    parser.add_argument('--qos', type=int, choices=(0, 1), default=1)
+    parser.add_argument('--batch-size', type=int, default=20)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.error("indica --bench (el puente se usa desde receiveroptimiced.py --mqtt)")
+
+    logging.basicConfig(level=logging.WARNING)
+    stub = None
+    host, port = args.host, args.port
+    if host is None:
+        stub = BrokerStub()
+        host, port = stub.address
+    bridged, single = bench(args.bench, host, port, args.qos, args.batch_size)
+    print(f"QoS {args.qos}, lotes de {args.batch_size}: {bridged:,.0f} tramas/s con el puente, "
+          f"{single:,.0f} tramas/s con una conexión por mensaje ({bridged / single:.0f}x)")
+    if stub:
+        print(f"Broker simulado: {len(stub.messages)} mensajes recibidos.")
+        stub.close()
+
+if __name__ == '__main__':
+    main()
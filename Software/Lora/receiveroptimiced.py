@@ -1,82 +1,262 @@
 import serial
 import time
+import socket
 import json
 import logging
-import RPi.GPIO as GPIO
+import argparse
 
 # Importar funciones de PostgreSQL y de LoRa desde los módulos
-from db_functions import *
+try:
+    from db_functions import DBClient, PartitionKeeper, ensure_partitions, insert_data_to_db
+except ImportError as e:
+    # Sin psycopg2 las tramas van a frame_log (o al concentrador)
+    DBClient = None
+    DB_IMPORT_ERROR = e
 from lora_functions import *
 from constants import *
+from link_capture import CaptureWriter
+from tracing import LatencyTracker
+from metrics import REGISTRY, start_http_server
+from flightlog import setup_logging
 
-# Configuración del logger
-logging.basicConfig(level=logging.INFO)
+# Configuración del logger (setup_logging en main; en el bucle, formato perezoso con %s)
 logger = logging.getLogger(__name__)
 
+# Métricas en http://127.0.0.1:RECEIVER_METRICS_PORT/metrics
+RX_BYTES = REGISTRY.counter('uaxsat_rx_bytes_total', "Bytes leídos del puerto serie")
+RX_DISCARDED_BYTES = REGISTRY.counter('uaxsat_rx_discarded_bytes_total', "Bytes descartados fuera de <<< >>>")
+FRAMES_RECEIVED = REGISTRY.counter('uaxsat_frames_received_total', "Tramas recibidas", ['kind'])
+DECODE_FAILURES = REGISTRY.counter('uaxsat_decode_failures_total', "Mensajes que no son JSON válido")
+
 def clean_message(message):
     """Limpia caracteres no válidos de un mensaje JSON."""
     return message.replace('\n', '').replace('\r', '').replace('\t', '').replace('\x00', '')
 
-def receive_message(cursor, connection):
-    """Recibe mensajes vía LoRa y procesa los datos entre marcadores."""
-    buffer = ""
+class Deframer:
+    """
+    Extrae los mensajes entre los marcadores <<< y >>> de los trozos leídos
+    del puerto serie. Con `rssi` (RSSI activado en el E220) el módulo mete
+    tras cada paquete de radio (`packet_size` bytes, el último más corto) un
+    byte con su intensidad de señal: -(256 - byte) dBm. Esos bytes se quitan
+    del mensaje y el RSSI de la trama es el de su peor paquete. El emisor
+    escribe cada mensaje de una vez, así que el primer paquete empieza en <<<.
+    """
+
+    def __init__(self, rssi=False, packet_size=200):
+        # Se acumulan bytes y se decodifica cada mensaje entero: un trozo puede
+        # cortar un carácter UTF-8 o caer justo en un espacio del mensaje
+        self.buffer = b""
+        self.rssi = rssi
+        self.packet_size = packet_size
+
+    def feed(self, chunk):
+        """Añade un trozo (bytes) y devuelve la lista de mensajes completos."""
+        return [message for message, _ in self.feed_frames(chunk)]
+
+    def feed_frames(self, chunk):
+        """Como feed(), pero devuelve pares (mensaje, RSSI en dBm o None)."""
+        self.buffer += chunk
+        logger.debug("Buffer actualizado: %r", self.buffer)
+        messages = []
+        while True:
+            start = self.buffer.find(b'<<<')
+            if start == -1:
+                # Sin inicio de mensaje: sólo hace falta guardar un posible '<<' final
+                if len(self.buffer) > 2:
+                    RX_DISCARDED_BYTES.inc(len(self.buffer) - 2)
+                self.buffer = self.buffer[-2:]
+                break
+            if start:
+                RX_DISCARDED_BYTES.inc(start)
+            if self.rssi:
+                payload, rssi, consumed = self._split_packets(start)
+            else:
+                end = self.buffer.find(b'>>>', start + 3)
+                payload, rssi, consumed = (None, None, None) if end == -1 else (self.buffer[start:end+3], None, end + 3)
+            if payload is None:
+                self.buffer = self.buffer[start:]
+                break  # Esperar el resto del mensaje
+            message_content = payload[3:-3].decode('utf-8', errors='ignore')
+            self.buffer = self.buffer[consumed:]  # Actualizar el buffer
+            logger.debug("Mensaje completo extraído: %s", message_content)
+            messages.append((message_content, rssi))
+        return messages
+
+    def _split_packets(self, start):
+        """
+        Recorre el mensaje que empieza en `start` paquete a paquete. Devuelve
+        (mensaje sin los bytes de RSSI, RSSI mínimo en dBm, bytes consumidos
+        del buffer), o (None, None, None) si aún no ha llegado entero.
+        """
+        payload = b""
+        values = []
+        position = start
+        while True:
+            packet = self.buffer[position:position + self.packet_size]
+            end = (payload + packet).find(b'>>>', 3)
+            if end != -1:
+                # El mensaje acaba en este paquete; detrás viene su byte de RSSI
+                cut = end + 3 - len(payload)
+                if position + cut >= len(self.buffer):
+                    return None, None, None
+                values.append(self.buffer[position + cut])
+                return payload + packet[:cut], -(256 - min(values)), position + cut + 1
+            if len(packet) < self.packet_size or position + self.packet_size >= len(self.buffer):
+                return None, None, None
+            payload += packet
+            values.append(self.buffer[position + self.packet_size])
+            position += self.packet_size + 1
+
+def decode_message(message_content):
+    """Limpia y deserializa un mensaje; devuelve el dict o None si no es JSON válido."""
+    try:
+        cleaned_message = clean_message(message_content)
+        logger.debug("Mensaje limpio extraído: %s", cleaned_message)
+        data = json.loads(cleaned_message)
+        logger.debug("Datos deserializados: %s", data)
+        return data
+    except json.JSONDecodeError as e:
+        logger.error("Error al deserializar el mensaje: %s", e)
+        logger.error("Mensaje problemático: %s", message_content)
+        DECODE_FAILURES.inc()
+        return None
+
+def store_data(db, data):
+    """
+    Guarda una trama de sensores; las tramas de eventos sólo se registran.
+    Devuelve False si la trama no llegó a la base de datos (o no hay).
+    """
+    if 'EVENT' in data:
+        # Trama prioritaria de eventos de la IMU, sin lecturas de sensores
+        for event in data['EVENT']:
+            logger.warning("Evento IMU recibido: %s", event)
+        FRAMES_RECEIVED.labels('event').inc()
+        return True
+    FRAMES_RECEIVED.labels('sensor').inc()
+    if db is None:
+        return False
+    return insert_data_to_db(db, data)  # Usar función del módulo
+
+def receive_message(db, capture=None, tracker=None, fanin=None, rssi=False, mqtt=None, frame_log=None, log_all=False,
+                    packet_size=200):
+    """
+    Recibe mensajes vía LoRa y procesa los datos entre marcadores. Con
+    `capture` (un link_capture.CaptureWriter) guarda además cada trozo leído
+    tal cual, para reproducirlo luego con link_capture.py. Con `tracker` (un
+    tracing.LatencyTracker) mide la latencia de cada trama con bloque TRACE.
+    Con `fanin` (un fanin.FanInClient) las tramas van al concentrador en vez
+    de a la base de datos. Con `mqtt` (un mqtt_bridge.MQTTBridge) se publican
+    además en el broker. Con `frame_log` (un frame_log.FrameLog) se guardan
+    en ficheros planos todas (`log_all`) o sólo las que no llegaron a la
+    base de datos o al concentrador (éstas siguen además en la cola del
+    FanInClient, así que al reconectar pueden quedar en los dos sitios).
+    """
+    deframer = Deframer(rssi, packet_size)
+    partitions = PartitionKeeper(db) if db else None
     try:
         with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser:
             logger.info("Puerto serial abierto para recepción.")
             while True:
+                if mqtt:
+                    mqtt.flush_due()
+                if partitions:
+                    partitions.run_due()
                 if ser.in_waiting > 0:
-                    chunk = ser.read(ser.in_waiting).decode('utf-8', errors='ignore').strip()
-                    buffer += chunk
-                    logger.debug(f"Buffer actualizado: {buffer}")
-
-                    # Procesar mensajes completos
-                    while '<<<' in buffer and '>>>' in buffer:
-                        start = buffer.find('<<<') + 3
-                        end = buffer.find('>>>', start)
-                        if end != -1:
-                            message_content = buffer[start:end]
-                            buffer = buffer[end+3:]  # Actualizar el buffer
-                            logger.debug(f"Mensaje completo extraído: {message_content}")
-                            try:
-                                # Limpiar y deserializar mensaje
-                                cleaned_message = clean_message(message_content)
-                                logger.info(f"Mensaje limpio extraído: {cleaned_message}")
-                                data = json.loads(cleaned_message)
-                                logger.info("Datos del sensor recibidos y deserializados.")
-                                logger.debug(f"Datos deserializados: {data}")
-                                insert_data_to_db(cursor, connection, data)  # Usar función del módulo
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Error al deserializar el mensaje: {e}")
-                                logger.error(f"Mensaje problemático: {message_content}")
+                    chunk = ser.read(ser.in_waiting)
+                    received, arrival = time.time(), time.monotonic()
+                    RX_BYTES.inc(len(chunk))
+                    if capture:
+                        capture.write(chunk)
+                    for message_content, message_rssi in deframer.feed_frames(chunk):
+                        data = decode_message(message_content)
+                        if data is None:
+                            continue
+                        decoded = time.monotonic()
+                        if fanin:
+                            stored = fanin.send(data, message_rssi)
                         else:
-                            break  # Esperar el resto del mensaje
+                            stored = store_data(db, data)
+                        if frame_log and (log_all or not stored):
+                            frame_log.append(data)
+                        if mqtt:
+                            mqtt.add(data)
+                        if tracker and 'TRACE' in data:
+                            tracker.observe_frame(data['TRACE'], received, arrival, decoded,
+                                                  time.monotonic() if stored else None)
                 else:
                     time.sleep(0.1)
     except serial.SerialException as e:
-        logger.error(f"Error en la comunicación serial: {e}")
+        logger.error("Error en la comunicación serial: %s", e)
     except Exception as e:
-        logger.error(f"Error inesperado en receive_message: {e}")
+        logger.error("Error inesperado en receive_message: %s", e)
 
 def main():
+    parser = argparse.ArgumentParser(description="Receptor LoRa de la telemetría.")
+    parser.add_argument('--capture', metavar='PATH', help="Guarda los bytes recibidos para link_capture.py")
+    parser.add_argument('--fanin', nargs='?', const=FANIN_ADDRESS, metavar='DIRECCION',
+                        help=f"Envía las tramas al concentrador (fanin.py) en vez de a la base de datos (por defecto {FANIN_ADDRESS})")
+    parser.add_argument('--receiver-id', default=socket.gethostname(), help="Nombre de este receptor para el concentrador")
+    parser.add_argument('--rssi', action='store_true', help="El E220 añade un byte de RSSI tras cada paquete")
+    parser.add_argument('--packet-size', type=int, choices=(32, 64, 128, 200), default=200,
+                        help="packet_size del E220 emisor (para quitar los bytes de RSSI)")
+    parser.add_argument('--mqtt', nargs='?', const=f"{MQTT_HOST}:{MQTT_PORT}", metavar='HOST[:PUERTO]',
+                        help=f"Publica las tramas en un broker MQTT (por defecto {MQTT_HOST}:{MQTT_PORT})")
+    parser.add_argument('--mqtt-qos', type=int, choices=(0, 1), default=1)
+    parser.add_argument('--log', metavar='DIR', help=f"Guarda todas las tramas en ficheros planos (sin --log, sólo "
+                                                     f"las que no llegan a la base de datos, en {FRAME_LOG_DIR})")
+    parser.add_argument('--log-format', choices=('ndjson', 'csv'), default='ndjson')
+    args = parser.parse_args()
+
+    setup_logging()
+    capture = None
+    db = None
+    fanin = None
+    mqtt = None
+    frame_log = None
+    tracker = LatencyTracker(LATENCY_REPORT_PATH, registry=REGISTRY)
     try:
         logger.info("Iniciando el programa receptor...")
+        open_gpio()
         enter_normal_mode()
-        connection, cursor = connect_to_db()  # Usar función del módulo
-        receive_message(cursor, connection)
+        start_http_server(RECEIVER_METRICS_PORT, METRICS_HOST)
+        if args.fanin:
+            from fanin import FanInClient
+            fanin = FanInClient(args.fanin, args.receiver_id)
+        elif DBClient is None:
+            logger.warning("Sin base de datos (%s): las tramas van a %s.", DB_IMPORT_ERROR, args.log or FRAME_LOG_DIR)
+        else:
+            db = DBClient()  # Usar función del módulo
+            ensure_partitions(db)
+        # Sin --log el FrameLog sólo guarda las tramas que no llegan a la base
+        # de datos o al concentrador
+        from frame_log import FrameLog
+        frame_log = FrameLog(args.log or FRAME_LOG_DIR, args.log_format)
+        if args.mqtt:
+            from mqtt_bridge import MQTTClient, MQTTBridge
+            host, _, port = args.mqtt.partition(':')
+            mqtt = MQTTBridge(MQTTClient(host, int(port or MQTT_PORT)), qos=args.mqtt_qos)
+        if args.capture:
+            capture = CaptureWriter(args.capture)
+            logger.info("Capturando el enlace en %s.", args.capture)
+        receive_message(db, capture, tracker, fanin, args.rssi, mqtt, frame_log, bool(args.log), args.packet_size)
     except KeyboardInterrupt:
         logger.info("Programa interrumpido por el usuario.")
     except Exception as e:
-        logger.error(f"Error inesperado: {e}")
+        logger.error("Error inesperado: %s", e)
     finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-            logger.debug("Cursor de la base de datos cerrado.")
-        if 'connection' in locals() and connection:
-            connection.close()
-            logger.debug("Conexión a la base de datos cerrada.")
+        if db:
+            db.close()
+        if fanin:
+            fanin.close()
+        if mqtt:
+            mqtt.close()
+        if frame_log:
+            frame_log.close()
+        if capture:
+            capture.close()
+        tracker.write()
         logger.info("Terminando el programa receptor. Limpiando GPIO...")
-        GPIO.cleanup()
-        logger.debug("GPIO limpiado.")
+        close_gpio()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,202 @@
+# scheduler.py
+#
+# Planificador de la telemetría por canales. Cada canal (un sensor) se
+# muestrea con su propio periodo y tiene una prioridad de bajada (0 = la más
+# alta). En cada tick se leen los canales que toca y se arma una trama con
+# las muestras pendientes, por orden de prioridad, hasta llenar el
+# packet_size del E220; lo que no cabe espera al siguiente tick. Cada vez que
+# una muestra se queda fuera, su canal sube un puesto (envejecimiento), así
+# que un canal de baja prioridad acaba saliendo aunque los demás llenen
+# siempre el paquete. Una muestra nueva sustituye a la pendiente del mismo
+# canal: sólo se envía el último valor de cada sensor.
+#
+# Un canal que por sí solo no cabe en packet_size (el GPS o la IMU con 200
+# bytes) sale solo en su trama; el E220 la parte en varios paquetes.
+#
+# Las tramas planificadas no llevan bloque TRACE: con las marcas por sensor
+# y las de la trama anterior ocupa más de 100 bytes y, con la hora, ya no
+# cabría ningún canal en un paquete de 200. frame_size() mide la trama tal
+# como la serializa el emisor (sólo secciones y hora), y simulate() usa la
+# misma función que la etapa 'schedule'.
+#
+# Los periodos son objetivos: los sensores se leen uno detrás de otro, y si
+# un tick se retrasa los plazos perdidos se saltan en vez de acumularse.
+#
+#   python3 scheduler.py                          # simula 10 minutos con los canales por defecto
+#   python3 scheduler.py --duration 3600 --packet-size 128
+
+import json
+import time
+import logging
+import argparse
+import datetime
+
+from metrics import REGISTRY
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+CHANNEL_SAMPLES = REGISTRY.counter('uaxsat_channel_samples_total', "Muestras leídas de cada canal", ['channel'])
+CHANNEL_SUPERSEDED = REGISTRY.counter('uaxsat_channel_superseded_total',
+                                      "Muestras sustituidas por otra más nueva antes de enviarse", ['channel'])
+CHANNEL_AGE_SECONDS = REGISTRY.histogram('uaxsat_channel_age_seconds',
+                                         "Antigüedad de la muestra de cada canal al meterla en una trama", ['channel'])
+
+FRAME_MARKERS = len('<<<>>>')
+
+def frame_size(compact=False, headroom=0):
+    """
+    Función size() para TelemetryScheduler.pack(): bytes en el aire de una
+    trama con esas secciones y la hora, serializada como en
+    emitteroptimiced.serialize_sensor_data, con los marcadores y `headroom`.
+    """
+    separators = (',', ':') if compact else None
+    stamp = {'timestamp': '2026-01-01 00:00:00'}
+    return lambda sections: len(json.dumps({**sections, **stamp}, separators=separators)) + FRAME_MARKERS + headroom
+
+class Channel:
+    """
+    Un sensor del planificador. read(trace) devuelve las secciones de la
+    trama que aporta ({'IMU': ..., 'ATT': ...}) o None si la lectura falla.
+    """
+
+    def __init__(self, name, period, priority, read):
+        self.name = name
+        self.period = period
+        self.priority = priority
+        self.read = read
+        self.next_due = 0.0
+        self.sample = None
+        self.sampled_at = None
+        self.wall = None
+        self.skipped = 0
+
+    def rank(self):
+        """Clave de orden al empaquetar: prioridad con envejecimiento y, a igualdad, la muestra más antigua."""
+        return (self.priority - self.skipped, self.sampled_at)
+
+class TelemetryScheduler:
+    def __init__(self, channels, packet_size):
+        self.channels = list(channels)
+        self.packet_size = packet_size
+
+    def sample_due(self, trace, now=None):
+        """Lee, por orden de prioridad, los canales cuyo plazo ha vencido; devuelve sus nombres."""
+        now = time.monotonic() if now is None else now
+        sampled = []
+        for channel in sorted(self.channels, key=lambda channel: channel.priority):
+            if channel.next_due > now:
+                continue
+            channel.next_due += channel.period
+            if channel.next_due <= now:
+                channel.next_due = now + channel.period
+            data = channel.read(trace)
+            if not data:
+                continue
+            CHANNEL_SAMPLES.labels(channel.name).inc()
+            if channel.sample is not None:
+                CHANNEL_SUPERSEDED.labels(channel.name).inc()
+            channel.sample = data
+            channel.sampled_at = now
+            channel.wall = trace.wall
+            sampled.append(channel.name)
+        return sampled
+
+    def pack(self, size, now=None):
+        """
+        Trama con las muestras pendientes que caben en packet_size según
+        size(secciones) (los bytes en el aire de la trama completa), o None
+        si no hay nada pendiente. La hora de la trama es la de su muestra
+        más antigua.
+        """
+        now = time.monotonic() if now is None else now
+        pending = sorted((channel for channel in self.channels if channel.sample is not None), key=Channel.rank)
+        if not pending:
+            return None
+        sections = {}
+        packed = []
+        for channel in pending:
+            candidate = {**sections, **channel.sample}
+            if packed and size(candidate) > self.packet_size:
+                channel.skipped += 1
+                continue
+            sections = candidate
+            packed.append(channel)
+            if size(sections) > self.packet_size:
+                logger.debug("El canal %s no cabe en %d bytes; sale solo.", channel.name, self.packet_size)
+                for rest in pending[pending.index(channel) + 1:]:
+                    rest.skipped += 1
+                break
+        for channel in packed:
+            CHANNEL_AGE_SECONDS.labels(channel.name).observe(now - channel.sampled_at)
+            channel.sample = None
+            channel.skipped = 0
+        sections['timestamp'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(min(channel.wall for channel in packed)))
+        return sections
+
+    def delay(self, now=None):
+        """Segundos hasta el siguiente plazo."""
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(channel.next_due for channel in self.channels) - now)
+
+def simulate(channels, packet_size, duration, compact=False, headroom=0):
+    """
+    Ejecuta el planificador con un reloj virtual y muestras de tamaño real
+    (bench_insert.sample_frame), medidas con el mismo frame_size() que la
+    etapa 'schedule'; devuelve {canal: (muestras, enviadas, antigüedad media
+    en s)} y el número de tramas.
+    """
+    from bench_insert import sample_frame
+    from tracing import FrameTrace
+
+    frame = sample_frame(0, datetime.datetime(2026, 1, 1))
+    size = frame_size(compact, headroom)
+    stats = {name: [0, 0, 0.0] for name, _, _ in channels}
+
+    def reader(name):
+        def read(trace):
+            stats[name][0] += 1
+            if name == 'IMU':
+                return {'IMU': frame['IMU'], 'ATT': frame['ATT']}
+            return {name: frame[name]}
+        return read
+
+    scheduler = TelemetryScheduler([Channel(name, period, priority, reader(name))
+                                    for name, period, priority in channels], packet_size)
+    now = 0.0
+    frames = 0
+    while now < duration:
+        scheduler.sample_due(FrameTrace(frames), now)
+        ages = {channel.name: now - channel.sampled_at for channel in scheduler.channels if channel.sample is not None}
+        sections = scheduler.pack(size, now)
+        if sections:
+            frames += 1
+            for name in sections:
+                if name in stats:
+                    stats[name][1] += 1
+                    stats[name][2] += ages[name]
+        now += max(scheduler.delay(now), 1e-3)
+    return {name: (sampled, sent, age / sent if sent else None) for name, (sampled, sent, age) in stats.items()}, frames
+
+def main():
+    from emitter_config import DEFAULTS
+
+    parser = argparse.ArgumentParser(description="Simula el planificador de la telemetría.")
+    parser.add_argument('--duration', type=float, default=600.0, help="Segundos simulados")
+    parser.add_argument('--packet-size', type=int, default=DEFAULTS['radio']['packet_size'])
+    parser.add_argument('--codec', choices=('json', 'json-compact'), default=DEFAULTS['codec']['format'])
+    args = parser.parse_args()
+
+    channels = [(name, channel['period'], channel['priority'])
+                for name, channel in DEFAULTS['scheduler']['channels'].items()]
+    stats, frames = simulate(channels, args.packet_size, args.duration, args.codec == 'json-compact',
+                             DEFAULTS['scheduler']['headroom'])
+    print(f"{frames} tramas en {args.duration:.0f} s (packet_size {args.packet_size})")
+    print(f"  {'canal':8s} {'periodo':>8s} {'prio':>5s} {'leídas':>8s} {'enviadas':>9s} {'antigüedad':>11s}")
+    for name, period, priority in channels:
+        sampled, sent, age = stats[name]
+        age = f"{age:.2f} s" if age is not None else '-'
+        print(f"  {name:8s} {period:8.1f} {priority:5d} {sampled:8d} {sent:9d} {age:>11s}")
+
+if __name__ == '__main__':
+    main()
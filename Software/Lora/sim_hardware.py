@@ -0,0 +1,354 @@
+# sim_hardware.py
+#
+# Hardware simulado para ejecutar los módulos de sensores, el emisor y los
+# benchmarks en un PC con Linux, sin la Raspberry Pi:
+#
+#   board / adafruit_bus_device   bus I2C con dispositivos de registros en memoria
+#   adafruit_icm20x               ICM-20948 (aceleración, giro y campo magnético)
+#   adafruit_bmp3xx               BMP390 (presión, temperatura y altitud)
+#   RPi.GPIO                      pines en memoria; AUX siempre en HIGH salvo
+#                                 justo después de escribir en el puerto
+#
+# y, fuera de sys.modules, el AS7331 (registro a registro, como el chip), las
+# FIFO del ICM-20948 y del BMP390 (IMUStream y BMPStream),
+# las sondas DS18B20 del bus 1-Wire (ficheros en un directorio temporal) y un
+# GPS que repite unas sentencias NMEA fijas.
+#
+#   import sim_hardware
+#   sim_hardware.install()           # antes de open_gpio() o initialize_sensor()
+#
+# install() sustituye siempre a los módulos reales para que las cifras de los
+# benchmarks sean comparables entre máquinas. Las lecturas son deterministas
+# (semilla fija) y no esperan nada: no hay tiempo de conversión ni de bus.
+
+import os
+import sys
+import math
+import types
+import random
+import struct
+import tempfile
+
+# --- Bus I2C ------------------------------------------------------------------
+
+class RegisterDevice:
+    """Dispositivo I2C con un banco de registros de 8 bits."""
+
+    def __init__(self, registers=None):
+        self.registers = dict(registers or {})
+
+    def write(self, data):
+        reg, values = data[0], data[1:]
+        for offset, value in enumerate(values):
+            self.registers[reg + offset] = value
+
+    def read(self, reg, length):
+        return bytes(self.registers.get(reg + offset, 0) for offset in range(length))
+
+class I2CBus:
+    def __init__(self):
+        self.devices = {}
+
+    def attach(self, address, device):
+        self.devices[address] = device
+        return device
+
+    def device(self, address):
+        # Un dispositivo que no está conectado se comporta como un banco vacío
+        return self.devices.setdefault(address, RegisterDevice())
+
+class I2CDevice:
+    """Sustituto de adafruit_bus_device.i2c_device.I2CDevice."""
+
+    def __init__(self, i2c, device_address, probe=True):
+        self.bus = i2c if i2c is not None else BUS
+        self.device_address = device_address
+        self.target = self.bus.device(device_address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def write(self, buf, start=0, end=None):
+        self.target.write(bytes(buf[start:end]))
+
+    def readinto(self, buf, start=0, end=None):
+        end = len(buf) if end is None else end
+        buf[start:end] = self.target.read(0, end - start)
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0, out_end=None, in_start=0, in_end=None):
+        in_end = len(in_buffer) if in_end is None else in_end
+        reg = bytes(out_buffer[out_start:out_end])[0]
+        in_buffer[in_start:in_end] = self.target.read(reg, in_end - in_start)
+
+BUS = I2CBus()
+
+# --- AS7331 -------------------------------------------------------------------
+
+class AS7331Device(RegisterDevice):
+    """
+    AS7331 a nivel de registros: el OSR (0x00) elige el banco. En estado de
+    configuración se leen y escriben CREG1..3 (0x06-0x08); en estado de
+    medida 0x00 devuelve OSR + STATUS y 0x01-0x04 los resultados de 16 bits
+    (temperatura, UVA, UVB, UVC). Las medidas están siempre listas.
+    """
+
+    def __init__(self, uva=1200, uvb=800, uvc=150, temp=1850):
+        super().__init__({0x06: 0xA6, 0x07: 0x40, 0x08: 0x50})
+        self.osr = 0x02
+        self.results = [temp, uva, uvb, uvc]
+
+    def _measuring(self):
+        return self.osr & 0x07 == 0x03
+
+    def write(self, data):
+        if data[0] == 0x00:
+            if data[1] & 0x08:  # Software reset: vuelve al estado de configuración
+                self.osr = 0x02
+            else:
+                self.osr = data[1] & 0x7F  # SS se borra sola al terminar la medida
+            return
+        if not self._measuring():
+            super().write(data)
+
+    def read(self, reg, length):
+        if reg == 0x00:
+            return bytes((self.osr, 0x00)[:length])
+        if self._measuring() and 1 <= reg <= 4:
+            return struct.pack('<H', self.results[reg - 1])[:length]
+        return super().read(reg, length)
+
+# --- FIFO del ICM-20948 y del BMP390 -------------------------------------------
+
+class ICM20948Device(RegisterDevice):
+    """
+    Banco 0 del ICM-20948 para IMUStream: FIFO_COUNTH/L (0x70-0x71) y
+    FIFO_R_W (0x72). Cada vez que se pide la cuenta con la FIFO vacía entran
+    `frames` muestras (aceleración y giro en int16 big-endian, ±2 g y
+    ±250 dps); FIFO_RST la vacía. INT_STATUS_2 (0x1B) nunca indica desbordamiento.
+    """
+
+    def __init__(self, frames=12, seed=0x69):
+        super().__init__()
+        self.frames = frames
+        self.random = random.Random(seed)
+        self.fifo = bytearray()
+
+    def _fill(self):
+        gauss = self.random.gauss
+        for _ in range(self.frames):
+            values = (gauss(0, 300), gauss(0, 300), 16384 + gauss(0, 300), gauss(0, 20), gauss(0, 20), gauss(0, 20))
+            self.fifo += struct.pack('>6h', *(int(value) for value in values))
+
+    def write(self, data):
+        if data[0] == 0x68 and data[1]:  # FIFO_RST
+            self.fifo.clear()
+        super().write(data)
+
+    def read(self, reg, length):
+        if reg == 0x70:
+            if not self.fifo:
+                self._fill()
+            return struct.pack('>H', len(self.fifo))[:length]
+        if reg == 0x72:
+            data = bytes(self.fifo[:length])
+            del self.fifo[:length]
+            return data
+        return super().read(reg, length)
+
+class BMP390Device(RegisterDevice):
+    """
+    BMP390 para BMPStream: coeficientes NVM en 0x31, FIFO_LENGTH (0x12-0x13)
+    y FIFO_DATA (0x14). Con la FIFO vacía, pedir la longitud añade `frames`
+    tramas de presión y temperatura (cabecera 0x94) con las cuentas que dan
+    unos 21,3 °C y 931,5 hPa con estos coeficientes.
+    """
+
+    CALIBRATION = (27587, 19365, -10, -4, -16, 35, 0, 24812, 30453, 3, -6, 16030, 7, -60)
+    ADC_T, ADC_P = 8_246_000, 7_242_700
+
+    def __init__(self, frames=12, seed=0x77):
+        super().__init__({0x31 + i: value for i, value in enumerate(struct.pack('<HHbhhbbHHbbhbb', *self.CALIBRATION))})
+        self.frames = frames
+        self.random = random.Random(seed)
+        self.fifo = bytearray()
+
+    def _fill(self):
+        for _ in range(self.frames):
+            adc_t = self.ADC_T + int(self.random.gauss(0, 20))
+            adc_p = self.ADC_P + int(self.random.gauss(0, 40))
+            self.fifo += bytes((0x94,)) + adc_t.to_bytes(3, 'little') + adc_p.to_bytes(3, 'little')
+
+    def write(self, data):
+        if data[0] == 0x7E and data[1] in (0xB0, 0xB6):  # fifo_flush, softreset
+            self.fifo.clear()
+        super().write(data)
+
+    def read(self, reg, length):
+        if reg == 0x12:
+            if not self.fifo:
+                self._fill()
+            return struct.pack('<H', len(self.fifo))[:length]
+        if reg == 0x14:
+            data = bytes(self.fifo[:length]).ljust(length, b'\x80')  # 0x80: trama vacía
+            del self.fifo[:length]
+            return data
+        return super().read(reg, length)
+
+# --- ICM-20948 y BMP390 (API de los drivers de Adafruit) ----------------------
+
+class ICM20948:
+    """Sustituto de adafruit_icm20x.ICM20948: satélite casi quieto con ruido."""
+
+    def __init__(self, i2c_bus=None, address=0x69):
+        self.i2c_device = I2CDevice(i2c_bus, address)
+        self.accelerometer_range = 0
+        self.gyro_range = 0
+        self.gyro_data_rate_divisor = 0
+        self.accelerometer_data_rate_divisor = 0
+        self.random = random.Random(address)
+
+    def _noise(self, base, scale):
+        return tuple(value + self.random.gauss(0.0, scale) for value in base)
+
+    @property
+    def acceleration(self):
+        return self._noise((0.0, 0.0, 9.80665), 0.02)
+
+    @property
+    def gyro(self):
+        return self._noise((0.0, 0.0, 0.0), 0.001)
+
+    @property
+    def magnetic(self):
+        return self._noise((22.0, -3.5, 41.0), 0.3)
+
+class BMP3XX_I2C:
+    """Sustituto de adafruit_bmp3xx.BMP3XX_I2C a 700 m sobre el nivel del mar."""
+
+    def __init__(self, i2c, address=0x77):
+        self.i2c_device = I2CDevice(i2c, address)
+        self.pressure_oversampling = 8
+        self.temperature_oversampling = 2
+        self.sea_level_pressure = 1013.25
+        self.random = random.Random(address)
+
+    @property
+    def pressure(self):
+        return 931.5 + self.random.gauss(0.0, 0.05)
+
+    @property
+    def temperature(self):
+        return 21.3 + self.random.gauss(0.0, 0.01)
+
+    @property
+    def altitude(self):
+        return 44330.0 * (1.0 - math.pow(self.pressure / self.sea_level_pressure, 1.0 / 5.255))
+
+# --- GPIO ---------------------------------------------------------------------
+
+class GPIOState:
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    PUD_UP = 22
+    PUD_DOWN = 21
+
+    def __init__(self):
+        self.pins = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self.pins[pin] = self.HIGH if initial is None else initial
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+
+    def input(self, pin):
+        value = self.pins.get(pin, self.HIGH)
+        # Un LOW dura una lectura (AUX baja al empezar a transmitir y vuelve a HIGH)
+        self.pins[pin] = self.HIGH
+        return value
+
+    def cleanup(self, *pins):
+        self.pins.clear()
+
+GPIO = GPIOState()
+
+# --- DS18B20 y GPS ------------------------------------------------------------
+
+def w1_bus(probes, directory=None):
+    """
+    Crea en `directory` (o en uno temporal) la estructura de /sys/bus/w1/devices
+    con las sondas `probes` ({serie: °C}) y devuelve la ruta (con '/' final).
+    """
+    directory = directory or tempfile.mkdtemp(prefix='w1_')
+    for serial, temp in probes.items():
+        probe_dir = os.path.join(directory, serial)
+        os.makedirs(probe_dir, exist_ok=True)
+        millidegrees = int(round(temp * 1000))
+        with open(os.path.join(probe_dir, 'w1_slave'), 'w') as f:
+            f.write(f"50 05 4b 46 7f ff 0c 10 1c : crc=1c YES\n"
+                    f"50 05 4b 46 7f ff 0c 10 1c t={millidegrees}\n")
+        with open(os.path.join(probe_dir, 'temperature'), 'w') as f:
+            f.write(f"{millidegrees}\n")
+    os.makedirs(os.path.join(directory, 'w1_bus_master1'), exist_ok=True)
+    return os.path.join(directory, '')
+
+NMEA_SENTENCES = (
+    "$GNGGA,101530.00,3746.15320,N,00347.41680,W,1,09,0.90,702.4,M,50.1,M,,*5B",
+    "$GNRMC,101530.00,A,3746.15320,N,00347.41680,W,0.512,,191026,,,A*6A",
+    "$GNGSA,A,3,05,13,15,18,20,23,24,29,,,,,1.62,0.90,1.35*1C",
+    "$GNGSV,3,1,11,05,28,303,31,13,46,051,38,15,66,089,40,18,14,318,27*7F",
+)
+
+class SerialPort:
+    """Puerto serie que repite `lines` (sentencias NMEA) en bucle."""
+
+    def __init__(self, lines=NMEA_SENTENCES):
+        self.lines = [(line + "\r\n").encode('ascii') for line in lines]
+        self.index = 0
+        self.is_open = True
+
+    def readline(self):
+        line = self.lines[self.index % len(self.lines)]
+        self.index += 1
+        return line
+
+    def close(self):
+        self.is_open = False
+
+# --- Instalación ----------------------------------------------------------------
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    module.__file__ = __file__
+    return module
+
+def install():
+    """Registra los módulos simulados en sys.modules (sustituyendo a los reales)."""
+    BUS.attach(0x74, AS7331Device())
+    BUS.attach(0x69, ICM20948Device())
+    BUS.attach(0x77, BMP390Device())
+    board = _module('board', I2C=lambda: BUS, SCL=3, SDA=2)
+    bus_device = _module('adafruit_bus_device', __path__=[])
+    i2c_device = _module('adafruit_bus_device.i2c_device', I2CDevice=I2CDevice)
+    bus_device.i2c_device = i2c_device
+    icm20x = _module('adafruit_icm20x', ICM20948=ICM20948)
+    bmp3xx = _module('adafruit_bmp3xx', BMP3XX_I2C=BMP3XX_I2C)
+    rpi = _module('RPi', __path__=[])
+    gpio = _module('RPi.GPIO', **{name: getattr(GPIO, name) for name in dir(GPIO) if not name.startswith('_')})
+    rpi.GPIO = gpio
+    for module in (board, bus_device, i2c_device, icm20x, bmp3xx, rpi, gpio):
+        sys.modules[module.__name__] = module
@@ -0,0 +1,346 @@
+# telemetry_schema.py
+#
+# Definición única de la telemetría. Cada campo dice dónde está en la trama
+# de sensores (el dict que arma el emisor), qué columna ocupa en
+# sensor_readings y cómo se empaqueta en binario. De aquí salen:
+#
+#   - el DDL de sensor_readings y la función sensor_metrics de los agregados
+#   - la consulta INSERT y el mapeo trama -> fila (record_values)
+#   - el formato binario de la trama (encode_frame / decode_frame)
+#   - las consultas de los paneles de Grafana (dashboard.py)
+#
+#   python3 telemetry_schema.py --sql      # DDL para una migración nueva
+#   python3 telemetry_schema.py --layout   # tabla del formato binario
+
+import math
+import time
+import struct
+import calendar
+import argparse
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class Field:
+    """
+    Un valor de la telemetría.
+
+    path: claves dentro de la trama, p. ej. ('GPS', 'GGA', 'latitude')
+    code: formato struct del valor en la trama binaria; los enteros llevan
+          el valor multiplicado por `scale` y reservan un centinela para None
+    """
+
+    def __init__(self, column, path, sql_type='REAL', code='f', scale=1, label=None, unit=''):
+        self.column = column
+        self.path = path
+        self.sql_type = sql_type
+        self.code = code
+        self.scale = scale
+        self.label = label or column
+        self.unit = unit
+        self.integer = sql_type in ('SMALLINT', 'INTEGER')
+
+    def get(self, data):
+        """Valor del campo en la trama (None si falta o no es numérico)."""
+        value = data
+        for key in self.path:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                return None
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        if math.isnan(value):
+            return None
+        return int(value) if self.integer else value
+
+FIELDS = [
+    Field('acelx', ('IMU', 'ACELX'), code='h', scale=100, label='ACELX', unit='m/s²'),
+    Field('acely', ('IMU', 'ACELY'), code='h', scale=100, label='ACELY', unit='m/s²'),
+    Field('acelz', ('IMU', 'ACELZ'), code='h', scale=100, label='ACELZ', unit='m/s²'),
+    Field('girox', ('IMU', 'GIROX'), code='h', scale=500, label='GYROX', unit='rad/s'),
+    Field('giroy', ('IMU', 'GIROY'), code='h', scale=500, label='GYROY', unit='rad/s'),
+    Field('giroz', ('IMU', 'GIROZ'), code='h', scale=500, label='GYROZ', unit='rad/s'),
+    Field('magx', ('IMU', 'MAGX'), code='h', scale=10, label='MAGX', unit='µT'),
+    Field('magy', ('IMU', 'MAGY'), code='h', scale=10, label='MAGY', unit='µT'),
+    Field('magz', ('IMU', 'MAGZ'), code='h', scale=10, label='MAGZ', unit='µT'),
+    Field('uva', ('UV', 'UVA'), label='UVA'),
+    Field('uvb', ('UV', 'UVB'), label='UVB'),
+    Field('uvc', ('UV', 'UVC'), label='UVC'),
+    Field('uv_temp', ('UV', 'UV Temp'), code='h', scale=100, label='UV', unit='ºC'),
+    Field('bmp_pressure', ('BMP', 'pressure'), code='I', scale=100, label='PRESSURE', unit='hPa'),
+    Field('bmp_temperature', ('BMP', 'temperature'), code='h', scale=100, label='BMP_TEMP', unit='ºC'),
+    Field('bmp_altitude', ('BMP', 'altitude'), code='i', scale=100, label='BMP_ALT', unit='m'),
+    Field('bmp_vertical_speed', ('BMP', 'vertical_speed'), code='h', scale=100, label='VERTICAL_SPEED', unit='m/s'),
+    Field('gps_speed_mps', ('GPS', 'RMC', 'speed_mps'), code='H', scale=100, label='SPEED_MPS', unit='m/s'),
+    Field('gps_gga_latitude', ('GPS', 'GGA', 'latitude'), 'DOUBLE PRECISION', code='i', scale=10**7, label='LATITUDE'),
+    Field('gps_gga_longitude', ('GPS', 'GGA', 'longitude'), 'DOUBLE PRECISION', code='i', scale=10**7, label='LONGITUDE'),
+    Field('gps_distance', ('GPS', 'distance'), 'DOUBLE PRECISION', code='I', scale=10, label='DISTANCE', unit='m'),
+    Field('gps_altitude', ('GPS', 'GGA', 'altitude'), code='i', scale=100, label='GPS_ALTITUDE', unit='m'),
+    Field('gps_height_geoid', ('GPS', 'GGA', 'height_geoid'), code='h', scale=100, label='HEIGHT_GEOID', unit='m'),
+    Field('gps_satellites', ('GPS', 'GGA', 'num_satellites'), 'SMALLINT', code='B', label='SATELLITES'),
+    Field('gps_pdop', ('GPS', 'GSA', 'pdop'), code='H', scale=100, label='PDOP'),
+    Field('gps_hdop', ('GPS', 'GSA', 'hdop'), code='H', scale=100, label='HDOP'),
+    Field('gps_vdop', ('GPS', 'GSA', 'vdop'), code='H', scale=100, label='VDOP'),
+    Field('system_cpu_usage_percent', ('System', 'CPU Usage (%)'), code='H', scale=100, label='CPU (%)'),
+    Field('system_ram_usage_percent', ('System', 'RAM Usage (%)'), code='H', scale=100, label='RAM (%)'),
+    Field('system_temp_cpu_thermal', ('System', 'Sensors', 'Temperatures', 'cpu_thermal', 0, 'Current'),
+          code='h', scale=100, label='CPU (ºC)', unit='ºC'),
+]
+
+FIELDS_BY_COLUMN = {field.column: field for field in FIELDS}
+
+# Las sondas DS18B20 van aparte (dallas_readings): {canal: centigrados}
+DALLAS_METRIC_PREFIX = 'dallas_'
+
+def is_metric(name):
+    """True si `name` es una métrica de sensor_rollups (columna o dallas_<canal>)."""
+    return name in FIELDS_BY_COLUMN or (name.startswith(DALLAS_METRIC_PREFIX) and name[len(DALLAS_METRIC_PREFIX):].isdigit())
+
+# --- Base de datos ---------------------------------------------------------
+
+COLUMNS = ['timestamp'] + [field.column for field in FIELDS]
+COLUMN_TYPES = ['TIMESTAMP'] + [field.sql_type for field in FIELDS]
+
+# Tabla aparte de las sondas Dallas: una fila por canal y trama
+DALLAS_COLUMNS = ['timestamp', 'channel', 'value']
+DALLAS_COLUMN_TYPES = ['TIMESTAMP', 'SMALLINT', 'REAL']
+
+INSERT_QUERY = "INSERT INTO sensor_readings ({}) VALUES ({});".format(
+    ", ".join(COLUMNS), ", ".join(["%s"] * len(COLUMNS))
+)
+DALLAS_INSERT_QUERY = "INSERT INTO dallas_readings ({}) VALUES ({});".format(
+    ", ".join(DALLAS_COLUMNS), ", ".join(["%s"] * len(DALLAS_COLUMNS))
+)
+
+def _to_real(value):
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None  # NaN -> None
+
+def _to_int(value):
+    value = _to_real(value)
+    return None if value is None else int(value)
+
+def compile_flattener(fields, name='record_values'):
+    """
+    Genera una vez, a partir de `fields`, una función trama -> tupla
+    (timestamp, valores en el orden de `fields`) sin bucles ni .get()
+    encadenados: cada bloque de la trama (IMU, GPS, GPS.GGA...) se busca
+    una sola vez y los floats válidos pasan sin llamar a ninguna función.
+    Da lo mismo que Field.get campo a campo.
+    """
+    lines = [f"def {name}(data):",
+             "    if data.__class__ is not dict:",
+             "        data = _EMPTY_DICT"]
+    nodes = {(): 'data'}
+
+    def node(path):
+        # Variable con el contenedor de `path`, ya normalizado a dict o list
+        if path in nodes:
+            return nodes[path]
+        parent = node(path[:-1])
+        key = path[-1]
+        var = f"n{len(nodes)}"
+        nodes[path] = var
+        lines.append(f"    {var} = {_lookup(parent, key)}")
+        kind = 'list' if isinstance(next_keys[path], int) else 'dict'
+        empty = '_EMPTY_LIST' if kind == 'list' else '_EMPTY_DICT'
+        lines.append(f"    if {var}.__class__ is not {kind}:")
+        lines.append(f"        {var} = {empty}")
+        return var
+
+    next_keys = {}
+    for field in fields:
+        for i in range(1, len(field.path)):
+            next_keys[field.path[:i]] = field.path[i]
+
+    values = ["data.get('timestamp')"]
+    for i, field in enumerate(fields):
+        lookup = _lookup(node(field.path[:-1]), field.path[-1])
+        if field.integer:
+            values.append(f"_to_int({lookup})")
+        else:
+            values.append(f"(v{i} if (v{i} := {lookup}).__class__ is float and v{i} == v{i} else _to_real(v{i}))")
+    lines.append("    return (\n        " + ",\n        ".join(values) + ",\n    )")
+    source = "\n".join(lines) + "\n"
+
+    namespace = {'_EMPTY_DICT': {}, '_EMPTY_LIST': [], '_to_real': _to_real, '_to_int': _to_int}
+    exec(compile(source, f"<{name}>", 'exec'), namespace)
+    function = namespace[name]
+    function.source = source
+    return function
+
+def _lookup(container, key):
+    if isinstance(key, int):
+        return f"({container}[{key}] if len({container}) > {key} else None)"
+    return f"{container}.get({key!r})"
+
+# Trama de sensores -> tupla en el orden de COLUMNS
+record_values = compile_flattener(FIELDS)
+
+def create_table_sql():
+    lines = ["    timestamp TIMESTAMP NOT NULL"]
+    lines += [f"    {field.column} {field.sql_type}" for field in FIELDS]
+    return "CREATE TABLE sensor_readings (\n" + ",\n".join(lines) + "\n) PARTITION BY RANGE (timestamp);\n"
+
+def sensor_metrics_sql():
+    values = ",\n".join(
+        f"        ('{field.column}', s.{field.column}{'::DOUBLE PRECISION' if i == 0 else ''})"
+        for i, field in enumerate(FIELDS)
+    )
+    return (
+        "CREATE OR REPLACE FUNCTION sensor_metrics(s sensor_readings)\n"
+        "RETURNS TABLE (metric TEXT, value DOUBLE PRECISION) AS $$\n"
+        "    SELECT * FROM (VALUES\n"
+        f"{values}\n"
+        "    ) AS m (metric, value)\n"
+        "    WHERE m.value IS NOT NULL AND m.value <> 'NaN';\n"
+        "$$ LANGUAGE sql IMMUTABLE;\n"
+    )
+
+# --- Trama binaria ---------------------------------------------------------
+#
+# Little-endian: versión (B), timestamp UNIX (I), los campos en el orden de
+# FIELDS y al final las sondas DS18B20: número (B) y pares canal (B) +
+# centigrados (h). Un valor ausente se envía como el centinela de su tipo.
+
+FRAME_VERSION = 1
+FRAME_HEADER = "<BI"
+FRAME_FORMAT = FRAME_HEADER + "".join(field.code for field in FIELDS) + "B"
+FRAME_STRUCT = struct.Struct(FRAME_FORMAT)
+DALLAS_STRUCT = struct.Struct("<Bh")
+
+_SENTINELS = {'b': -2**7, 'h': -2**15, 'i': -2**31, 'B': 2**8 - 1, 'H': 2**16 - 1, 'I': 2**32 - 1}
+_LIMITS = {'b': (-2**7 + 1, 2**7 - 1), 'h': (-2**15 + 1, 2**15 - 1), 'i': (-2**31 + 1, 2**31 - 1),
+           'B': (0, 2**8 - 2), 'H': (0, 2**16 - 2), 'I': (0, 2**32 - 2)}
+
+def _pack_value(field, value):
+    if field.code in ('f', 'd'):
+        return float('nan') if value is None else value
+    if value is None:
+        return _SENTINELS[field.code]
+    low, high = _LIMITS[field.code]
+    return min(max(int(round(value * field.scale)), low), high)
+
+def _unpack_value(field, raw):
+    if field.code in ('f', 'd'):
+        return None if math.isnan(raw) else raw
+    if raw == _SENTINELS[field.code]:
+        return None
+    return raw if field.scale == 1 else raw / field.scale
+
+def _set_path(data, path, value):
+    for key, next_key in zip(path, path[1:]):
+        if isinstance(data, list):
+            while len(data) <= key:
+                data.append(None)
+            if data[key] is None:
+                data[key] = [] if isinstance(next_key, int) else {}
+            data = data[key]
+        else:
+            data = data.setdefault(key, [] if isinstance(next_key, int) else {})
+    if isinstance(data, list):
+        while len(data) <= path[-1]:
+            data.append(None)
+    data[path[-1]] = value
+
+def encode_frame(data):
+    """Trama de sensores (dict) -> bytes con el formato FRAME_FORMAT."""
+    timestamp = data.get('timestamp')
+    seconds = calendar.timegm(time.strptime(timestamp, TIMESTAMP_FORMAT)) if timestamp else 0
+    dallas = sorted((int(channel), int(value)) for channel, value in (data.get('Dallas') or {}).items())
+    payload = FRAME_STRUCT.pack(FRAME_VERSION, seconds,
+                                *(_pack_value(field, field.get(data)) for field in FIELDS),
+                                len(dallas))
+    return payload + b"".join(DALLAS_STRUCT.pack(channel, value) for channel, value in dallas)
+
+def decode_frame(payload):
+    """bytes -> trama de sensores con la misma forma que la del emisor (sólo campos del esquema)."""
+    values = FRAME_STRUCT.unpack_from(payload)
+    version, seconds = values[0], values[1]
+    if version != FRAME_VERSION:
+        raise ValueError(f"Versión de trama desconocida: {version}")
+    data = {'timestamp': time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds)) if seconds else None}
+    for field, raw in zip(FIELDS, values[2:-1]):
+        value = _unpack_value(field, raw)
+        if value is not None:
+            _set_path(data, field.path, value)
+    data['Dallas'] = {
+        channel: value
+        for channel, value in DALLAS_STRUCT.iter_unpack(payload[FRAME_STRUCT.size:FRAME_STRUCT.size + values[-1] * DALLAS_STRUCT.size])
+    }
+    return data
+
+# --- Grafana ----------------------------------------------------------------
+#
+# Paneles del dashboard: id -> (tipo, métricas[, alias del tiempo]). Cada
+# métrica es una columna (alias = su label) o (columna, alias). Tipos:
+#   series  medias por cubeta desde sensor_rollups
+#   count   lecturas recibidas por métrica en el rango
+#   latest  última marca de tiempo
+#   raw     filas completas de sensor_readings (tablas y mapas)
+
+PANELS = {
+    6: ('latest', []),
+    10: ('series', [('bmp_pressure', 'bmp_pressure')]),
+    22: ('series', ['uva', 'uvb', 'uvc']),
+    28: ('series', [('bmp_temperature', 'BMP'), 'uv_temp', ('dallas_2', 'EXTERN'), ('dallas_1', 'INTERN')]),
+    7: ('series', [('bmp_pressure', 'bmp_pressure')]),
+    4: ('series', ['system_cpu_usage_percent', 'system_ram_usage_percent', 'system_temp_cpu_thermal']),
+    13: ('series', ['uva', 'uvb', 'uvc']),
+    20: ('series', [('bmp_temperature', 'BMP'), 'uv_temp', ('dallas_1', 'INTERN'), ('dallas_2', 'EXTERN')]),
+    38: ('series', [('gps_distance', 'Distance')]),
+    44: ('series', ['gps_satellites']),
+    47: ('series', ['gps_hdop', 'gps_vdop', 'gps_pdop']),
+    19: ('series', [('bmp_altitude', 'BMP'), ('gps_altitude', 'GPS'), ('gps_height_geoid', 'GEOID')]),
+    3: ('raw', ['gps_gga_latitude', 'gps_gga_longitude']),
+    15: ('count', [('uva', 'UV'), ('bmp_pressure', 'BMP'), ('acelx', 'IMU'), ('dallas_1', 'DS18B20'),
+                   ('gps_gga_latitude', 'GPS'), ('system_temp_cpu_thermal', 'SYSTEM')]),
+    39: ('series', [('gps_speed_mps', 'Horizontal'), ('bmp_vertical_speed', 'Vertical')]),
+    33: ('series', [('bmp_altitude', 'BMP'), ('gps_altitude', 'GPS')]),
+    45: ('series', ['bmp_pressure', 'bmp_temperature', 'bmp_altitude', 'bmp_vertical_speed',
+                    ('dallas_1', 'INTERN'), ('dallas_2', 'EXTERN'), 'gps_speed_mps',
+                    'gps_gga_latitude', 'gps_gga_longitude', 'gps_altitude', 'gps_height_geoid',
+                    'gps_satellites']),
+    34: ('raw', [('gps_gga_latitude', 'LATITUDEGGA'), ('gps_gga_longitude', 'LONGITUDEGGA'), 'gps_distance',
+                 ('gps_altitude', 'ALTITUDE'), 'gps_satellites', 'gps_pdop', 'gps_hdop', 'gps_vdop']),
+    46: ('raw', ['acelx', 'acely', 'acelz', 'girox', 'giroy', 'giroz', 'magx', 'magy', 'magz'], 'TIME'),
+    48: ('raw', ['gps_gga_latitude', 'gps_gga_longitude']),
+}
+
+def panel_metrics(panel_id):
+    """[(métrica, alias)] del panel, comprobando que existen en el esquema."""
+    metrics = []
+    for entry in PANELS[panel_id][1]:
+        metric, alias = entry if isinstance(entry, tuple) else (entry, FIELDS_BY_COLUMN[entry].label)
+        if not is_metric(metric):
+            raise KeyError(f"Panel {panel_id}: métrica desconocida {metric}")
+        metrics.append((metric, alias))
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Esquema de la telemetría.")
+    parser.add_argument('--sql', action='store_true', help="DDL de sensor_readings y sensor_metrics")
+    parser.add_argument('--layout', action='store_true', help="Formato de la trama binaria")
+    args = parser.parse_args()
+
+    if args.sql:
+        print(create_table_sql())
+        print(sensor_metrics_sql())
+    if args.layout or not args.sql:
+        offset = struct.calcsize(FRAME_HEADER)
+        print(f"Trama v{FRAME_VERSION}: {FRAME_STRUCT.size} bytes + {DALLAS_STRUCT.size} por sonda DS18B20")
+        print(f"{0:4d}  B  version\n{1:4d}  I  timestamp")
+        for field in FIELDS:
+            print(f"{offset:4d}  {field.code}  {field.column} (x{field.scale} {field.unit})".rstrip())
+            offset += struct.calcsize('<' + field.code)
+        print(f"{offset:4d}  B  número de sondas DS18B20, seguido de (canal B, centigrados h)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# tracing.py
+#
+# Latencia de la telemetría de extremo a extremo, desde que empieza el
+# muestreo en el emisor hasta que la fila está confirmada en la base de datos.
+#
+# El emisor numera cada trama y anota, con el reloj monotónico, el inicio y el
+# fin de cada sensor (ms desde el inicio del muestreo). Esas marcas viajan en
+# el bloque 'TRACE' de la propia trama; las de la serialización y la
+# transmisión (hasta que AUX vuelve a HIGH) se conocen después de enviarla y
+# viajan en la trama siguiente, con el número de la trama a la que se
+# refieren:
+#
+#   "TRACE": {"seq": 42, "t0": 1760870000.123,
+#             "ms": {"IMU": [0, 4], "UV": [4, 9], ...},
+#             "prev": {"seq": 41, "ms": {"encode": [812, 813], "tx": [813, 4120], "aux_low": 825}}}
+#
+# El receptor añade la llegada, la decodificación y la confirmación en la BD,
+# acumula histogramas por etapa y los vuelca a un JSON (LATENCY_REPORT_PATH):
+#
+#   python3 tracing.py /home/cubesat/latency.json     # histogramas en texto
+#
+# Los intervalos entre máquinas (muestreo -> llegada) usan la hora del
+# sistema de cada una; sólo son fiables con los relojes sincronizados (NTP o GPS).
+
+import json
+import time
+import logging
+import argparse
+from contextlib import contextmanager
+
+from metrics import Histogram
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+class FrameTrace:
+    """Marcas de tiempo de una trama en el emisor, relativas al inicio del muestreo."""
+
+    def __init__(self, seq):
+        self.seq = seq
+        self.wall = time.time()
+        self.t0 = time.monotonic()
+        self.ms = {}
+        self.sent = set()
+
+    def _offset(self):
+        return round((time.monotonic() - self.t0) * 1000)
+
+    @contextmanager
+    def span(self, name):
+        start = self._offset()
+        try:
+            yield
+        finally:
+            self.ms[name] = [start, self._offset()]
+
+    def mark(self, name):
+        self.ms[name] = self._offset()
+
+    def to_frame(self, previous=None):
+        """Bloque 'TRACE' con las marcas que ya se conocen al serializar la trama."""
+        self.sent = set(self.ms)
+        block = {'seq': self.seq, 't0': round(self.wall, 3), 'ms': dict(self.ms)}
+        if previous:
+            block['prev'] = previous
+        return block
+
+    def pending(self):
+        """Marcas posteriores a to_frame(), para la trama siguiente."""
+        return {'seq': self.seq, 'ms': {name: value for name, value in self.ms.items() if name not in self.sent}}
+
+class FrameTracer:
+    """Numera las tramas del emisor y guarda las marcas de la última enviada."""
+
+    def __init__(self):
+        self.seq = 0
+        self.previous = None
+
+    def start(self):
+        self.seq += 1
+        return FrameTrace(self.seq)
+
+    def finish(self, trace):
+        self.previous = trace.pending()
+
+def _duration(span):
+    return (span[1] - span[0]) / 1000
+
+class LatencyTracker:
+    """
+    Histogramas de latencia por etapa en el receptor. Con `path` se vuelcan a
+    JSON cada `write_every` tramas; con `registry` (metrics.Registry) se
+    publican además como uaxsat_latency_seconds{stage=...}.
+    """
+
+    def __init__(self, path=None, write_every=12, registry=None):
+        self.path = path
+        self.write_every = write_every
+        self.histograms = {}
+        self.frames = 0
+        self.last_seq = None
+        self.lost = 0
+        self.family = self.lost_counter = None
+        if registry is not None:
+            self.family = registry.histogram('uaxsat_latency_seconds', "Latencia de la telemetría por etapa",
+                                             ['stage'])
+            self.lost_counter = registry.counter('uaxsat_rx_frames_lost_total',
+                                                 "Tramas perdidas (huecos en el número de secuencia)")
+
+    def observe(self, name, seconds):
+        if seconds is None or seconds < 0:
+            return
+        if name not in self.histograms:
+            self.histograms[name] = self.family.labels(name) if self.family else Histogram()
+        self.histograms[name].observe(seconds)
+
+    def observe_frame(self, trace, received, arrival, decoded, committed):
+        """
+        trace: bloque 'TRACE' de la trama; received: hora del sistema a la
+        llegada; arrival, decoded, committed: reloj monotónico del receptor.
+        """
+        seq = trace.get('seq')
+        if self.last_seq is not None and seq is not None and seq > self.last_seq + 1:
+            self.lost += seq - self.last_seq - 1
+            if self.lost_counter:
+                self.lost_counter.inc(seq - self.last_seq - 1)
+        self.last_seq = seq
+
+        spans = {name: value for name, value in trace.get('ms', {}).items() if isinstance(value, list)}
+        for name, span in spans.items():
+            self.observe(f"sensor.{name}", _duration(span))
+        if spans:
+            self.observe('sample', max(span[1] for span in spans.values()) / 1000)
+        previous = trace.get('prev', {}).get('ms', {})
+        if 'encode' in previous:
+            self.observe('encode', _duration(previous['encode']))
+        if 'tx' in previous:
+            self.observe('tx', _duration(previous['tx']))
+
+        link = received - trace['t0'] if 't0' in trace else None
+        self.observe('sample_to_rx', link)
+        self.observe('decode', decoded - arrival)
+        if committed is not None:
+            self.observe('commit', committed - decoded)
+            if link is not None:
+                self.observe('end_to_end', link + committed - arrival)
+
+        self.frames += 1
+        if self.path and self.frames % self.write_every == 0:
+            self.write()
+
+    def to_dict(self):
+        return {'frames': self.frames, 'lost': self.lost,
+                'stages': {name: histogram.to_dict() for name, histogram in self.histograms.items()}}
+
+    def write(self, path=None):
+        try:
+            with open(path or self.path, 'w') as f:
+                json.dump(self.to_dict(), f)
+        except OSError as e:
+            logger.error("No se pudo guardar el informe de latencia: %s", e)
+
+def print_report(report, width=40):
+    print(f"{report['frames']} tramas, {report['lost']} perdidas (huecos en seq)")
+    for name, data in sorted(report['stages'].items()):
+        histogram = Histogram(data['buckets'])
+        histogram.counts, histogram.count, histogram.sum = data['counts'], data['count'], data['sum']
+        if not histogram.count:
+            continue
+        print(f"\n{name}: n={histogram.count} media={histogram.sum / histogram.count * 1000:.1f} ms "
+              f"p50<={histogram.quantile(0.5) * 1000:g} ms p95<={histogram.quantile(0.95) * 1000:g} ms")
+        peak = max(histogram.counts)
+        labels = [f"<= {bound * 1000:g} ms" for bound in histogram.buckets] + [f"> {histogram.buckets[-1] * 1000:g} ms"]
+        for label, count in zip(labels, histogram.counts):
+            if count:
+                print(f"  {label:>12s} {'#' * max(1, round(width * count / peak)):{width}s} {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Histogramas de latencia de la telemetría.")
+    parser.add_argument('path', help="Informe JSON del receptor (LATENCY_REPORT_PATH)")
+    args = parser.parse_args()
+    with open(args.path) as f:
+        print_report(json.load(f))
+
+if __name__ == '__main__':
+    main()
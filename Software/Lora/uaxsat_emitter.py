@@ -0,0 +1,361 @@
+# uaxsat_emitter.py
+#
+# Punto de entrada del emisor. Cada ciclo pasa por las etapas de
+# pipeline.stages, en orden (por defecto sample -> encode -> transmit ->
+# store), y después espera rates.period segundos (o menos si la IMU detecta
+# un evento). Con 'schedule' en lugar de 'sample' cada sensor va a su propio
+# ritmo y las tramas se ajustan a radio.packet_size (scheduler.py); con
+# airtime.enabled las tramas respetan el ciclo de trabajo (airtime.py). Todo
+# lo que antes estaba fijo en constants.py sale del fichero de configuración
+# (ver emitter.toml y emitter_config.py):
+#
+#   python3 uaxsat_emitter.py --config emitter.toml
+#   python3 uaxsat_emitter.py --config emitter.toml --check          # sólo valida el fichero
+#   python3 uaxsat_emitter.py --config emitter.toml --print-config   # configuración final en JSON
+#   python3 uaxsat_emitter.py --once                                 # un ciclo y termina
+#
+# Sin --config se usa UAXSAT_EMITTER_CONFIG y, si no está definida, los
+# valores de constants.py. Una etapa propia se añade como "modulo:Clase"
+# en pipeline.stages: una subclase de Stage con process(cycle).
+
+import os
+import sys
+import json
+import logging
+import argparse
+import importlib
+import collections
+
+from emitter_config import load_config
+from airtime import AirtimeBudget, FRAMES_DEFERRED
+from tracing import FrameTracer
+from metrics import start_http_server
+from flightlog import setup_logging
+from lora_functions import open_gpio, close_gpio, enter_normal_mode
+import emitteroptimiced
+
+# Configuración del logger
+logger = logging.getLogger(__name__)
+
+def observe_sensor_reads(trace):
+    """Duración de cada lectura de sensor del ciclo (las marcas de `trace`) en SENSOR_READ_SECONDS."""
+    for name, (start, end) in trace.ms.items():
+        emitteroptimiced.SENSOR_READ_SECONDS.labels(name).observe((end - start) / 1000)
+
+class Stage:
+    """
+    Una etapa del ciclo. process() recibe el dict del ciclo ('trace', y lo
+    que añadan las etapas anteriores: 'data', 'message', 'traced' = False
+    para una trama sin bloque TRACE) y devuelve False para saltarse el resto
+    de etapas de ese ciclo. close() se llama al terminar el programa.
+    """
+
+    def __init__(self, emitter, config):
+        self.emitter = emitter
+        self.config = config
+
+    def process(self, cycle):
+        raise NotImplementedError
+
+    def delay(self):
+        """Segundos hasta el siguiente ciclo, o None para usar rates.period."""
+        return None
+
+    def close(self):
+        pass
+
+class SampleStage(Stage):
+    """Lee los sensores de sensors.enabled."""
+
+    def process(self, cycle):
+        sensors = self.config['sensors']
+        station = self.config['station']
+        trace = cycle['trace']
+        cycle['data'] = emitteroptimiced.get_all_sensor_data(
+            station['initial_lat'], station['initial_lon'], self.emitter.imu, self.emitter.bmp_stream, trace,
+            sensors=sensors['enabled'], imu_log_path=sensors['imu']['log_path'],
+            dallas_resolution=sensors['dallas']['resolution'])
+        observe_sensor_reads(trace)
+        if not cycle['data']:
+            logger.error("Datos no enviados debido a un error en la recolección.")
+            emitteroptimiced.SENSOR_FAILURES.inc()
+            return False
+        return True
+
+class ScheduleStage(Stage):
+    """
+    Sustituye a 'sample': lee cada canal con su periodo y arma una trama
+    que cabe en radio.packet_size (ver scheduler.py). Los ciclos van al
+    ritmo del siguiente plazo, no de rates.period.
+    """
+
+    def __init__(self, emitter, config):
+        super().__init__(emitter, config)
+        from scheduler import Channel, TelemetryScheduler, frame_size
+        channels = config['scheduler']['channels']
+        self.scheduler = TelemetryScheduler([Channel(name, channels[name]['period'], channels[name]['priority'],
+                                                     self._reader(name))
+                                             for name in config['sensors']['enabled']],
+                                            config['radio']['packet_size'])
+        self.size = frame_size(config['codec']['format'] == 'json-compact', config['scheduler']['headroom'])
+
+    def _reader(self, name):
+        sensors = self.config['sensors']
+        station = self.config['station']
+
+        def read(trace):
+            data = emitteroptimiced.get_all_sensor_data(
+                station['initial_lat'], station['initial_lon'], self.emitter.imu, self.emitter.bmp_stream, trace,
+                sensors=(name,), imu_log_path=sensors['imu']['log_path'],
+                dallas_resolution=sensors['dallas']['resolution'])
+            if not data:
+                emitteroptimiced.SENSOR_FAILURES.inc()
+                return None
+            del data['timestamp']
+            return data
+        return read
+
+    def process(self, cycle):
+        trace = cycle['trace']
+        self.scheduler.sample_due(trace)
+        observe_sensor_reads(trace)
+        budget = self.emitter.budget
+        if budget and not budget.allows(budget.airtime(self.scheduler.packet_size)):
+            # Sin tiempo en el aire para un paquete: las muestras siguen pendientes (y se renuevan)
+            FRAMES_DEFERRED.labels('schedule').inc()
+            return False
+        cycle['data'] = self.scheduler.pack(self.size)
+        cycle['traced'] = False  # Sin bloque TRACE: no cabría en el paquete (ver scheduler.py)
+        return cycle['data'] is not None
+
+    def delay(self):
+        return self.scheduler.delay()
+
+class EncodeStage(Stage):
+    """Serializa la trama (con las marcas de la anterior) entre <<< y >>>."""
+
+    def process(self, cycle):
+        trace = cycle['trace']
+        if cycle.get('traced', True):
+            cycle['data']['TRACE'] = trace.to_frame(self.emitter.tracer.previous)
+        with trace.span('encode'):
+            message_content = emitteroptimiced.serialize_sensor_data(cycle['data'], self.config['codec']['format'] == 'json-compact')
+        if not message_content:
+            logger.error("No se pudo serializar los datos.")
+            return False
+        cycle['message'] = f'<<<{message_content}>>>'
+        return True
+
+class TransmitStage(Stage):
+    """
+    Envía la trama. Con airtime.enabled las tramas pasan por una cola de
+    airtime.queue_size: salen, de la más antigua a la más nueva, mientras
+    quepan en el presupuesto; las demás esperan al ciclo siguiente y, si la
+    cola se llena, se descarta la más antigua.
+    """
+
+    def __init__(self, emitter, config):
+        super().__init__(emitter, config)
+        self.queue = collections.deque()
+
+    def _send(self, message, trace=None):
+        radio = self.config['radio']
+        emitteroptimiced.send_message(message, trace, radio['serial_port'], radio['baud_rate'], self.emitter.budget)
+
+    def process(self, cycle):
+        budget = self.emitter.budget
+        if budget is None:
+            with cycle['trace'].span('tx'):
+                self._send(cycle['message'], cycle['trace'])
+            return True
+        if len(self.queue) >= self.config['airtime']['queue_size']:
+            self.queue.popleft()
+            FRAMES_DEFERRED.labels('dropped').inc()
+            logger.warning("Cola de transmisión llena: se descarta la trama más antigua.")
+        self.queue.append(cycle)
+        while self.queue:
+            message = self.queue[0]['message']
+            airtime = budget.airtime(len(message.encode('utf-8')))
+            if airtime > budget.budget:
+                self.queue.popleft()
+                FRAMES_DEFERRED.labels('oversize').inc()
+                logger.error("Trama de %.1f s en el aire: no cabe en el presupuesto de %.1f s.", airtime, budget.budget)
+                continue
+            if not budget.allows(airtime):
+                FRAMES_DEFERRED.labels('queued').inc()
+                logger.info("Sin tiempo en el aire (quedan %.2f s, la trama necesita %.2f s): %d en cola, "
+                            "la siguiente sale en %.0f s.", budget.remaining(), airtime, len(self.queue),
+                            budget.wait_time(airtime))
+                break
+            queued = self.queue.popleft()
+            if queued is cycle:
+                with cycle['trace'].span('tx'):
+                    self._send(message, cycle['trace'])
+            else:
+                self._send(message)
+        return True
+
+class StoreStage(Stage):
+    """Guarda la trama en el almacén local (SQLite)."""
+
+    def __init__(self, emitter, config):
+        super().__init__(emitter, config)
+        # Sin servidor de base de datos a bordo; se exporta a PostgreSQL tras la recuperación
+        from local_store import LocalStore
+        persistence = config['persistence']
+        self.store = LocalStore(persistence['local_store'], persistence['batch_size'], persistence['flush_interval'])
+
+    def process(self, cycle):
+        self.store.append(cycle['data'])
+        return True
+
+    def close(self):
+        self.store.close()
+
+class LogStage(Stage):
+    """Añade la trama a los ficheros NDJSON/CSV de frame_log."""
+
+    def __init__(self, emitter, config):
+        super().__init__(emitter, config)
+        from frame_log import FrameLog
+        options = config['frame_log']
+        self.log = FrameLog(options['directory'], options['format'], max_bytes=options['max_bytes'],
+                            max_age=options['max_age'], fsync=options['fsync'],
+                            fsync_interval=options['fsync_interval'], compress=options['compress'])
+
+    def process(self, cycle):
+        self.log.append(cycle['data'])
+        return True
+
+    def close(self):
+        self.log.close()
+
+STAGES = {
+    'sample': SampleStage,
+    'schedule': ScheduleStage,
+    'encode': EncodeStage,
+    'transmit': TransmitStage,
+    'store': StoreStage,
+    'log': LogStage,
+}
+
+def load_stage(name):
+    """Clase de la etapa `name`: una de STAGES o "modulo:Clase"."""
+    if name in STAGES:
+        return STAGES[name]
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Etapa desconocida: {name} (válidas: {', '.join(STAGES)} o modulo:Clase)")
+    try:
+        stage = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"No se pudo cargar la etapa {name}: {e}")
+    if not (isinstance(stage, type) and issubclass(stage, Stage)):
+        raise ValueError(f"{name} no es una subclase de Stage")
+    return stage
+
+class Emitter:
+    def __init__(self, config):
+        self.config = config
+        self.stage_classes = [load_stage(name) for name in config['pipeline']['stages']]
+        self.stages = []
+        self.tracer = FrameTracer()
+        airtime = config['airtime']
+        self.budget = None
+        if airtime['enabled']:
+            self.budget = AirtimeBudget(config['radio']['air_rate'], config['radio']['packet_size'],
+                                        airtime['duty_cycle'], airtime['window'])
+        self.imu = None
+        self.bmp_stream = None
+
+    def start(self):
+        radio = self.config['radio']
+        sensors = self.config['sensors']
+        open_gpio()
+        enter_normal_mode()
+        if radio['configure']:
+            from E220900T30D import setparam
+            setparam(baudrate=radio['baud_rate'], air_rate=radio['air_rate'], power=radio['power'],
+                     packet_size=radio['packet_size'], channel=radio['channel'])
+        if self.config['metrics']['port']:
+            start_http_server(self.config['metrics']['port'], self.config['metrics']['host'])
+        if 'IMU' in sensors['enabled'] and sensors['imu']['stream']:
+            imu = sensors['imu']
+            self.imu = emitteroptimiced.start_imu_stream(imu['sample_rate'], imu['accel_range'], imu['gyro_range'],
+                                                         imu['event_dir'], imu['calibration_path'])
+        if 'BMP' in sensors['enabled'] and sensors['bmp']['stream']:
+            self.bmp_stream = emitteroptimiced.start_bmp_stream(sensors['bmp']['odr'], sensors['bmp']['iir_coefficient'])
+        for stage in self.stage_classes:
+            self.stages.append(stage(self, self.config))
+
+    def run_cycle(self):
+        trace = self.tracer.start()
+        cycle = {'trace': trace}
+        for stage in self.stages:
+            if stage.process(cycle) is False:
+                return
+        # Las marcas de serialización y transmisión van en la trama siguiente
+        self.tracer.finish(trace)
+
+    def wait(self):
+        radio = self.config['radio']
+        delays = [delay for delay in (stage.delay() for stage in self.stages) if delay is not None]
+        period = min(delays) if delays else self.config['rates']['period']
+        emitteroptimiced.wait_next_cycle(self.imu, period, radio['serial_port'], radio['baud_rate'],
+                                         self.config['codec']['format'] == 'json-compact', self.budget)
+
+    def close(self):
+        for stage in self.stages:
+            try:
+                stage.close()
+            except Exception as e:
+                logger.error("Error cerrando la etapa %s: %s", type(stage).__name__, e)
+        if self.imu:
+            self.imu['stream'].stop()
+            logger.debug("Streaming de la IMU detenido.")
+        if self.bmp_stream:
+            self.bmp_stream.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emisor de telemetría de UAXSat.")
+    parser.add_argument('--config', default=os.environ.get('UAXSAT_EMITTER_CONFIG'),
+                        help="Fichero TOML o YAML (por defecto UAXSAT_EMITTER_CONFIG o los valores de constants.py)")
+    parser.add_argument('--check', action='store_true', help="Valida la configuración y termina")
+    parser.add_argument('--print-config', action='store_true', help="Muestra la configuración final y termina")
+    parser.add_argument('--once', action='store_true', help="Un solo ciclo, sin esperar")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+        emitter_loop = Emitter(config)  # Comprueba también las etapas
+    except (OSError, ValueError) as e:
+        print(f"Configuración no válida: {e}", file=sys.stderr)
+        return 2
+    if args.print_config:
+        print(json.dumps(config, indent=2, ensure_ascii=False))
+        return 0
+    if args.check:
+        print(f"Configuración válida: {args.config or 'valores por defecto'}")
+        return 0
+
+    setup_logging(config['logging']['level'] or None, config['logging']['ring_path'] or None)
+    try:
+        logger.info("Iniciando el programa emisor (%s)...", args.config or 'configuración por defecto')
+        emitter_loop.start()
+        while True:
+            emitter_loop.run_cycle()
+            if args.once:
+                break
+            emitter_loop.wait()
+    except KeyboardInterrupt:
+        logger.info("Programa interrumpido por el usuario.")
+    except Exception as e:
+        logger.error("Error inesperado: %s", e)
+    finally:
+        emitter_loop.close()
+        logger.info("Terminando el programa emisor. Limpiando GPIO...")
+        close_gpio()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
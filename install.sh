@@ -45,6 +45,7 @@ sudo pip3 install adafruit-blinka --break-system-packages
 sudo pip3 install adafruit-circuitpython-busdevice --break-system-packages
 sudo pip3 install psycopg2-binary --break-system-packages
 sudo pip3 install RPi.GPIO --break-system-packages
+sudo pip3 install numpy --break-system-packages
 
 sudo usermod -aG gpio $USER
 